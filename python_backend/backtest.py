@@ -0,0 +1,246 @@
+"""
+Backtest walk-forward vetorizado sobre o histórico completo de velas
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import TimeSeriesSplit
+
+from ml_model import MLPredictor
+from feature_engineering import feature_matrix
+from config import MIN_CONFIDENCE_THRESHOLD
+
+
+# Mesmas faixas de MLPredictor._analyze_by_confidence
+CONFIDENCE_BINS = [0, 70, 75, 80, 85, 90, 100]
+CONFIDENCE_LABELS = ['<70%', '70-75%', '75-80%', '80-85%', '85-90%', '90-100%']
+
+DEFAULT_THRESHOLDS = [50, 55, 60, 65, 70, 75, 80, 85, 90]
+
+
+def _run_fold(
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    model_type: str
+) -> np.ndarray:
+    """
+    Treina um fold (scaler + modelo) e pontua o bloco de teste inteiro
+    em lote (MLPredictor.predict_proba_batch).
+    
+    Returns:
+        Probabilidade da classe 1 (verde) para cada linha de teste
+    """
+    predictor = MLPredictor()
+    predictor.scaler = MLPredictor.build_scaler(model_type)
+    predictor.model = MLPredictor.build_model(model_type)
+    predictor.model.fit(predictor.scaler.fit_transform(X_train), y_train)
+    return predictor.predict_proba_batch(X_test)
+
+
+def _bucket_winrates(confidence: np.ndarray, win: np.ndarray) -> pd.DataFrame:
+    """Total de sinais, wins e winrate por faixa de confiança (sem laços por linha)."""
+    bucket = np.digitize(confidence, CONFIDENCE_BINS[1:-1], right=True)
+    total = np.bincount(bucket, minlength=len(CONFIDENCE_LABELS))
+    wins = np.bincount(bucket, weights=win, minlength=len(CONFIDENCE_LABELS))
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        winrate = np.where(total > 0, wins / total * 100, np.nan)
+    
+    return pd.DataFrame({
+        'Total Sinais': total,
+        'Wins': wins.astype(np.int64),
+        'Winrate': np.round(winrate, 2),
+    }, index=pd.Index(CONFIDENCE_LABELS, name='confidence_range'))
+
+
+def _threshold_curve(confidence: np.ndarray, win: np.ndarray, thresholds: Sequence[float]) -> pd.DataFrame:
+    """
+    Sinais e winrate para cada limiar mínimo de confiança, via ordenação
+    + soma acumulada (uma passada para todos os limiares).
+    """
+    order = np.argsort(confidence)
+    sorted_conf = confidence[order]
+    # wins_from[i] = wins com confiança >= sorted_conf[i]
+    wins_from = np.concatenate([np.cumsum(win[order][::-1])[::-1], [0]])
+    
+    start = np.searchsorted(sorted_conf, np.asarray(thresholds, dtype=np.float64), side='left')
+    signals = len(confidence) - start
+    wins = wins_from[start]
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        winrate = np.where(signals > 0, wins / signals * 100, np.nan)
+    
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'signals': signals,
+        'wins': wins.astype(np.int64),
+        'winrate': np.round(winrate, 2),
+        'coverage': np.round(signals / max(len(confidence), 1) * 100, 2),
+    })
+
+
+def walk_forward_backtest(
+    features_df: pd.DataFrame,
+    model_type: str = 'xgboost',
+    n_splits: int = 5,
+    max_train_size: Optional[int] = None,
+    test_size: Optional[int] = None,
+    min_confidence: float = MIN_CONFIDENCE_THRESHOLD,
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+    n_jobs: int = 1,
+    verbose: bool = True
+) -> Dict:
+    """
+    Backtest walk-forward: cada fold treina apenas com o passado
+    (TimeSeriesSplit) e pontua o bloco seguinte em lote.
+    
+    O resultado de cada sinal segue a mesma regra do engine de tempo real:
+    entrada no fechamento da vela do sinal e saída no fechamento da próxima
+    vela (CALL vence se subir, PUT se cair). A direção vem de
+    MLPredictor.signals_from_proba, a mesma do engine.
+    
+    A última vela antes de cada bloco de teste fica fora do treino: o target
+    dela é a cor da primeira vela de teste.
+    
+    Args:
+        features_df: DataFrame do FeatureEngineer (com 'timestamp', 'close' e 'target')
+        model_type: Tipo de modelo ('xgboost', 'random_forest', 'gradient_boosting', 'lightgbm')
+        n_splits: Número de folds
+        max_train_size: Janela máxima de treino (None = janela expansível)
+        test_size: Tamanho de cada bloco de teste (None = automático)
+        min_confidence: Limiar usado para marcar sinais
+        thresholds: Limiares avaliados na curva de winrate
+        n_jobs: Processos em paralelo entre folds (1 = sequencial)
+        verbose: Mostrar progresso
+    
+    Returns:
+        Dict com 'predictions' (uma linha por vela pontuada), 'buckets',
+        'thresholds', 'folds' e métricas agregadas
+    """
+    df = features_df.dropna(subset=['target'])
+    X = feature_matrix(df)
+    y = df['target'].to_numpy(dtype=np.int64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    
+    # Fechamento da próxima vela (saída do sinal); NaN na última linha, cuja
+    # próxima vela não está em features_df
+    next_close = features_df['close'].shift(-1).loc[df.index].to_numpy(dtype=np.float64)
+    
+    splitter = TimeSeriesSplit(n_splits=n_splits, max_train_size=max_train_size, test_size=test_size, gap=1)
+    folds = list(splitter.split(X))
+    
+    if verbose:
+        print(f"\n{'='*60}")
+        print(f"BACKTEST WALK-FORWARD - {model_type.upper()} ({n_splits} folds, {len(X)} velas)")
+        print(f"{'='*60}\n")
+    
+    proba_up = np.full(len(X), np.nan)
+    fold_ids = np.full(len(X), -1, dtype=np.int64)
+    
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [
+                pool.submit(_run_fold, X[train_idx], y[train_idx], X[test_idx], model_type)
+                for train_idx, test_idx in folds
+            ]
+            fold_probas = [future.result() for future in futures]
+    else:
+        fold_probas = [
+            _run_fold(X[train_idx], y[train_idx], X[test_idx], model_type)
+            for train_idx, test_idx in folds
+        ]
+    
+    fold_summaries: List[Dict] = []
+    for k, ((train_idx, test_idx), proba) in enumerate(zip(folds, fold_probas)):
+        proba_up[test_idx] = proba
+        fold_ids[test_idx] = k
+        accuracy = float(np.mean(MLPredictor.signals_from_proba(proba)[0] == y[test_idx]))
+        fold_summaries.append({
+            'fold': k,
+            'train_size': len(train_idx),
+            'test_size': len(test_idx),
+            'test_start': df['timestamp'].iloc[test_idx[0]],
+            'test_end': df['timestamp'].iloc[test_idx[-1]],
+            'accuracy': accuracy,
+        })
+        if verbose:
+            print(f"Fold {k}: treino={len(train_idx)} teste={len(test_idx)} accuracy={accuracy*100:.2f}%")
+    
+    # ---------- Sinais e resultados (vetorizado) ----------
+    scored = (fold_ids >= 0) & ~np.isnan(next_close)
+    proba_up = proba_up[scored]
+    prediction, confidence = MLPredictor.signals_from_proba(proba_up)
+    
+    entry = close[scored]
+    exit_ = next_close[scored]
+    win = np.where(prediction == 1, exit_ > entry, exit_ < entry).astype(np.int64)
+    is_signal = confidence >= min_confidence
+    
+    predictions = pd.DataFrame({
+        'timestamp': df['timestamp'].to_numpy()[scored],
+        'fold': fold_ids[scored],
+        'close': entry,
+        'next_close': exit_,
+        'proba_up': proba_up,
+        'prediction': np.where(prediction == 1, 'CALL', 'PUT'),
+        'confidence': confidence,
+        'signal': is_signal,
+        'win': win,
+    })
+    
+    buckets = _bucket_winrates(confidence, win)
+    curve = _threshold_curve(confidence, win, thresholds)
+    
+    n_signals = int(is_signal.sum())
+    signal_winrate = float(win[is_signal].mean() * 100) if n_signals else float('nan')
+    
+    if verbose:
+        print("\n--- Winrate por Nível de Confiança ---")
+        print(buckets)
+        print("\n--- Winrate por Limiar Mínimo ---")
+        print(curve.to_string(index=False))
+        print(f"\n✓ Sinais com confiança >= {min_confidence}%: {n_signals} | Winrate: {signal_winrate:.2f}%")
+    
+    return {
+        'predictions': predictions,
+        'buckets': buckets,
+        'thresholds': curve,
+        'folds': fold_summaries,
+        'accuracy': float(np.mean(prediction == y[scored])),
+        'signals': n_signals,
+        'signal_winrate': signal_winrate,
+        'model_type': model_type,
+    }
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    import time
+    from feature_engineering import FeatureEngineer
+    
+    parser = argparse.ArgumentParser(description="Backtest walk-forward do Super Analista")
+    parser.add_argument('--days', type=int, default=30, help="Dias de histórico (armazenamento local/Binance)")
+    parser.add_argument('--synthetic', type=int, metavar='N_BARS', help="Usar N velas sintéticas em vez da Binance")
+    parser.add_argument('--model', default='xgboost')
+    parser.add_argument('--splits', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+    
+    if args.synthetic:
+        from synthetic_data import generate_ohlcv
+        features_df = FeatureEngineer(generate_ohlcv(args.synthetic)).calculate_all_features()
+    else:
+        from data_collector import BinanceDataCollector
+        from candle_buffer import now_ms
+        from feature_cache import load_features
+        from config import SYMBOL, TIMEFRAME
+        start_ms = now_ms() - args.days * 24 * 60 * 60 * 1000
+        features_df = load_features(BinanceDataCollector(), SYMBOL, TIMEFRAME, start_ms)
+    
+    started = time.perf_counter()
+    results = walk_forward_backtest(features_df, model_type=args.model, n_splits=args.splits, n_jobs=args.jobs)
+    print(f"\nTempo do backtest: {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,501 @@
+"""
+Benchmarks offline de cada etapa do pipeline (dados sintéticos, sem rede),
+com resultados em JSON e comparação contra um baseline salvo
+"""
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from synthetic_data import generate_ohlcv
+from feature_engineering import FeatureEngineer
+from config import (
+    FEATURE_COLUMNS, BENCHMARK_DIR, BENCHMARK_BASELINE_PATH, BENCHMARK_REGRESSION_TOLERANCE
+)
+
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+QUICK_SIZES = [1_000, 10_000]
+
+# Tempo mínimo medido por benchmark (repetições extras para tempos curtos)
+MIN_MEASURE_SECONDS = 0.5
+MAX_REPEATS = 1000
+
+# Partidas a frio (interpretador novo) no benchmark de inicialização
+STARTUP_RUNS = 5
+
+# Módulos que o caminho de inferência não deve importar
+HEAVY_MODULES = ('sklearn', 'xgboost', 'lightgbm', 'joblib', 'binance', 'supabase', 'ta')
+
+# Executado em um interpretador novo: import do engine, modelo salvo e primeira previsão
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import realtime_engine
+imported = time.perf_counter()
+from ml_model import MLPredictor
+predictor = MLPredictor()
+predictor.load_model(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+
+from streaming_features import StreamingFeatureEngine
+from synthetic_data import generate_ohlcv
+engine = StreamingFeatureEngine()
+engine.warm_up(generate_ohlcv(100))
+predict_started = time.perf_counter()
+predictor.predict_row_with_details(engine.last_features, engine.last_timestamp, engine.last_close)
+predicted = time.perf_counter()
+
+print(json.dumps({
+    'import_s': imported - started,
+    'load_model_s': loaded - imported,
+    'first_prediction_s': predicted - predict_started,
+    'modules': [m for m in sys.argv[3].split(',') if m in sys.modules],
+}))
+"""
+
+
+def measure(fn: Callable[[], object], min_time: float = MIN_MEASURE_SECONDS, max_repeats: int = MAX_REPEATS) -> Dict:
+    """
+    Executa `fn` repetidamente (ao menos 3 vezes, ou 1 se for lenta) e
+    resume os tempos.
+    
+    Returns:
+        Dict com 'median_s', 'min_s', 'p95_s' e 'repeats'
+    """
+    times = []
+    total = 0.0
+    while len(times) < max_repeats:
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        times.append(elapsed)
+        total += elapsed
+        if total >= min_time and (len(times) >= 3 or elapsed >= min_time):
+            break
+    
+    times = np.array(times)
+    return {
+        'median_s': float(np.median(times)),
+        'min_s': float(times.min()),
+        'p95_s': float(np.percentile(times, 95)),
+        'repeats': len(times),
+    }
+
+
+def latency_summary(latencies_s: Sequence[float]) -> Dict:
+    """Percentis de latência (por evento) no mesmo formato de measure()."""
+    latencies = np.asarray(latencies_s)
+    return {
+        'median_s': float(np.median(latencies)),
+        'min_s': float(latencies.min()),
+        'p95_s': float(np.percentile(latencies, 95)),
+        'p99_s': float(np.percentile(latencies, 99)),
+        'repeats': len(latencies),
+    }
+
+
+class BenchmarkSuite:
+    """
+    Mede cada etapa do pipeline sobre velas sintéticas reprodutíveis (seed):
+    
+    - data.generate/N: gerador sintético
+    - features.all/N: FeatureEngineer.calculate_all_features
+    - features.rules/N, features.indicators/N, features.price_action/N: cada grupo
+    - features.streaming_update: StreamingFeatureEngine.update (por vela)
+    - predict.single, predict.single_library, predict.row_details: uma vela
+    - predict.batch/N: MLPredictor.predict_batch
+    - train.<modelo>/N: MLPredictor.train_model
+    - e2e.candle_to_signal: mensagem de kline -> sinal enfileirado no RealtimeEngine
+      (coletor sintético e store de sinais em memória)
+    - startup.import, startup.load_model, startup.first_prediction, startup.total:
+      partida a frio do engine em um interpretador novo (com o modelo salvo)
+    
+    Os resultados são chaveados por nome/tamanho; 'median_s' é a métrica
+    comparada com o baseline.
+    """
+    
+    def __init__(
+        self,
+        sizes: Sequence[int] = DEFAULT_SIZES,
+        train_max_rows: int = 100_000,
+        model_type: str = 'xgboost',
+        process: str = 'gbm',
+        seed: int = 42
+    ):
+        """
+        Args:
+            sizes: Números de velas avaliados nos benchmarks por tamanho
+            train_max_rows: Maior tamanho usado no benchmark de treino
+            model_type: Modelo treinado/pontuado
+            process: Processo do gerador sintético ('gbm' ou 'random_walk')
+            seed: Semente das velas sintéticas
+        """
+        self.sizes = sorted(sizes)
+        self.train_max_rows = train_max_rows
+        self.model_type = model_type
+        self.process = process
+        self.seed = seed
+        self.results: Dict[str, Dict] = {}
+        self._predictor = None
+    
+    def _record(self, name: str, result: Dict, rows: Optional[int] = None):
+        if rows:
+            result['rows'] = rows
+            result['ns_per_row'] = result['median_s'] / rows * 1e9
+        self.results[name] = result
+        per_row = f" ({result['ns_per_row']:.0f} ns/vela)" if rows else ''
+        print(f"  {name:<32} mediana {result['median_s'] * 1e3:10.3f} ms{per_row}")
+    
+    def _candles(self, n: int) -> pd.DataFrame:
+        return generate_ohlcv(n, seed=self.seed, process=self.process)
+    
+    # ========== ETAPAS ==========
+    
+    def bench_data(self, n: int, candles: pd.DataFrame):
+        self._record(f"data.generate/{n}", measure(lambda: self._candles(n), min_time=0.1), n)
+    
+    def bench_features(self, n: int, candles: pd.DataFrame):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = measure(lambda: FeatureEngineer(candles).calculate_all_features())
+        self._record(f"features.all/{n}", result, n)
+        
+        # Grupos isolados sobre um engineer já preparado (cor calculada)
+        engineer = FeatureEngineer(candles)
+        engineer.features_df['color'] = (candles['close'] > candles['open']).astype(int)
+        groups = {
+            'rules': engineer._calculate_probabilistic_rules,
+            'indicators': engineer._calculate_technical_indicators,
+            'price_action': engineer._calculate_price_action,
+        }
+        for group, method in groups.items():
+            self._record(f"features.{group}/{n}", measure(method), n)
+    
+    def bench_streaming(self, candles: pd.DataFrame):
+        from streaming_features import StreamingFeatureEngine
+        
+        engine = StreamingFeatureEngine()
+        engine.warm_up(candles.iloc[:200])
+        latencies = []
+        for candle in candles.iloc[200:].to_dict('records'):
+            started = time.perf_counter()
+            engine.update(candle)
+            latencies.append(time.perf_counter() - started)
+        self._record("features.streaming_update", latency_summary(latencies))
+    
+    def _trained_predictor(self):
+        """Preditor treinado uma única vez em 20k velas sintéticas (sem salvar em disco)."""
+        if self._predictor is None:
+            from ml_model import MLPredictor
+            with contextlib.redirect_stdout(io.StringIO()):
+                features = FeatureEngineer(generate_ohlcv(20_000, seed=self.seed)).calculate_all_features()
+                self._predictor = MLPredictor()
+                self._predictor.train_model(features, model_type=self.model_type, save_model=False)
+        return self._predictor
+    
+    def bench_predict_single(self, candles: pd.DataFrame):
+        predictor = self._trained_predictor()
+        with contextlib.redirect_stdout(io.StringIO()):
+            features_df = FeatureEngineer(candles.iloc[-300:]).calculate_all_features(inference=True)
+        last = features_df.iloc[-1]
+        row = {col: float(last[col]) for col in FEATURE_COLUMNS}
+        
+        self._record("predict.single", measure(lambda: predictor.predict(features_df), min_time=0.2))
+        self._record("predict.row_details", measure(
+            lambda: predictor.predict_row_with_details(row, last['timestamp'], float(last['close'])), min_time=0.2
+        ))
+        
+        compiled, predictor.compiled = predictor.compiled, None
+        try:
+            self._record("predict.single_library", measure(lambda: predictor.predict(features_df), min_time=0.2))
+        finally:
+            predictor.compiled = compiled
+    
+    def bench_predict_batch(self, n: int, features_df: pd.DataFrame):
+        predictor = self._trained_predictor()
+        X = features_df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+        self._record(f"predict.batch/{n}", measure(lambda: predictor.predict_batch(X)), len(X))
+    
+    def bench_train(self, n: int, features_df: pd.DataFrame):
+        from ml_model import MLPredictor
+        
+        def train():
+            with contextlib.redirect_stdout(io.StringIO()):
+                MLPredictor().train_model(features_df, model_type=self.model_type, save_model=False)
+        
+        self._record(f"train.{self.model_type}/{n}", measure(train, min_time=0.0, max_repeats=1), len(features_df))
+    
+    def bench_end_to_end(self, n_messages: int = 2000):
+        """
+        Latência de uma vela fechada (mensagem JSON) até o sinal enfileirado,
+        chamando RealtimeEngine._process_message diretamente (sem socket).
+        Roda com e sem as métricas por etapa para medir o custo da instrumentação.
+        """
+        try:
+            from realtime_engine import RealtimeEngine
+        except ImportError as e:
+            print(f"  ⚠ e2e.candle_to_signal ignorado (dependência ausente: {e})")
+            return
+        from synthetic_data import SyntheticCollector
+        from signal_writer import InMemorySignalStore
+        from candle_buffer import interval_to_ms
+        from metrics import EngineMetrics
+        
+        predictor = self._trained_predictor()
+        
+        def build_engine(metrics_enabled: bool):
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine = RealtimeEngine(
+                    streams=[('BTCUSDT', '1m')],
+                    collector=SyntheticCollector(seed=self.seed),
+                    signal_store=InMemorySignalStore(),
+                    metrics=EngineMetrics(enabled=metrics_enabled),
+                    prediction_workers=0  # Vela -> sinal dentro da própria chamada
+                )
+                state = next(iter(engine.streams.values()))
+                state.predictor = predictor
+                asyncio.run(engine._init_buffers())
+            return engine, state
+        
+        engine, state = build_engine(True)
+        interval_ms = interval_to_ms('1m')
+        first_open = state.candles_buffer.last_open_time + interval_ms
+        candles = generate_ohlcv(n_messages, seed=self.seed + 1, start_ms=first_open, process=self.process)
+        open_times = candles['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        messages = [
+            json.dumps({'stream': state.name, 'data': {'e': 'kline', 's': 'BTCUSDT', 'k': {
+                't': int(t), 'T': int(t) + interval_ms - 1, 's': 'BTCUSDT', 'i': '1m',
+                'o': f"{o:.2f}", 'h': f"{h:.2f}", 'l': f"{l:.2f}", 'c': f"{c:.2f}", 'v': f"{v:.4f}", 'x': True,
+            }}})
+            for t, o, h, l, c, v in zip(
+                open_times, candles['open'], candles['high'], candles['low'], candles['close'], candles['volume']
+            )
+        ]
+        
+        async def replay(engine) -> List[float]:
+            latencies = []
+            for message in messages:
+                started = time.perf_counter()
+                await engine._process_message(message)
+                latencies.append(time.perf_counter() - started)
+            return latencies
+        
+        for name, metrics_enabled in (("e2e.candle_to_signal", True), ("e2e.candle_to_signal_no_metrics", False)):
+            if not metrics_enabled:
+                engine, state = build_engine(False)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    latencies = asyncio.run(replay(engine))
+            finally:
+                engine.signal_writer.close()
+        
+            result = latency_summary(latencies)
+            result['signals'] = engine.signal_writer.stats.get('inserted', 0)
+            if metrics_enabled:
+                result['stages'] = engine.metrics.snapshot()
+            self._record(name, result)
+    
+    def bench_startup(self, runs: int = STARTUP_RUNS):
+        """
+        Partida a frio: salva o preditor treinado em um diretório temporário e
+        mede, em interpretadores novos, o import do realtime_engine, o
+        load_model e a primeira previsão (e quais módulos pesados foram importados).
+        """
+        predictor = self._trained_predictor()
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, 'model.pkl')
+            scaler_path = os.path.join(directory, 'scaler.pkl')
+            with contextlib.redirect_stdout(io.StringIO()):
+                predictor.save_model(model_path, scaler_path)
+            
+            samples = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                output = subprocess.run(
+                    [sys.executable, '-c', STARTUP_SCRIPT, model_path, scaler_path, ','.join(HEAVY_MODULES)],
+                    cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+                ).stdout
+                sample = json.loads(output.strip().splitlines()[-1])
+                sample['process_s'] = time.perf_counter() - started
+                samples.append(sample)
+        
+        for name, key in (('import', 'import_s'), ('load_model', 'load_model_s'), ('first_prediction', 'first_prediction_s')):
+            self._record(f"startup.{name}", latency_summary([sample[key] for sample in samples]))
+        total = latency_summary([sample['import_s'] + sample['load_model_s'] + sample['first_prediction_s'] for sample in samples])
+        total['process_median_s'] = float(np.median([sample['process_s'] for sample in samples]))
+        total['heavy_modules'] = samples[-1]['modules']
+        self._record("startup.total", total)
+        if total['heavy_modules']:
+            print(f"  ⚠ Módulos pesados importados na partida: {', '.join(total['heavy_modules'])}")
+    
+    # ========== EXECUÇÃO ==========
+    
+    def run(self, stages: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Executa os benchmarks.
+        
+        Args:
+            stages: Subconjunto de etapas ('data', 'features', 'streaming',
+                    'predict', 'train', 'e2e', 'startup'); None = todas
+        
+        Returns:
+            Dict {'meta': ambiente, 'results': {nome: métricas}}
+        """
+        stages = set(stages or ['data', 'features', 'streaming', 'predict', 'train', 'e2e', 'startup'])
+        print(f"\n{'='*60}")
+        print(f"BENCHMARKS - tamanhos {self.sizes} ({self.process}, seed {self.seed})")
+        print(f"{'='*60}\n")
+        
+        for n in self.sizes:
+            candles = self._candles(n)
+            if 'data' in stages:
+                self.bench_data(n, candles)
+            if 'features' in stages:
+                self.bench_features(n, candles)
+            if stages & {'predict', 'train'}:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    features_df = FeatureEngineer(candles).calculate_all_features()
+                if 'predict' in stages:
+                    self.bench_predict_batch(n, features_df)
+                if 'train' in stages and n <= self.train_max_rows:
+                    self.bench_train(n, features_df)
+                del features_df
+            del candles
+        
+        small = self._candles(5_000)
+        if 'streaming' in stages:
+            self.bench_streaming(small)
+        if 'predict' in stages:
+            self.bench_predict_single(small)
+        if 'e2e' in stages:
+            self.bench_end_to_end()
+        if 'startup' in stages:
+            self.bench_startup()
+        
+        return {'meta': self.environment(), 'results': self.results}
+    
+    def environment(self) -> Dict:
+        """Parâmetros da execução e versões relevantes (para comparar resultados)."""
+        import sklearn
+        import xgboost
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'sizes': self.sizes,
+            'process': self.process,
+            'seed': self.seed,
+            'model_type': self.model_type,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'xgboost': xgboost.__version__,
+        }
+
+
+# ========== RESULTADOS E BASELINE ==========
+
+def save_results(report: Dict, path: str):
+    """Grava o relatório em JSON (criando o diretório)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_results(path: str) -> Optional[Dict]:
+    """Lê um relatório salvo (None se não existir)."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(
+    current: Dict,
+    baseline: Dict,
+    tolerance: float = BENCHMARK_REGRESSION_TOLERANCE
+) -> pd.DataFrame:
+    """
+    Compara as medianas com o baseline (benchmarks presentes nos dois).
+    
+    Args:
+        current: Relatório atual
+        baseline: Relatório de referência
+        tolerance: Aumento relativo aceito antes de marcar regressão (0.25 = 25%)
+    
+    Returns:
+        DataFrame com baseline, atual, razão e a coluna 'regression'
+    """
+    rows = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None:
+            continue
+        ratio = result['median_s'] / reference['median_s'] if reference['median_s'] > 0 else float('nan')
+        rows.append({
+            'benchmark': name,
+            'baseline_ms': reference['median_s'] * 1e3,
+            'current_ms': result['median_s'] * 1e3,
+            'ratio': ratio,
+            'regression': bool(ratio > 1 + tolerance),
+        })
+    return pd.DataFrame(rows, columns=['benchmark', 'baseline_ms', 'current_ms', 'ratio', 'regression'])
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Benchmarks offline do pipeline do Super Analista")
+    parser.add_argument('--sizes', default=','.join(str(n) for n in DEFAULT_SIZES),
+                        help="Números de velas separados por vírgula (ex: 1000,100000,10000000)")
+    parser.add_argument('--quick', action='store_true', help=f"Tamanhos pequenos ({QUICK_SIZES})")
+    parser.add_argument('--stages', default=None, help="Etapas separadas por vírgula (padrão: todas)")
+    parser.add_argument('--model', default='xgboost')
+    parser.add_argument('--process', choices=['gbm', 'random_walk'], default='gbm')
+    parser.add_argument('--train-max', type=int, default=100_000, help="Maior tamanho no benchmark de treino")
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=BENCHMARK_BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help="Grava o resultado como novo baseline")
+    parser.add_argument('--tolerance', type=float, default=BENCHMARK_REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+    
+    sizes = QUICK_SIZES if args.quick else [int(n) for n in args.sizes.split(',')]
+    suite = BenchmarkSuite(sizes=sizes, train_max_rows=args.train_max, model_type=args.model, process=args.process)
+    report = suite.run(args.stages.split(',') if args.stages else None)
+    
+    save_results(report, args.output)
+    print(f"\n✓ Resultados gravados em {args.output}")
+    
+    if args.save_baseline:
+        save_results(report, args.baseline)
+        print(f"✓ Baseline gravado em {args.baseline}")
+        sys.exit(0)
+    
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        print(f"⚠ Sem baseline em {args.baseline} (use --save-baseline)")
+        sys.exit(0)
+    
+    comparison = compare_results(report, baseline, args.tolerance)
+    print(f"\n--- Comparação com o baseline ({baseline['meta']['created_at']}) ---")
+    print(comparison.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    
+    regressions = comparison[comparison['regression']]
+    if len(regressions):
+        print(f"\n⚠ {len(regressions)} benchmarks mais de {args.tolerance * 100:.0f}% mais lentos que o baseline")
+        sys.exit(1)
+    print("\n✓ Nenhuma regressão acima da tolerância")
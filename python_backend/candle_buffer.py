@@ -0,0 +1,248 @@
+"""
+Buffer circular de velas OHLCV baseado em arrays NumPy pré-alocados
+"""
+import time
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import LOOKBACK_PERIODS
+
+
+OHLCV_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+_INTERVAL_UNITS_MS = {
+    's': 1000,
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+}
+
+
+def interval_to_ms(interval: str) -> int:
+    """
+    Converte um timeframe da Binance em milissegundos.
+    
+    Args:
+        interval: Timeframe (ex: '1m', '5m', '1h', '1d')
+    
+    Returns:
+        Duração de uma vela em milissegundos
+    """
+    unit = interval[-1]
+    if unit not in _INTERVAL_UNITS_MS:
+        raise ValueError(f"Timeframe não suportado: {interval}")
+    return int(interval[:-1]) * _INTERVAL_UNITS_MS[unit]
+
+
+def now_ms() -> int:
+    """Horário atual em epoch-ms."""
+    return int(time.time() * 1000)
+
+
+class CandleRingBuffer:
+    """
+    Buffer circular de capacidade fixa para velas OHLCV.
+    
+    - open_time em int64 (epoch-ms), colunas OHLCV em float64
+    - append/overwrite em O(1), sem alocação por vela
+    - Cada valor é escrito duas vezes (posição i e i + capacity), de modo
+      que as últimas N velas sempre formam uma fatia contígua do array:
+      views() devolve arrays sem cópia
+    """
+    
+    def __init__(self, capacity: int = LOOKBACK_PERIODS):
+        """
+        Args:
+            capacity: Número máximo de velas mantidas
+        """
+        if capacity <= 0:
+            raise ValueError("capacity deve ser positiva")
+        
+        self.capacity = capacity
+        self._open_time = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(OHLCV_COLUMNS), 2 * capacity), dtype=np.float64)
+        self._write_pos = 0
+        self._size = 0
+        
+        # Versão incrementada a cada escrita (invalida o DataFrame em cache)
+        self._version = 0
+        self._frame_cache = None
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def last_open_time(self) -> Optional[int]:
+        """open_time (epoch-ms) da vela mais recente, ou None se vazio."""
+        if self._size == 0:
+            return None
+        return int(self._open_time[self._end - 1])
+    
+    @property
+    def _end(self) -> int:
+        # Fim (exclusivo) da fatia contígua que contém as velas mais recentes
+        return self._write_pos + self.capacity
+    
+    def clear(self):
+        """Remove todas as velas (mantém a memória alocada)."""
+        self._write_pos = 0
+        self._size = 0
+        self._version += 1
+        self._frame_cache = None
+    
+    def append(
+        self,
+        open_time: int,
+        open_: float,
+        high: float,
+        low: float,
+        close: float,
+        volume: float
+    ) -> bool:
+        """
+        Adiciona uma vela. Se open_time for igual ao da última vela,
+        sobrescreve-a (vela ainda em formação / duplicada).
+        
+        Returns:
+            True se uma nova posição foi ocupada, False se foi sobrescrita
+        """
+        open_time = int(open_time)
+        last = self.last_open_time
+        if last is not None and open_time < last:
+            # Vela antiga (fora de ordem): ignorar
+            return False
+        
+        overwrite = last is not None and open_time == last
+        if overwrite:
+            pos = (self._write_pos - 1) % self.capacity
+        else:
+            pos = self._write_pos
+        
+        mirror = pos + self.capacity
+        self._open_time[pos] = open_time
+        self._open_time[mirror] = open_time
+        row = (open_, high, low, close, volume)
+        for i in range(len(OHLCV_COLUMNS)):
+            self._values[i, pos] = row[i]
+            self._values[i, mirror] = row[i]
+        
+        if not overwrite:
+            self._write_pos = (pos + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+        
+        self._version += 1
+        self._frame_cache = None
+        return not overwrite
+    
+    def append_candle(self, candle: Dict) -> bool:
+        """Adiciona uma vela no formato dict (timestamp pode ser datetime ou epoch-ms)."""
+        return self.append(
+            _to_epoch_ms(candle['timestamp']),
+            candle['open'], candle['high'], candle['low'], candle['close'], candle['volume']
+        )
+    
+    def extend_from_frame(self, df: pd.DataFrame):
+        """
+        Adiciona todas as velas de um DataFrame [timestamp, open, high, low, close, volume].
+        Apenas as últimas `capacity` velas são efetivamente mantidas.
+        """
+        if df.empty:
+            return
+        
+        df = df.iloc[-self.capacity:]
+        open_times = _timestamps_to_epoch_ms(df['timestamp'])
+        values = df[list(OHLCV_COLUMNS)].to_numpy(dtype=np.float64)
+        for t, row in zip(open_times, values):
+            self.append(t, *row)
+    
+    def extend_from_views(self, views: Dict[str, np.ndarray]):
+        """Adiciona as velas de um dict de arrays no formato de views() (ex: snapshot)."""
+        open_times = views['open_time'][-self.capacity:].tolist()
+        columns = [views[col][-self.capacity:].tolist() for col in OHLCV_COLUMNS]
+        for t, *row in zip(open_times, *columns):
+            self.append(t, *row)
+    
+    def views(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Views contíguas (sem cópia) das últimas N velas.
+        
+        Os arrays são válidos até a próxima escrita no buffer; copie-os
+        se precisar mantê-los.
+        
+        Args:
+            n: Quantidade de velas (padrão: todas)
+        
+        Returns:
+            Dict {'open_time', 'open', 'high', 'low', 'close', 'volume'} -> np.ndarray
+        """
+        n = self._size if n is None else min(n, self._size)
+        end = self._end
+        start = end - n
+        
+        result = {'open_time': self._open_time[start:end]}
+        for i, col in enumerate(OHLCV_COLUMNS):
+            result[col] = self._values[i, start:end]
+        return result
+    
+    def to_frame(self, n: Optional[int] = None) -> pd.DataFrame:
+        """
+        DataFrame das últimas N velas, construído sob demanda e mantido em cache
+        até a próxima escrita.
+        
+        Returns:
+            DataFrame com colunas: timestamp, open, high, low, close, volume
+        """
+        n = self._size if n is None else min(n, self._size)
+        cache_key = (self._version, n)
+        if self._frame_cache is not None and self._frame_cache[0] == cache_key:
+            return self._frame_cache[1]
+        
+        views = self.views(n)
+        df = pd.DataFrame({
+            'timestamp': pd.to_datetime(views['open_time'], unit='ms'),
+            **{col: views[col].copy() for col in OHLCV_COLUMNS}
+        })
+        self._frame_cache = (cache_key, df)
+        return df
+    
+    def last_candle(self) -> Optional[Dict]:
+        """Última vela como dict (timestamp como pd.Timestamp)."""
+        if self._size == 0:
+            return None
+        idx = self._end - 1
+        candle = {'timestamp': pd.to_datetime(int(self._open_time[idx]), unit='ms')}
+        for i, col in enumerate(OHLCV_COLUMNS):
+            candle[col] = float(self._values[i, idx])
+        return candle
+
+
+def _to_epoch_ms(value) -> int:
+    """Converte int/datetime/pd.Timestamp em epoch-ms."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return int(pd.Timestamp(value).value // 1_000_000)
+
+
+def _timestamps_to_epoch_ms(series: pd.Series) -> np.ndarray:
+    """Converte uma coluna de timestamps (datetime ou epoch-ms) em array int64 de epoch-ms."""
+    if np.issubdtype(series.dtype, np.integer):
+        return series.to_numpy(dtype=np.int64)
+    return series.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+# Função de teste
+if __name__ == "__main__":
+    buffer = CandleRingBuffer(capacity=5)
+    
+    for i in range(8):
+        buffer.append(i * 60_000, 100 + i, 101 + i, 99 + i, 100.5 + i, 10.0)
+    
+    # Sobrescrever a última vela (mesmo open_time)
+    buffer.append(7 * 60_000, 107, 110, 106, 109, 12.0)
+    
+    print(f"Tamanho: {len(buffer)} / capacidade {buffer.capacity}")
+    print(f"Closes (view): {buffer.views()['close']}")
+    print(buffer.to_frame())
@@ -0,0 +1,343 @@
+"""
+Armazenamento local de velas em arrays NumPy particionados por símbolo/timeframe/dia
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import interval_to_ms, now_ms, OHLCV_COLUMNS
+from config import CANDLE_STORE_DIR
+
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Layout de cada partição diária (um registro por vela, ordenado por open_time)
+CANDLE_DTYPE = np.dtype([
+    ('open_time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.float64),
+])
+
+# Quantos dias baixar por vez durante o sync (limita o uso de memória)
+SYNC_CHUNK_DAYS = 30
+
+# Serializa o ler-mesclar-gravar das partições entre threads (backfill de um
+# stream e verificação de sinais pendentes podem gravar o mesmo dia)
+_WRITE_LOCK = threading.Lock()
+
+
+class CandleStore:
+    """
+    Armazenamento colunar de velas em disco:
+        
+        {root}/{SYMBOL}/{interval}/{YYYY-MM-DD}.npy
+    
+    Cada partição é um array estruturado (CANDLE_DTYPE) lido via memory-map,
+    então consultas por período só tocam os dias necessários. Apenas velas
+    fechadas são gravadas; sync() baixa somente o que falta.
+    """
+    
+    def __init__(self, root: str = CANDLE_STORE_DIR):
+        """
+        Args:
+            root: Diretório raiz do armazenamento
+        """
+        self.root = root
+    
+    # ========== PARTIÇÕES ==========
+    
+    def _dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol.upper(), interval)
+    
+    def _path(self, symbol: str, interval: str, day: str) -> str:
+        return os.path.join(self._dir(symbol, interval), f"{day}.npy")
+    
+    @staticmethod
+    def _day_of(open_time_ms: int) -> str:
+        return datetime.fromtimestamp(open_time_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+    
+    def days(self, symbol: str, interval: str) -> List[str]:
+        """Dias (YYYY-MM-DD) com partição gravada, em ordem cronológica."""
+        directory = self._dir(symbol, interval)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.npy'))
+    
+    def _load_day(self, symbol: str, interval: str, day: str, mmap: bool = True) -> np.ndarray:
+        path = self._path(symbol, interval, day)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.load(path, mmap_mode='r' if mmap else None)
+    
+    def _write_day(self, symbol: str, interval: str, day: str, records: np.ndarray):
+        """Grava uma partição de forma atômica (arquivo temporário único + rename)."""
+        path = self._path(symbol, interval, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+    
+    # ========== ESCRITA ==========
+    
+    def write(self, symbol: str, interval: str, df: pd.DataFrame) -> int:
+        """
+        Grava velas no armazenamento, mesclando com as partições existentes
+        (velas repetidas são substituídas pela versão nova).
+        
+        Args:
+            df: DataFrame com colunas [timestamp, open, high, low, close, volume]
+        
+        Returns:
+            Número de velas recebidas
+        """
+        if df.empty:
+            return 0
+        
+        records = frame_to_records(df)
+        days = (records['open_time'] // DAY_MS) * DAY_MS
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        
+        for chunk in np.split(records, boundaries):
+            day = self._day_of(int(chunk['open_time'][0]))
+            with _WRITE_LOCK:
+                existing = self._load_day(symbol, interval, day, mmap=False)
+                merged = np.concatenate([chunk, existing]) if len(existing) else chunk
+                # Remove duplicadas; registros novos têm prioridade sobre os existentes
+                _, first_idx = np.unique(merged['open_time'], return_index=True)
+                self._write_day(symbol, interval, day, merged[first_idx])
+        
+        return len(records)
+    
+    # ========== LEITURA ==========
+    
+    def read_records(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Lê as velas com open_time em [start_ms, end_ms) como array estruturado.
+        Apenas as partições do período são abertas (via memory-map).
+        """
+        days = self.days(symbol, interval)
+        if start_ms is not None:
+            first_day = self._day_of(start_ms)
+            days = [d for d in days if d >= first_day]
+        if end_ms is not None:
+            last_day = self._day_of(end_ms - 1)
+            days = [d for d in days if d <= last_day]
+        
+        parts = []
+        for day in days:
+            data = self._load_day(symbol, interval, day)
+            lo = 0 if start_ms is None else np.searchsorted(data['open_time'], start_ms, side='left')
+            hi = len(data) if end_ms is None else np.searchsorted(data['open_time'], end_ms, side='left')
+            if hi > lo:
+                parts.append(data[lo:hi])
+        
+        if not parts:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.concatenate(parts)
+    
+    def read_arrays(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Lê o período como arrays contíguos por coluna.
+        
+        Returns:
+            Dict {'open_time', 'open', 'high', 'low', 'close', 'volume'} -> np.ndarray
+        """
+        records = self.read_records(symbol, interval, start_ms, end_ms)
+        return {name: np.ascontiguousarray(records[name]) for name in CANDLE_DTYPE.names}
+    
+    def read(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Lê o período como DataFrame.
+        
+        Returns:
+            DataFrame com colunas: timestamp, open, high, low, close, volume
+        """
+        return records_to_frame(self.read_records(symbol, interval, start_ms, end_ms))
+    
+    def read_last(self, symbol: str, interval: str, limit: int) -> pd.DataFrame:
+        """Lê as últimas `limit` velas gravadas, abrindo apenas os dias necessários."""
+        parts = []
+        total = 0
+        for day in reversed(self.days(symbol, interval)):
+            data = self._load_day(symbol, interval, day)
+            parts.append(data)
+            total += len(data)
+            if total >= limit:
+                break
+        
+        if not parts:
+            return records_to_frame(np.empty(0, dtype=CANDLE_DTYPE))
+        return records_to_frame(np.concatenate(parts[::-1])[-limit:])
+    
+    def first_open_time(self, symbol: str, interval: str) -> Optional[int]:
+        """open_time da primeira vela gravada (ou None)."""
+        days = self.days(symbol, interval)
+        if not days:
+            return None
+        data = self._load_day(symbol, interval, days[0])
+        return int(data['open_time'][0]) if len(data) else None
+    
+    def last_open_time(self, symbol: str, interval: str) -> Optional[int]:
+        """open_time da última vela gravada (ou None)."""
+        days = self.days(symbol, interval)
+        if not days:
+            return None
+        data = self._load_day(symbol, interval, days[-1])
+        return int(data['open_time'][-1]) if len(data) else None
+    
+    # ========== SINCRONIZAÇÃO ==========
+    
+    def sync(
+        self,
+        downloader,
+        symbol: str,
+        interval: str,
+        start_ms: int,
+        end_ms: Optional[int] = None,
+        verbose: bool = True
+    ) -> int:
+        """
+        Baixa apenas as velas fechadas que faltam em [start_ms, end_ms): o
+        trecho anterior à primeira vela gravada e tudo após a última. O período
+        gravado é sempre contíguo (lacunas no meio dele não são verificadas),
+        então o trecho anterior é baixado do fim para o início e o posterior
+        sempre começa logo após a última vela, mesmo que start_ms seja maior.
+        
+        Args:
+            downloader: HistoricalDownloader usado para buscar os dados
+            start_ms: Início desejado (epoch-ms)
+            end_ms: Fim exclusivo (padrão: agora). Velas em formação nunca são gravadas.
+        
+        Returns:
+            Número de velas novas gravadas
+        """
+        interval_ms = interval_to_ms(interval)
+        last_closed_end = (now_ms() // interval_ms) * interval_ms
+        end_ms = last_closed_end if end_ms is None else min(end_ms, last_closed_end)
+        start_ms = (start_ms // interval_ms) * interval_ms
+        
+        first = self.first_open_time(symbol, interval)
+        last = self.last_open_time(symbol, interval)
+        
+        if first is None:
+            written = self._sync_range(downloader, symbol, interval, start_ms, end_ms, False, verbose)
+        else:
+            written = self._sync_range(downloader, symbol, interval, start_ms, first, True, verbose)
+            written += self._sync_range(downloader, symbol, interval, last + interval_ms, end_ms, False, verbose)
+        
+        if verbose and written:
+            print(f"✓ {written} velas novas gravadas em {self._dir(symbol, interval)}")
+        return written
+
+    def _sync_range(
+        self,
+        downloader,
+        symbol: str,
+        interval: str,
+        range_start: int,
+        range_end: int,
+        backward: bool,
+        verbose: bool
+    ) -> int:
+        """
+        Baixa [range_start, range_end) em blocos de SYNC_CHUNK_DAYS dias. Se uma
+        página falhar, grava só a parte contígua ao período já gravado (antes
+        da primeira falha ou, com backward=True, depois da última) e para.
+        
+        Args:
+            backward: Blocos do fim para o início (trecho que termina na primeira vela gravada)
+        
+        Returns:
+            Número de velas gravadas
+        """
+        chunk_ms = SYNC_CHUNK_DAYS * DAY_MS
+        if backward:
+            chunks = [(max(chunk_end - chunk_ms, range_start), chunk_end)
+                      for chunk_end in range(range_end, range_start, -chunk_ms)]
+        else:
+            chunks = [(chunk_start, min(chunk_start + chunk_ms, range_end))
+                      for chunk_start in range(range_start, range_end, chunk_ms)]
+        
+        written = 0
+        for chunk_start, chunk_end in chunks:
+            df, failed_pages = downloader.download(symbol, interval, chunk_start, chunk_end, verbose=verbose)
+            
+            if failed_pages:
+                open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+                if backward:
+                    # page_end é inclusivo: só as velas depois da última página com falha
+                    cut = max(page_end for _, page_end in failed_pages)
+                    written += self.write(symbol, interval, df[open_times > cut])
+                else:
+                    cut = min(page_start for page_start, _ in failed_pages)
+                    written += self.write(symbol, interval, df[open_times < cut])
+                print(f"⚠ Sync de {symbol} {interval} interrompido em {cut}: páginas com falha")
+                return written
+            
+            written += self.write(symbol, interval, df)
+        return written
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    """Converte um DataFrame OHLCV em array estruturado ordenado por open_time."""
+    records = np.empty(len(df), dtype=CANDLE_DTYPE)
+    timestamps = df['timestamp']
+    if np.issubdtype(timestamps.dtype, np.integer):
+        records['open_time'] = timestamps.to_numpy(dtype=np.int64)
+    else:
+        records['open_time'] = timestamps.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    for col in OHLCV_COLUMNS:
+        records[col] = df[col].to_numpy(dtype=np.float64)
+    records.sort(order='open_time')
+    return records
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    """Converte um array estruturado em DataFrame OHLCV."""
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(records['open_time'], unit='ms'),
+        **{col: np.array(records[col], dtype=np.float64) for col in OHLCV_COLUMNS}
+    })
+
+
+# Função de teste
+if __name__ == "__main__":
+    from datetime import timedelta
+    from download_scheduler import HistoricalDownloader
+    from config import SYMBOL, TIMEFRAME
+    
+    store = CandleStore()
+    downloader = HistoricalDownloader()
+    
+    start = int((datetime.now() - timedelta(days=3)).timestamp() * 1000)
+    store.sync(downloader, SYMBOL, TIMEFRAME, start)
+    
+    df = store.read(SYMBOL, TIMEFRAME, start_ms=start)
+    print(df.tail())
+    print(f"Shape: {df.shape} | Partições: {store.days(SYMBOL, TIMEFRAME)}")
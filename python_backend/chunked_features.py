@@ -0,0 +1,356 @@
+"""
+Cálculo de features em blocos fora da memória: lê as partições de velas do
+CandleStore, calcula cada bloco com velas de aquecimento e grava partições
+diárias de features em disco
+"""
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import interval_to_ms
+from candle_store import CandleStore, DAY_MS
+from feature_cache import frame_to_records, records_to_frame
+from feature_engineering import FeatureEngineer
+from config import (
+    FEATURE_COLUMNS, FEATURE_PARTITION_DIR, FEATURE_CHUNK_DAYS,
+    FEATURE_WARMUP_PERIODS, COMPACT_FEATURES, CANDLE_STORE_DIR
+)
+
+
+def _build_chunk(
+    candle_root: str,
+    feature_root: str,
+    symbol: str,
+    interval: str,
+    range_start: int,
+    range_end: int,
+    chunk_start: int,
+    chunk_end: int,
+    warmup: int,
+    compact: bool
+) -> int:
+    """
+    Calcula as features das velas de [chunk_start, chunk_end) e grava as
+    partições diárias correspondentes (executado em processo separado
+    quando n_jobs > 1).
+    
+    Lê `warmup` velas antes do bloco (histórico dos indicadores) e uma vela
+    depois (alvo da última vela do bloco), sem passar dos limites do período
+    total, para que cada linha seja a mesma do cálculo em memória.
+    
+    Returns:
+        Número de linhas de features gravadas
+    """
+    interval_ms = interval_to_ms(interval)
+    read_start = max(range_start, chunk_start - warmup * interval_ms)
+    read_end = min(range_end, chunk_end + interval_ms)
+    
+    candles = CandleStore(candle_root).read(symbol, interval, read_start, read_end)
+    if candles.empty:
+        return 0
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        features_df = FeatureEngineer(candles, compact=compact).calculate_all_features()
+    if features_df.empty:
+        return 0
+    
+    records = frame_to_records(features_df)
+    timestamps = records['timestamp']
+    records = records[(timestamps >= chunk_start) & (timestamps < chunk_end)]
+    
+    FeaturePartitionStore(feature_root).write_records(symbol, interval, records)
+    return len(records)
+
+
+class FeaturePartitionStore(CandleStore):
+    """
+    Features de treino particionadas por dia, no mesmo layout do CandleStore:
+        
+        {root}/{SYMBOL}/{interval}/{YYYY-MM-DD}.npy
+    
+    Cada partição é um array estruturado com as colunas do FeatureEngineer
+    ('timestamp' em epoch-ms). build() calcula o histórico em blocos de
+    `chunk_days` dias, então nenhum processo mantém mais que um bloco (mais
+    o aquecimento) em memória; a leitura é feita por período via
+    memory-map ou diretamente para arquivos .npy (to_memmap).
+    """
+    
+    def __init__(self, root: str = FEATURE_PARTITION_DIR):
+        """
+        Args:
+            root: Diretório raiz das partições de features
+        """
+        super().__init__(root)
+    
+    # ========== ESCRITA ==========
+    
+    def write_records(self, symbol: str, interval: str, records: np.ndarray) -> int:
+        """
+        Grava linhas de features, substituindo as partições dos dias cobertos.
+        
+        Returns:
+            Número de linhas gravadas
+        """
+        if len(records) == 0:
+            return 0
+        
+        days = (records['timestamp'] // DAY_MS) * DAY_MS
+        boundaries = np.flatnonzero(np.diff(days)) + 1
+        for chunk in np.split(records, boundaries):
+            self._write_day(symbol, interval, self._day_of(int(chunk['timestamp'][0])), chunk)
+        return len(records)
+    
+    def build(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        candle_store: Optional[CandleStore] = None,
+        chunk_days: int = FEATURE_CHUNK_DAYS,
+        warmup: int = FEATURE_WARMUP_PERIODS,
+        compact: bool = COMPACT_FEATURES,
+        n_jobs: int = 1,
+        verbose: bool = True
+    ) -> int:
+        """
+        Calcula as features das velas gravadas em [start_ms, end_ms) bloco a
+        bloco e grava as partições diárias.
+        
+        O resultado é o mesmo de FeatureEngineer.calculate_all_features()
+        sobre o período inteiro em memória: colunas discretas idênticas e
+        contínuas iguais até o arredondamento de ponto flutuante (`warmup`
+        velas bastam para a janela de 50 velas e a convergência de EMA/RSI).
+        
+        Args:
+            symbol: Par de trading
+            interval: Timeframe
+            start_ms: Início em epoch-ms (padrão: primeira vela gravada)
+            end_ms: Fim exclusivo em epoch-ms (padrão: após a última vela gravada)
+            candle_store: Origem das velas (padrão: CandleStore())
+            chunk_days: Dias de velas por bloco
+            warmup: Velas de aquecimento lidas antes de cada bloco
+            compact: Gravar as features no modo compacto (float32/int8)
+            n_jobs: Processos em paralelo entre blocos (1 = sequencial)
+            verbose: Mostrar progresso
+        
+        Returns:
+            Número de linhas de features gravadas
+        """
+        candle_store = candle_store or CandleStore(CANDLE_STORE_DIR)
+        interval_ms = interval_to_ms(interval)
+        
+        if start_ms is None:
+            start_ms = candle_store.first_open_time(symbol, interval)
+        if end_ms is None:
+            last = candle_store.last_open_time(symbol, interval)
+            end_ms = None if last is None else last + interval_ms
+        if start_ms is None or end_ms is None or start_ms >= end_ms:
+            return 0
+        
+        chunks = self._chunks(start_ms, end_ms, chunk_days)
+        args = [
+            (candle_store.root, self.root, symbol, interval, start_ms, end_ms, chunk_start, chunk_end, warmup, compact)
+            for chunk_start, chunk_end in chunks
+        ]
+        
+        if verbose:
+            print(f"Calculando features de {symbol} {interval} em {len(chunks)} blocos de até {chunk_days} dias...")
+        
+        written = 0
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                futures = [pool.submit(_build_chunk, *chunk_args) for chunk_args in args]
+                for future in futures:
+                    written += future.result()
+        else:
+            for chunk_args in args:
+                written += _build_chunk(*chunk_args)
+        
+        if verbose:
+            print(f"✓ {written} linhas de features gravadas em {self._dir(symbol, interval)}")
+        return written
+    
+    @staticmethod
+    def _chunks(start_ms: int, end_ms: int, chunk_days: int) -> List[Tuple[int, int]]:
+        """Blocos [início, fim) alinhados ao início do dia (cada partição diária pertence a um só bloco)."""
+        chunks = []
+        chunk_start = start_ms
+        while chunk_start < end_ms:
+            chunk_end = min((chunk_start // DAY_MS + chunk_days) * DAY_MS, end_ms)
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+        return chunks
+    
+    # ========== LEITURA ==========
+    
+    def read_records(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Lê as linhas com timestamp em [start_ms, end_ms) como array estruturado.
+        Apenas as partições do período são abertas (via memory-map).
+        """
+        parts = []
+        for day in self._days_between(symbol, interval, start_ms, end_ms):
+            data = self._load_day(symbol, interval, day)
+            lo = 0 if start_ms is None else np.searchsorted(data['timestamp'], start_ms, side='left')
+            hi = len(data) if end_ms is None else np.searchsorted(data['timestamp'], end_ms, side='left')
+            if hi > lo:
+                parts.append(data[lo:hi])
+        
+        if not parts:
+            return np.empty(0)
+        return np.concatenate(parts)
+    
+    def read(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Lê o período como DataFrame de features (mesmo formato do FeatureEngineer).
+        """
+        records = self.read_records(symbol, interval, start_ms, end_ms)
+        if len(records) == 0:
+            return pd.DataFrame()
+        return records_to_frame(records)
+    
+    def iter_frames(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        days_per_frame: int = FEATURE_CHUNK_DAYS
+    ) -> Iterator[pd.DataFrame]:
+        """Percorre o período em DataFrames de até `days_per_frame` dias (memória limitada)."""
+        days = self._days_between(symbol, interval, start_ms, end_ms)
+        for i in range(0, len(days), days_per_frame):
+            first = self._day_start(days[i])
+            last = self._day_start(days[min(i + days_per_frame, len(days)) - 1]) + DAY_MS
+            frame = self.read(
+                symbol, interval,
+                first if start_ms is None else max(first, start_ms),
+                last if end_ms is None else min(last, end_ms)
+            )
+            if not frame.empty:
+                yield frame
+    
+    def to_memmap(
+        self,
+        symbol: str,
+        interval: str,
+        directory: str,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+        columns: List[str] = FEATURE_COLUMNS
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Grava X (features) e y (target) do período em `directory`/X.npy e
+        y.npy, partição por partição, e os devolve abertos via memory-map.
+        A matriz nunca é montada inteira em memória.
+        
+        Returns:
+            Tuple (X, y) somente leitura; X em float32 se as partições estão
+            no modo compacto, senão float64
+        """
+        days = self._days_between(symbol, interval, start_ms, end_ms)
+        
+        def day_slices():
+            for day in days:
+                data = self._load_day(symbol, interval, day)
+                lo = 0 if start_ms is None else np.searchsorted(data['timestamp'], start_ms, side='left')
+                hi = len(data) if end_ms is None else np.searchsorted(data['timestamp'], end_ms, side='left')
+                if hi > lo:
+                    yield data[lo:hi]
+        
+        n_rows = 0
+        compact = True
+        for part in day_slices():
+            n_rows += len(part)
+            compact = compact and all(part.dtype[col].itemsize <= 4 for col in columns)
+        
+        os.makedirs(directory, exist_ok=True)
+        x_path = os.path.join(directory, 'X.npy')
+        y_path = os.path.join(directory, 'y.npy')
+        X = np.lib.format.open_memmap(
+            x_path, mode='w+', dtype=np.float32 if compact else np.float64, shape=(n_rows, len(columns))
+        )
+        y = np.lib.format.open_memmap(y_path, mode='w+', dtype=np.int64, shape=(n_rows,))
+        
+        row = 0
+        for part in day_slices():
+            for j, col in enumerate(columns):
+                X[row:row + len(part), j] = part[col]
+            y[row:row + len(part)] = part['target']
+            row += len(part)
+        
+        X.flush()
+        y.flush()
+        del X, y
+        return np.load(x_path, mmap_mode='r'), np.load(y_path, mmap_mode='r')
+    
+    def _days_between(self, symbol: str, interval: str, start_ms: Optional[int], end_ms: Optional[int]) -> List[str]:
+        days = self.days(symbol, interval)
+        if start_ms is not None:
+            first_day = self._day_of(start_ms)
+            days = [d for d in days if d >= first_day]
+        if end_ms is not None:
+            last_day = self._day_of(end_ms - 1)
+            days = [d for d in days if d <= last_day]
+        return days
+    
+    @staticmethod
+    def _day_start(day: str) -> int:
+        return int(pd.Timestamp(day, tz='UTC').timestamp() * 1000)
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+    from synthetic_data import generate_ohlcv
+    
+    parser = argparse.ArgumentParser(description="Features em blocos a partir do armazenamento local de velas")
+    parser.add_argument('--symbol', default=None, help="Calcular para um símbolo do CandleStore (padrão: teste sintético)")
+    parser.add_argument('--interval', default='1m')
+    parser.add_argument('--chunk-days', type=int, default=FEATURE_CHUNK_DAYS)
+    parser.add_argument('--jobs', type=int, default=1)
+    args = parser.parse_args()
+    
+    if args.symbol:
+        FeaturePartitionStore().build(args.symbol, args.interval, chunk_days=args.chunk_days, n_jobs=args.jobs)
+    else:
+        # Teste: 20 dias sintéticos em blocos de 3 dias vs cálculo em memória
+        with tempfile.TemporaryDirectory() as root:
+            candles = generate_ohlcv(20 * 24 * 60, start_ms=1_700_000_000_000)
+            candle_store = CandleStore(os.path.join(root, 'candles'))
+            candle_store.write('BTCUSDT', '1m', candles)
+            
+            store = FeaturePartitionStore(os.path.join(root, 'features'))
+            started = time.perf_counter()
+            store.build('BTCUSDT', '1m', candle_store=candle_store, chunk_days=3, n_jobs=args.jobs)
+            print(f"Tempo em blocos: {time.perf_counter() - started:.2f}s")
+            
+            chunked = store.read('BTCUSDT', '1m')
+            with contextlib.redirect_stdout(io.StringIO()):
+                in_memory = FeatureEngineer(candles).calculate_all_features()
+            
+            diff = np.abs(chunked[FEATURE_COLUMNS].to_numpy(float) - in_memory[FEATURE_COLUMNS].to_numpy(float)).max()
+            print(f"Linhas: {len(chunked)} vs {len(in_memory)} | Diferença máxima: {diff:.2e}")
+            
+            X, y = store.to_memmap('BTCUSDT', '1m', os.path.join(root, 'matrix'))
+            print(f"Matriz em disco: X{X.shape} {X.dtype} | y{y.shape}")
@@ -13,18 +13,90 @@ SUPABASE_KEY = os.getenv('SUPABASE_SERVICE_ROLE_KEY', '')
 # Binance
 BINANCE_API_KEY = os.getenv('BINANCE_API_KEY', '')
 BINANCE_API_SECRET = os.getenv('BINANCE_API_SECRET', '')
+BINANCE_REST_URL = os.getenv('BINANCE_REST_URL', 'https://api.binance.com')
+BINANCE_WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443')
+MAX_STREAMS_PER_CONNECTION = 1024  # Limite da Binance por conexão WebSocket
+RECONNECT_BASE_DELAY = 0.1  # Segundos antes da primeira reconexão (dobra a cada falha, com jitter)
+RECONNECT_MAX_DELAY = 30.0  # Espera máxima entre tentativas de reconexão
+RECONNECT_MAX_BACKFILL = 1000  # Velas perdidas buscadas via REST na reconexão; acima disso o buffer é recarregado
+BINANCE_WEIGHT_LIMIT_1M = 6000  # Peso máximo de requests por minuto (por IP)
+
+# Download histórico
+DOWNLOAD_WORKERS = 8  # Requisições simultâneas
+DOWNLOAD_MAX_RETRIES = 5  # Tentativas extras por página
+
+# Armazenamento local de velas (partições diárias em NumPy)
+USE_CANDLE_STORE = True
+CANDLE_STORE_DIR = os.getenv('CANDLE_STORE_DIR', 'data/candles')
+
+# Cache de matrizes de features (arrays NumPy por símbolo/timeframe/período)
+USE_FEATURE_CACHE = True
+FEATURE_CACHE_DIR = os.getenv('FEATURE_CACHE_DIR', 'data/features')
+FEATURE_CACHE_MAX_MB = 4096  # Tamanho máximo em disco antes de remover as entradas menos usadas
+FEATURE_CACHE_MAX_AGE_DAYS = 30  # Entradas sem uso há mais tempo são removidas
+
+# Features calculadas em blocos fora da memória (partições diárias em NumPy)
+FEATURE_PARTITION_DIR = os.getenv('FEATURE_PARTITION_DIR', 'data/feature_partitions')
+FEATURE_CHUNK_DAYS = 30  # Dias de velas por bloco (limita a memória de cada processo)
+
+# Benchmarks offline (benchmark.py)
+BENCHMARK_DIR = os.getenv('BENCHMARK_DIR', 'data/benchmarks')
+BENCHMARK_BASELINE_PATH = os.getenv('BENCHMARK_BASELINE_PATH', 'data/benchmarks/baseline.json')
+BENCHMARK_REGRESSION_TOLERANCE = 0.25  # Aumento relativo da mediana aceito antes de acusar regressão
+
+# Métricas de latência do engine (metrics.py)
+METRICS_ENABLED = True  # Histogramas por etapa no caminho crítico
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))  # Endpoint Prometheus GET /metrics (0 = desativado)
+METRICS_LOG_INTERVAL = 60.0  # Segundos entre linhas de log estruturadas (0 = desativado)
+
+# Gravação das mensagens brutas do WebSocket para replay offline (stream_replay.py)
+STREAM_RECORD_PATH = os.getenv('STREAM_RECORD_PATH', '')  # Arquivo .jsonl.gz (vazio = desativado)
+
+# Execução das previsões fora do event loop (prediction_executor.py)
+PREDICTION_WORKERS = 4  # Threads para features + modelo (0 = no próprio event loop)
+PREDICTION_MAX_PENDING = 5000  # Velas aguardando antes de parar de ler o WebSocket (backpressure)
+
+# Modo multiprocesso (multiprocess_engine.py): ingestão + workers de score + persistência
+SCORING_WORKERS = 4  # Processos de score (cada um carrega o modelo uma vez)
+SHM_RING_CAPACITY = 1024  # Velas por stream no ring buffer em shared memory (>= LOOKBACK_PERIODS)
+SHM_SIGNAL_QUEUE_CAPACITY = 4096  # Sinais por worker na fila em shared memory
+
+# Persistência de sinais (fila em segundo plano)
+SIGNAL_QUEUE_MAXSIZE = 10000  # Operações pendentes antes de gravar direto no journal
+SIGNAL_BATCH_SIZE = 100  # Máximo de operações por requisição
+SIGNAL_BATCH_MAX_WAIT = 0.5  # Segundos aguardando para completar um lote
+SIGNAL_MAX_RETRIES = 3  # Tentativas extras por lote
+SIGNAL_REPLAY_INTERVAL = 30.0  # Segundos entre reenvios do journal
+SIGNAL_JOURNAL_PATH = os.getenv('SIGNAL_JOURNAL_PATH', 'data/signal_journal.jsonl')
+SIGNAL_RESULT_GRACE_MS = 15000  # Espera extra pela vela alvo no WebSocket antes de buscar via REST
+SIGNAL_GAP_CHECK_INTERVAL = 30.0  # Segundos entre verificações de sinais atrasados
+
+# Snapshot do engine de tempo real (reinício a quente)
+ENGINE_SNAPSHOT_PATH = os.getenv('ENGINE_SNAPSHOT_PATH', 'data/engine_snapshot.pkl')  # '' desativa
+ENGINE_SNAPSHOT_INTERVAL = 10.0  # Segundos entre snapshots (também gravado ao encerrar)
 
 # Trading
 SYMBOL = 'BTCUSDT'
 TIMEFRAME = '1m'
+STREAMS = [(SYMBOL, TIMEFRAME)]  # Pares (símbolo, timeframe) atendidos pelo engine
 LOOKBACK_PERIODS = 100  # Quantas velas usar para cálculo de features
+STREAMING_PARITY_CHECK = False  # Valida features incrementais contra o FeatureEngineer (lento)
 
 # Machine Learning
 MIN_CONFIDENCE_THRESHOLD = 70.0  # Mínimo de confiança para gerar sinal
 MODEL_PATH = 'ml_models/trained_model.pkl'
 SCALER_PATH = 'ml_models/scaler.pkl'
+PREDICT_CHUNK_ROWS = 65536  # Linhas por bloco no predict em lote (tamanho do buffer pré-alocado)
+USE_COMPILED_MODEL = True  # Inferência pelas árvores compiladas em arrays NumPy (sem o framework)
+COMPILED_MODEL_TOLERANCE = 1e-4  # Diferença máxima de probabilidade aceita na compilação
+COMPILED_MAX_BATCH_ROWS = 32  # Lotes maiores vão para o framework (predict multithread é mais rápido)
+LGBM_VALIDATION_FRACTION = 0.1  # Cauda temporal do treino usada para early stopping do LightGBM
+LGBM_EARLY_STOPPING_ROUNDS = 50  # Rodadas sem melhora antes de parar
 
 # Features
+FEATURE_WARMUP_PERIODS = 500  # Velas de aquecimento antes de um trecho calculado à parte (EMA/RSI convergem, janela de 50 velas coberta)
+COMPACT_FEATURES = False  # Features contínuas em float32 e regras/flags em int8 (treino no histórico completo com ~3x menos memória)
 FEATURE_COLUMNS = [
     # Regras Probabilísticas (10)
     'rule_engolfo',
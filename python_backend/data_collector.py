@@ -3,11 +3,12 @@ Módulo de coleta de dados da Binance
 """
 import pandas as pd
 import numpy as np
-from binance.client import Client
 from datetime import datetime, timedelta
-import time
 from typing import Optional, List
-from config import SYMBOL, TIMEFRAME, BINANCE_API_KEY, BINANCE_API_SECRET
+from config import SYMBOL, TIMEFRAME, BINANCE_API_KEY, BINANCE_API_SECRET, USE_CANDLE_STORE
+from download_scheduler import HistoricalDownloader
+from candle_store import CandleStore
+from candle_buffer import interval_to_ms, now_ms
 
 class BinanceDataCollector:
     def __init__(self):
@@ -15,10 +16,26 @@ class BinanceDataCollector:
         Inicializa o coletor de dados da Binance.
         Não requer API key/secret para dados públicos.
         """
-        if BINANCE_API_KEY and BINANCE_API_SECRET:
-            self.client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
-        else:
-            self.client = Client()
+        # Cliente python-binance criado só no primeiro uso (o construtor faz um
+        # ping na API); velas recentes e períodos usam o downloader/armazenamento
+        self._client = None
+        
+        # Downloader concorrente para grandes períodos
+        self.downloader = HistoricalDownloader()
+        
+        # Armazenamento local (lido antes de ir à rede)
+        self.store = CandleStore() if USE_CANDLE_STORE else None
+    
+    @property
+    def client(self):
+        """Cliente python-binance (importado e criado no primeiro acesso)."""
+        if self._client is None:
+            from binance.client import Client
+            if BINANCE_API_KEY and BINANCE_API_SECRET:
+                self._client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
+            else:
+                self._client = Client()
+        return self._client
     
     def get_historical_klines(
         self, 
@@ -88,7 +105,8 @@ class BinanceDataCollector:
     ) -> pd.DataFrame:
         """
         Coleta um grande conjunto de dados históricos (para treinamento).
-        A API da Binance limita 1000 velas por request, então fazemos múltiplas chamadas.
+        A API da Binance limita 1000 velas por request, então o período é dividido
+        em páginas de 1000 velas baixadas concorrentemente (ver HistoricalDownloader).
         
         Args:
             symbol: Par de trading
@@ -100,49 +118,17 @@ class BinanceDataCollector:
         """
         print(f"Coletando {years} anos de dados históricos para {symbol}...")
         
-        all_data = []
         end_date = datetime.now()
         start_date = end_date - timedelta(days=years * 365)
         
-        current_start = start_date
+        final_df = self.get_candles_range(
+            symbol=symbol,
+            interval=interval,
+            start_ms=int(start_date.timestamp() * 1000),
+            end_ms=int(end_date.timestamp() * 1000)
+        )
         
-        while current_start < end_date:
-            # Calcular end para este batch (1000 velas de 1min = ~16.6 horas)
-            if interval == '1m':
-                current_end = current_start + timedelta(hours=16)
-            elif interval == '5m':
-                current_end = current_start + timedelta(hours=83)
-            else:
-                current_end = current_start + timedelta(days=30)
-            
-            if current_end > end_date:
-                current_end = end_date
-            
-            # Coletar batch
-            batch_df = self.get_historical_klines(
-                symbol=symbol,
-                interval=interval,
-                start_date=current_start.strftime('%Y-%m-%d'),
-                end_date=current_end.strftime('%Y-%m-%d'),
-                limit=1000
-            )
-            
-            if not batch_df.empty:
-                all_data.append(batch_df)
-                print(f"Coletado batch: {current_start.strftime('%Y-%m-%d')} até {current_end.strftime('%Y-%m-%d')}")
-            
-            # Próximo batch
-            current_start = current_end
-            
-            # Evitar rate limiting
-            time.sleep(0.5)
-        
-        # Concatenar todos os batches
-        if all_data:
-            final_df = pd.concat(all_data, ignore_index=True)
-            final_df = final_df.drop_duplicates(subset=['timestamp'])
-            final_df = final_df.sort_values('timestamp').reset_index(drop=True)
-            
+        if not final_df.empty:
             print(f"✓ Total de velas coletadas: {len(final_df)}")
             print(f"✓ Período: {final_df['timestamp'].min()} até {final_df['timestamp'].max()}")
             
@@ -151,9 +137,40 @@ class BinanceDataCollector:
             print("Erro: Nenhum dado foi coletado")
             return pd.DataFrame()
     
+    def get_candles_range(
+        self,
+        symbol: str = SYMBOL,
+        interval: str = TIMEFRAME,
+        start_ms: int = 0,
+        end_ms: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Coleta as velas fechadas de um período, lendo primeiro do armazenamento
+        local e baixando apenas o que falta.
+        
+        Args:
+            symbol: Par de trading
+            interval: Timeframe
+            start_ms: Início em epoch-ms
+            end_ms: Fim exclusivo em epoch-ms (padrão: agora)
+            
+        Returns:
+            DataFrame com colunas: timestamp, open, high, low, close, volume
+        """
+        if self.store is None:
+            # Páginas exatas de 1000 velas, baixadas em paralelo com controle de rate limit
+            df, failed_pages = self.downloader.download(symbol, interval, start_ms, end_ms or now_ms())
+            if failed_pages:
+                print(f"⚠ {len(failed_pages)} páginas falharam após todas as tentativas")
+            return df
+        
+        self.store.sync(self.downloader, symbol, interval, start_ms, end_ms)
+        return self.store.read(symbol, interval, start_ms, end_ms)
+    
     def get_latest_candles(self, symbol: str = SYMBOL, interval: str = TIMEFRAME, limit: int = 100) -> pd.DataFrame:
         """
         Coleta as últimas N velas (para uso em tempo real).
+        Com o armazenamento local ativo, retorna apenas velas fechadas.
         
         Args:
             symbol: Par de trading
@@ -163,7 +180,12 @@ class BinanceDataCollector:
         Returns:
             DataFrame com as últimas velas
         """
-        return self.get_historical_klines(symbol=symbol, interval=interval, limit=limit)
+        if self.store is None:
+            return self.get_historical_klines(symbol=symbol, interval=interval, limit=limit)
+        
+        start_ms = now_ms() - (limit + 1) * interval_to_ms(interval)
+        self.store.sync(self.downloader, symbol, interval, start_ms, verbose=False)
+        return self.store.read_last(symbol, interval, limit)
 
 
 # Função de teste
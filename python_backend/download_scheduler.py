@@ -0,0 +1,289 @@
+"""
+Download concorrente de velas históricas com controle de rate limit da Binance
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from candle_buffer import interval_to_ms
+from config import (
+    BINANCE_REST_URL,
+    BINANCE_WEIGHT_LIMIT_1M,
+    DOWNLOAD_MAX_RETRIES,
+    DOWNLOAD_WORKERS,
+)
+
+
+KLINES_ENDPOINT = '/api/v3/klines'
+KLINES_PAGE_SIZE = 1000  # Máximo de velas por request na Binance
+KLINES_REQUEST_WEIGHT = 2  # Peso de /api/v3/klines (qualquer limit)
+
+USED_WEIGHT_HEADER = 'X-MBX-USED-WEIGHT-1M'
+
+
+def plan_pages(
+    start_ms: int,
+    end_ms: int,
+    interval_ms: int,
+    page_size: int = KLINES_PAGE_SIZE
+) -> List[Tuple[int, int]]:
+    """
+    Divide [start_ms, end_ms) em páginas de exatamente `page_size` velas,
+    alinhadas ao início de cada vela (sem sobreposição entre páginas).
+    
+    Args:
+        start_ms: Início em epoch-ms (arredondado para baixo até o início da vela)
+        end_ms: Fim exclusivo em epoch-ms
+        interval_ms: Duração de uma vela em ms
+        page_size: Velas por página
+    
+    Returns:
+        Lista de (startTime, endTime) inclusivos, prontos para a API
+    """
+    start_ms = (start_ms // interval_ms) * interval_ms
+    page_span = page_size * interval_ms
+    
+    pages = []
+    page_start = start_ms
+    while page_start < end_ms:
+        page_end = min(page_start + page_span, end_ms) - 1
+        pages.append((page_start, page_end))
+        page_start += page_span
+    return pages
+
+
+class WeightTokenBucket:
+    """
+    Token bucket de peso de requests (limite por minuto da Binance).
+    
+    Os tokens são repostos continuamente (limit / 60 por segundo) e
+    corrigidos pelo peso usado informado pelo servidor no header
+    X-MBX-USED-WEIGHT-1M, de modo que outros clientes com o mesmo IP
+    também são levados em conta.
+    """
+    
+    def __init__(self, limit_per_minute: int = BINANCE_WEIGHT_LIMIT_1M, safety_margin: float = 0.1):
+        """
+        Args:
+            limit_per_minute: Peso máximo por minuto
+            safety_margin: Fração do limite reservada como margem de segurança
+        """
+        self.capacity = limit_per_minute * (1 - safety_margin)
+        self.refill_rate = limit_per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+    
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self._updated_at = now
+    
+    def acquire(self, weight: int = KLINES_REQUEST_WEIGHT):
+        """Bloqueia até haver `weight` tokens disponíveis e os consome."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.refill_rate
+                self._cond.wait(timeout=wait)
+    
+    def update_from_headers(self, headers: Dict):
+        """Ajusta os tokens com o peso usado reportado pela Binance."""
+        used = headers.get(USED_WEIGHT_HEADER)
+        if used is None:
+            return
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - float(used))
+    
+    def pause(self, seconds: float):
+        """Suspende todas as requisições (ex: após HTTP 429 com Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self._cond.notify_all()
+
+
+class HistoricalDownloader:
+    """
+    Agendador de download de velas históricas:
+    - Páginas exatas de 1000 velas alinhadas em milissegundos
+    - Requisições concorrentes em uma sessão HTTP com pool de conexões
+    - Throttling por token bucket guiado pelos headers de peso da Binance
+    - Retry individual por página com backoff exponencial
+    """
+    
+    def __init__(
+        self,
+        base_url: str = BINANCE_REST_URL,
+        max_workers: int = DOWNLOAD_WORKERS,
+        max_retries: int = DOWNLOAD_MAX_RETRIES,
+        bucket: Optional[WeightTokenBucket] = None,
+        session: Optional[requests.Session] = None,
+        timeout: float = 10.0
+    ):
+        """
+        Args:
+            base_url: URL base da API REST (permite apontar para um servidor local de teste)
+            max_workers: Número de requisições simultâneas
+            max_retries: Tentativas extras por página
+            bucket: Token bucket compartilhado (padrão: um novo por downloader)
+            session: Sessão HTTP (padrão: sessão com pool do tamanho de max_workers)
+            timeout: Timeout de cada requisição em segundos
+        """
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.bucket = bucket or WeightTokenBucket()
+        self.timeout = timeout
+        
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+    
+    def fetch_page(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[list]:
+        """
+        Baixa uma página de velas, respeitando o rate limit e com retry.
+        
+        Returns:
+            Lista de klines crus (formato da API)
+        """
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': start_ms,
+            'endTime': end_ms,
+            'limit': KLINES_PAGE_SIZE,
+        }
+        url = self.base_url + KLINES_ENDPOINT
+        
+        attempt = 0
+        while True:
+            self.bucket.acquire(KLINES_REQUEST_WEIGHT)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                self.bucket.update_from_headers(response.headers)
+                
+                if response.status_code in (418, 429):
+                    retry_after = float(response.headers.get('Retry-After', 2 ** attempt))
+                    self.bucket.pause(retry_after)
+                    if attempt >= self.max_retries:
+                        raise requests.HTTPError(f"Rate limit atingido (HTTP {response.status_code})")
+                    # A pausa do bucket já é a espera (backoff extra alongaria um ban 418)
+                    attempt += 1
+                    continue
+                
+                response.raise_for_status()
+                return response.json()
+            
+            except (requests.RequestException, ValueError):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(min(0.5 * 2 ** attempt, 30))
+                attempt += 1
+    
+    def download(
+        self,
+        symbol: str,
+        interval: str,
+        start_ms: int,
+        end_ms: int,
+        verbose: bool = True
+    ) -> Tuple[pd.DataFrame, List[Tuple[int, int]]]:
+        """
+        Baixa todas as velas em [start_ms, end_ms) concorrentemente.
+        
+        Páginas que falharem após todas as tentativas são devolvidas junto
+        com o restante dos dados (o mesmo downloader atende vários streams
+        em paralelo, então a falha não fica guardada na instância).
+        
+        Returns:
+            (DataFrame com colunas timestamp, open, high, low, close, volume,
+             lista de (page_start, page_end) das páginas que falharam)
+        """
+        pages = plan_pages(start_ms, end_ms, interval_to_ms(interval))
+        results: Dict[int, List[list]] = {}
+        failed_pages: List[Tuple[int, int]] = []
+        
+        if verbose:
+            print(f"Baixando {len(pages)} páginas de {symbol} {interval} "
+                  f"com {self.max_workers} conexões...")
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.fetch_page, symbol, interval, page_start, page_end): i
+                for i, (page_start, page_end) in enumerate(pages)
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    failed_pages.append(pages[i])
+                    print(f"Erro na página {pages[i]}: {e}")
+                
+                if verbose and done % 100 == 0:
+                    print(f"  {done}/{len(pages)} páginas")
+        
+        if verbose:
+            print(f"✓ {len(results)}/{len(pages)} páginas em {time.perf_counter() - started:.1f}s")
+        
+        klines = [k for i in sorted(results) for k in results[i]]
+        return klines_to_frame(klines), failed_pages
+
+
+def klines_to_frame(klines: List[list]) -> pd.DataFrame:
+    """
+    Converte klines crus da API em DataFrame OHLCV.
+    
+    Returns:
+        DataFrame com colunas: timestamp, open, high, low, close, volume
+    """
+    if not klines:
+        return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    
+    raw = np.array([k[:6] for k in klines], dtype=object)
+    df = pd.DataFrame({
+        'timestamp': pd.to_datetime(raw[:, 0].astype(np.int64), unit='ms'),
+        'open': raw[:, 1].astype(float),
+        'high': raw[:, 2].astype(float),
+        'low': raw[:, 3].astype(float),
+        'close': raw[:, 4].astype(float),
+        'volume': raw[:, 5].astype(float),
+    })
+    return df
+
+
+# Função de teste
+if __name__ == "__main__":
+    from datetime import datetime, timedelta
+    
+    downloader = HistoricalDownloader()
+    end = datetime.now()
+    start = end - timedelta(days=7)
+    
+    df, failed_pages = downloader.download(
+        'BTCUSDT', '1m',
+        int(start.timestamp() * 1000),
+        int(end.timestamp() * 1000)
+    )
+    print(df.head())
+    print(f"Shape: {df.shape}")
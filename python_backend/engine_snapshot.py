@@ -0,0 +1,69 @@
+"""
+Snapshot do estado do engine de tempo real (buffers de velas, indicadores
+incrementais e sinais pendentes) para reinício a quente
+"""
+import os
+import pickle
+from typing import Dict, List, Optional
+
+from candle_buffer import now_ms
+from signal_registry import PendingSignal
+from config import FEATURE_COLUMNS
+
+
+# Muda quando o formato do snapshot muda (snapshots de outra versão são ignorados)
+SNAPSHOT_VERSION = 1
+
+
+def save_snapshot(path: str, streams: Dict[str, Dict], pending: List[PendingSignal]) -> int:
+    """
+    Grava o snapshot de forma atômica (arquivo temporário + rename).
+    
+    Args:
+        path: Arquivo de destino
+        streams: {stream: StreamState.snapshot()}
+        pending: Sinais aguardando a vela alvo
+    
+    Returns:
+        Tamanho do arquivo em bytes
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'feature_columns': list(FEATURE_COLUMNS),
+        'saved_at': now_ms(),
+        'streams': streams,
+        'pending': [signal.to_tuple() for signal in pending],
+    }
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def load_snapshot(path: str) -> Optional[Dict]:
+    """
+    Lê um snapshot gravado por save_snapshot().
+    
+    Returns:
+        Dict {'saved_at', 'streams', 'pending': [PendingSignal]}, ou None se o
+        arquivo não existe, está corrompido ou é de outra versão/features
+    """
+    if not path or not os.path.exists(path):
+        return None
+    
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('feature_columns') != list(FEATURE_COLUMNS):
+            print(f"⚠ Snapshot {path} de outra versão, ignorado")
+            return None
+        snapshot['pending'] = [PendingSignal(*fields) for fields in snapshot['pending']]
+    except Exception as e:
+        print(f"⚠ Erro ao ler snapshot {path}: {e}")
+        return None
+    return snapshot
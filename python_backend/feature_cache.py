@@ -0,0 +1,456 @@
+"""
+Cache persistente de matrizes de features (evita recalcular o FeatureEngineer
+sobre todo o histórico a cada treino/backtest)
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import interval_to_ms, now_ms
+from feature_engineering import FeatureEngineer, FEATURE_VERSION
+from config import (
+    FEATURE_COLUMNS, USE_FEATURE_CACHE, FEATURE_CACHE_DIR, FEATURE_CACHE_MAX_MB,
+    FEATURE_CACHE_MAX_AGE_DAYS, FEATURE_WARMUP_PERIODS, COMPACT_FEATURES
+)
+
+
+DAY_S = 24 * 60 * 60
+
+# Acima disso as partes de uma entrada são regravadas em um único arquivo
+MAX_PARTS = 32
+
+
+def feature_signature() -> str:
+    """Hash das colunas de features (muda quando FEATURE_COLUMNS muda)."""
+    return hashlib.sha1(json.dumps(FEATURE_COLUMNS).encode()).hexdigest()[:16]
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    """Converte a saída do FeatureEngineer em array estruturado ('timestamp' em epoch-ms)."""
+    dtype = np.dtype([
+        (col, np.int64 if col == 'timestamp' else df[col].dtype)
+        for col in df.columns
+    ])
+    records = np.empty(len(df), dtype=dtype)
+    for col in df.columns:
+        if col == 'timestamp':
+            records[col] = df[col].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        else:
+            records[col] = df[col].to_numpy()
+    return records
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    """Converte um array estruturado do cache de volta em DataFrame de features."""
+    return pd.DataFrame({
+        col: (pd.to_datetime(records[col], unit='ms') if col == 'timestamp' else np.array(records[col]))
+        for col in records.dtype.names
+    }, copy=False)
+
+
+def received_end(df: pd.DataFrame, interval_ms: int) -> int:
+    """
+    Fim exclusivo das velas realmente recebidas do coletor (pode ser menor
+    que o pedido: páginas com falha ou período que termina no futuro).
+    """
+    open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    return int(open_times.max()) + interval_ms
+
+
+class FeatureCache:
+    """
+    Matrizes de features gravadas em disco:
+        
+        {root}/{SYMBOL}/{interval}/{start_ms}_{hash}_v{versão}[_c]/part_NNNNN.npy
+    
+    Cada entrada é identificada por símbolo, timeframe, início do período,
+    hash de FEATURE_COLUMNS, FEATURE_VERSION e modo de dtypes (sufixo _c
+    no modo compacto), e cobre as velas até `end_ms`
+    (meta.json). Pedidos com fim posterior estendem a entrada: só as velas
+    novas (mais FEATURE_WARMUP_PERIODS velas de aquecimento) passam pelo
+    FeatureEngineer e o resultado é gravado como uma nova parte. As partes
+    são arrays estruturados lidos via memory-map.
+    
+    As entradas são removidas por idade (sem uso há mais de `max_age_days`)
+    e, acima de `max_mb`, da menos usada para a mais usada.
+    """
+    
+    def __init__(
+        self,
+        root: str = FEATURE_CACHE_DIR,
+        max_mb: float = FEATURE_CACHE_MAX_MB,
+        max_age_days: float = FEATURE_CACHE_MAX_AGE_DAYS,
+        overlap: int = FEATURE_WARMUP_PERIODS,
+        compact: bool = COMPACT_FEATURES
+    ):
+        """
+        Args:
+            root: Diretório raiz do cache
+            max_mb: Tamanho máximo total em MB
+            max_age_days: Idade máxima (desde o último uso) de uma entrada
+            overlap: Velas de aquecimento recalculadas ao estender uma entrada
+            compact: Gravar as features no modo compacto (float32/int8)
+        """
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_age_s = max_age_days * DAY_S
+        self.overlap = overlap
+        self.compact = compact
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+    
+    # ========== ENTRADAS ==========
+    
+    def _suffix(self) -> str:
+        return f"_{feature_signature()}_v{FEATURE_VERSION}" + ('_c' if self.compact else '')
+    
+    def _entry_dir(self, symbol: str, interval: str, start_ms: int) -> str:
+        name = f"{start_ms}{self._suffix()}"
+        return os.path.join(self.root, symbol.upper(), interval, name)
+    
+    @staticmethod
+    def _read_meta(entry_dir: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(entry_dir, 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _write_meta(entry_dir: str, meta: Dict):
+        path = os.path.join(entry_dir, 'meta.json')
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
+    
+    def entries(self) -> List[Dict]:
+        """Metadados de todas as entradas gravadas (com 'path' e 'bytes')."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if 'meta.json' not in filenames:
+                continue
+            meta = self._read_meta(dirpath)
+            if meta is None:
+                continue
+            meta['path'] = dirpath
+            meta['bytes'] = sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+            found.append(meta)
+        return found
+    
+    def _find(self, symbol: str, interval: str, start_ms: int) -> Optional[Dict]:
+        """
+        Entrada compatível com o pedido: a do mesmo início ou, se não houver,
+        a de início mais recente que ainda deixa `overlap` velas de histórico
+        antes de `start_ms` (linhas equivalentes às de um cálculo do zero).
+        """
+        exact = self._entry_dir(symbol, interval, start_ms)
+        meta = self._read_meta(exact)
+        if meta is not None:
+            meta['path'] = exact
+            return meta
+        
+        directory = os.path.dirname(exact)
+        if not os.path.isdir(directory):
+            return None
+        
+        suffix = self._suffix()
+        latest_start = start_ms - self.overlap * interval_to_ms(interval)
+        candidates = []
+        for name in os.listdir(directory):
+            if name.endswith(suffix):
+                entry_start = int(name.split('_', 1)[0])
+                if entry_start <= latest_start:
+                    candidates.append(entry_start)
+        
+        for entry_start in sorted(candidates, reverse=True):
+            path = os.path.join(directory, f"{entry_start}{suffix}")
+            meta = self._read_meta(path)
+            if meta is not None:
+                meta['path'] = path
+                return meta
+        return None
+    
+    # ========== PARTES ==========
+    
+    def _write_part(self, entry_dir: str, meta: Dict, records: np.ndarray):
+        """Grava uma nova parte de forma atômica e registra em meta['parts']."""
+        name = f"part_{len(meta['parts']):05d}.npy"
+        path = os.path.join(entry_dir, name)
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+        meta['parts'].append({
+            'file': name,
+            'first': int(records['timestamp'][0]),
+            'last': int(records['timestamp'][-1]),
+            'rows': len(records),
+        })
+        meta['rows'] += len(records)
+    
+    def _read_parts(self, meta: Dict, start_ms: int, end_ms: int) -> np.ndarray:
+        """Linhas com timestamp em [start_ms, end_ms), abrindo só as partes do período."""
+        parts = []
+        for part in meta['parts']:
+            if part['last'] < start_ms or part['first'] >= end_ms:
+                continue
+            data = np.load(os.path.join(meta['path'], part['file']), mmap_mode='r')
+            lo = np.searchsorted(data['timestamp'], start_ms, side='left')
+            hi = np.searchsorted(data['timestamp'], end_ms, side='left')
+            if hi > lo:
+                parts.append(data[lo:hi])
+        
+        if not parts:
+            return np.empty(0)
+        return np.concatenate(parts)
+    
+    def _compact(self, meta: Dict):
+        """Regrava todas as partes em uma só quando passam de MAX_PARTS."""
+        if len(meta['parts']) <= MAX_PARTS:
+            return
+        records = self._read_parts(meta, meta['start_ms'], meta['end_ms'])
+        old_files = [part['file'] for part in meta['parts']]
+        
+        # Novo nome fora da sequência atual para não sobrescrever parte em uso
+        meta['parts'], meta['rows'] = [], 0
+        name = f"part_{int(time.time() * 1000)}.npy"
+        path = os.path.join(meta['path'], name)
+        fd, tmp_path = tempfile.mkstemp(dir=meta['path'], suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, path)
+        meta['parts'] = [{
+            'file': name,
+            'first': int(records['timestamp'][0]),
+            'last': int(records['timestamp'][-1]),
+            'rows': len(records),
+        }]
+        meta['rows'] = len(records)
+        self._write_meta(meta['path'], meta)
+        
+        for old in old_files:
+            os.remove(os.path.join(meta['path'], old))
+    
+    # ========== CONSULTA ==========
+    
+    def get_features(
+        self,
+        collector,
+        symbol: str,
+        interval: str,
+        start_ms: int,
+        end_ms: Optional[int] = None,
+        verbose: bool = True
+    ) -> pd.DataFrame:
+        """
+        Features de treino (FeatureEngineer.calculate_all_features) das velas
+        fechadas em [start_ms, end_ms), lidas do cache sempre que possível.
+        
+        Args:
+            collector: Objeto com get_candles_range(symbol, interval, start_ms, end_ms)
+            symbol: Par de trading
+            interval: Timeframe
+            start_ms: Início em epoch-ms
+            end_ms: Fim exclusivo em epoch-ms (padrão: agora)
+            verbose: Mostrar origem dos dados
+        
+        Returns:
+            DataFrame de features, igual ao do FeatureEngineer para o mesmo período
+            (se reaproveitar uma entrada de início anterior, inclui também as
+            velas iniciais que o cálculo do zero descartaria como aquecimento)
+        """
+        interval_ms = interval_to_ms(interval)
+        last_closed_end = (now_ms() // interval_ms) * interval_ms
+        end_ms = last_closed_end if end_ms is None else min(end_ms, last_closed_end)
+        start_ms = (start_ms // interval_ms) * interval_ms
+        
+        meta = self._find(symbol, interval, start_ms)
+        
+        if meta is None:
+            self.misses += 1
+            meta = self._create(collector, symbol, interval, start_ms, end_ms, verbose)
+        elif meta['end_ms'] < end_ms:
+            self.extensions += 1
+            self._extend(collector, meta, end_ms, verbose)
+        else:
+            self.hits += 1
+            if verbose:
+                print(f"✓ Features de {symbol} {interval} lidas do cache ({meta['path']})")
+        
+        meta['last_access'] = time.time()
+        self._write_meta(meta['path'], meta)
+        self.evict(keep=meta['path'])
+        
+        # Última vela do período não tem alvo (target) e fica fora da matriz
+        records = self._read_parts(meta, start_ms, end_ms - interval_ms)
+        if len(records) == 0:
+            return pd.DataFrame()
+        return records_to_frame(records)
+    
+    def _create(self, collector, symbol: str, interval: str, start_ms: int, end_ms: int, verbose: bool) -> Dict:
+        """Calcula o período inteiro e grava uma entrada nova."""
+        entry_dir = self._entry_dir(symbol, interval, start_ms)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(entry_dir, exist_ok=True)
+        
+        meta = {
+            'symbol': symbol.upper(),
+            'interval': interval,
+            'start_ms': start_ms,
+            'end_ms': start_ms,
+            'columns_hash': feature_signature(),
+            'feature_version': FEATURE_VERSION,
+            'compact': self.compact,
+            'rows': 0,
+            'parts': [],
+            'created_at': time.time(),
+            'last_access': time.time(),
+            'path': entry_dir,
+        }
+        
+        df = collector.get_candles_range(symbol, interval, start_ms, end_ms)
+        if not df.empty:
+            features_df = FeatureEngineer(df, compact=self.compact).calculate_all_features()
+            if not features_df.empty:
+                self._write_part(entry_dir, meta, frame_to_records(features_df))
+            meta['end_ms'] = received_end(df, interval_to_ms(interval))
+        
+        self._write_meta(entry_dir, meta)
+        if verbose:
+            print(f"✓ Features de {symbol} {interval} gravadas no cache: {meta['rows']} linhas")
+        return meta
+    
+    def _extend(self, collector, meta: Dict, end_ms: int, verbose: bool):
+        """
+        Estende a entrada até `end_ms` calculando apenas as velas novas mais
+        `overlap` velas de aquecimento antes delas.
+        """
+        interval_ms = interval_to_ms(meta['interval'])
+        fetch_start = max(meta['start_ms'], meta['end_ms'] - self.overlap * interval_ms)
+        df = collector.get_candles_range(meta['symbol'], meta['interval'], fetch_start, end_ms)
+        if df.empty:
+            return
+        
+        features_df = FeatureEngineer(df, compact=self.compact).calculate_all_features()
+        last_cached = meta['parts'][-1]['last'] if meta['parts'] else -1
+        records = frame_to_records(features_df)
+        records = records[records['timestamp'] > last_cached]
+        
+        if len(records):
+            self._write_part(meta['path'], meta, records)
+        meta['end_ms'] = max(meta['end_ms'], received_end(df, interval_ms))
+        self._write_meta(meta['path'], meta)
+        self._compact(meta)
+        
+        if verbose:
+            print(f"✓ Cache de features de {meta['symbol']} {meta['interval']} estendido: +{len(records)} linhas")
+    
+    # ========== REMOÇÃO ==========
+    
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Remove entradas sem uso há mais de `max_age_days` e, se o total passar
+        de `max_mb`, as menos usadas recentemente.
+        
+        Args:
+            keep: Caminho de uma entrada que nunca deve ser removida
+        
+        Returns:
+            Número de entradas removidas
+        """
+        entries = sorted(self.entries(), key=lambda e: e.get('last_access', 0))
+        now = time.time()
+        total = sum(e['bytes'] for e in entries)
+        removed = 0
+        
+        for entry in entries:
+            if entry['path'] == keep:
+                continue
+            too_old = now - entry.get('last_access', 0) > self.max_age_s
+            if too_old or total > self.max_bytes:
+                shutil.rmtree(entry['path'], ignore_errors=True)
+                total -= entry['bytes']
+                removed += 1
+        
+        return removed
+    
+    def clear(self):
+        """Remove todo o cache."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def load_features(
+    collector,
+    symbol: str,
+    interval: str,
+    start_ms: int,
+    end_ms: Optional[int] = None,
+    use_cache: bool = USE_FEATURE_CACHE
+) -> pd.DataFrame:
+    """
+    Features de treino de um período, pelo cache (USE_FEATURE_CACHE) ou
+    calculadas diretamente.
+    
+    Args:
+        collector: Objeto com get_candles_range(symbol, interval, start_ms, end_ms)
+        symbol: Par de trading
+        interval: Timeframe
+        start_ms: Início em epoch-ms
+        end_ms: Fim exclusivo em epoch-ms (padrão: agora)
+        use_cache: Usar o cache de features
+    
+    Returns:
+        DataFrame de features
+    """
+    if use_cache:
+        return FeatureCache().get_features(collector, symbol, interval, start_ms, end_ms)
+    df = collector.get_candles_range(symbol, interval, start_ms, end_ms)
+    return FeatureEngineer(df).calculate_all_features()
+
+
+# Função de teste
+if __name__ == "__main__":
+    import tempfile
+    from types import SimpleNamespace
+    from candle_store import CandleStore
+    from synthetic_data import generate_ohlcv
+    
+    interval_ms = interval_to_ms('1m')
+    end = (now_ms() // interval_ms) * interval_ms
+    start = end - 20_000 * interval_ms
+    
+    with tempfile.TemporaryDirectory() as root:
+        # Velas sintéticas servidas por um armazenamento local temporário
+        store = CandleStore(root=os.path.join(root, 'candles'))
+        store.write('BTCUSDT', '1m', generate_ohlcv(20_000, start_ms=start))
+        collector = SimpleNamespace(get_candles_range=store.read)
+        
+        cache = FeatureCache(root=os.path.join(root, 'features'))
+        
+        started = time.perf_counter()
+        first = cache.get_features(collector, 'BTCUSDT', '1m', start, end - 1000 * interval_ms)
+        print(f"Cálculo completo: {time.perf_counter() - started:.2f}s ({len(first)} linhas)")
+        
+        started = time.perf_counter()
+        extended = cache.get_features(collector, 'BTCUSDT', '1m', start, end)
+        print(f"Extensão incremental: {time.perf_counter() - started:.2f}s ({len(extended)} linhas)")
+        
+        started = time.perf_counter()
+        cached = cache.get_features(collector, 'BTCUSDT', '1m', start, end)
+        print(f"Leitura do cache: {time.perf_counter() - started:.3f}s")
+        
+        full = FeatureEngineer(store.read('BTCUSDT', '1m', start, end)).calculate_all_features()
+        diff = np.abs(cached[FEATURE_COLUMNS].to_numpy(float) - full[FEATURE_COLUMNS].to_numpy(float)).max()
+        print(f"Linhas: {len(cached)} vs {len(full)} | Diferença máxima: {diff:.2e}")
+        print(f"Hits: {cache.hits} | Misses: {cache.misses} | Extensões: {cache.extensions}")
@@ -3,11 +3,42 @@ Engenharia de Features - Cálculo de todos os indicadores e regras
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 import ta
 from ta.trend import EMAIndicator
 from ta.momentum import RSIIndicator
 from ta.volatility import BollingerBands
+from rule_kernel import compute_rules, minutes_from_timestamps, RULE_COLUMNS, RULE_LOOKBACK
+from config import FEATURE_COLUMNS, COMPACT_FEATURES
+
+
+# Velas de contexto usadas antes das últimas K no modo inferência.
+# Cobre a janela de 50 velas de S/R e deixa EMA21/RSI convergirem
+# (peso residual da vela inicial na EMA21 < 1e-8).
+INFERENCE_CONTEXT_PERIODS = 200
+
+# Versão da implementação das features. Incrementar sempre que o cálculo
+# de alguma feature mudar, para invalidar o cache de features (feature_cache).
+FEATURE_VERSION = 1
+
+# Colunas discretas (-1/0/1, 0/1 ou -3..3): int8 no modo compacto.
+# As demais features são contínuas: float32 no modo compacto.
+FLAG_COLUMNS = frozenset(RULE_COLUMNS + [
+    'rsi_oversold',
+    'rsi_overbought',
+    'price_above_ema9',
+    'price_above_ema21',
+    'pivot_structure',
+])
+
+
+def feature_matrix(df: pd.DataFrame, columns: List[str] = FEATURE_COLUMNS) -> np.ndarray:
+    """
+    Matriz contígua de features para treino/backtest: float32 quando as
+    colunas vêm do modo compacto (nenhuma perde precisão), senão float64.
+    """
+    compact = all(df[col].dtype.itemsize <= 4 for col in columns)
+    return np.ascontiguousarray(df[columns].to_numpy(dtype=np.float32 if compact else np.float64))
 
 
 class FeatureEngineer:
@@ -18,78 +49,174 @@ class FeatureEngineer:
     - Price Action (S/R, Pivots, Wicks)
     """
     
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, compact: bool = COMPACT_FEATURES):
         """
         Inicializa com um DataFrame de velas OHLCV.
         
         Args:
             df: DataFrame com colunas [timestamp, open, high, low, close, volume]
+            compact: Se True, features contínuas em float32 e regras/flags em int8
+                     (preços e timestamp continuam como na entrada)
         """
-        self.df = df.copy()
-        self.features_df = df.copy()
+        self.df = df
+        self.compact = compact
+        # Cópia rasa: colunas novas vão só para a cópia de trabalho e os
+        # arrays de preço são compartilhados com o DataFrame de entrada
+        self.features_df = df.copy(deep=False)
+        # Features calculadas (arrays), montadas uma única vez em _assemble()
+        self._columns: Dict[str, np.ndarray] = {}
     
-    def calculate_all_features(self) -> pd.DataFrame:
+    def calculate_all_features(self, inference: bool = False, last_k: Optional[int] = None) -> pd.DataFrame:
         """
         Calcula todas as features de uma vez.
         
+        Args:
+            inference: Se True, não constrói o target e mantém a vela mais recente
+                       (remove apenas as linhas de aquecimento dos indicadores)
+            last_k: Se informado, calcula apenas sobre as últimas last_k velas
+                    (mais INFERENCE_CONTEXT_PERIODS velas de contexto) e retorna só essas last_k
+            
         Returns:
             DataFrame com todas as features calculadas
         """
         print("Calculando features...")
         
+        if last_k is not None:
+            self.features_df = self.features_df.iloc[-(last_k + INFERENCE_CONTEXT_PERIODS):]
+        
         # Adicionar coluna de cor da vela
-        self.features_df['color'] = (self.features_df['close'] > self.features_df['open']).astype(int)
+        self.features_df['color'] = (self.features_df['close'] > self.features_df['open']).astype(
+            np.int8 if self.compact else int
+        )
         # 1 = Verde (alta), 0 = Vermelha (baixa)
         
-        # Adicionar target (cor da próxima vela)
-        self.features_df['target'] = self.features_df['color'].shift(-1)
+        if not inference:
+            # Adicionar target (cor da próxima vela)
+            self.features_df['target'] = self.features_df['color'].shift(-1)
         
         # Calcular todas as categorias de features
+        self._columns = {}
         self._calculate_probabilistic_rules()
         self._calculate_technical_indicators()
         self._calculate_price_action()
         
-        # Remover linhas com NaN (primeiras linhas não têm dados suficientes)
-        self.features_df = self.features_df.dropna()
+        # Inferência: remover apenas as linhas de aquecimento (a última vela não
+        # tem target, mas é mantida). Treino: remover linhas com qualquer NaN.
+        self.features_df = self._assemble(FEATURE_COLUMNS if inference else None)
+        
+        if last_k is not None:
+            self.features_df = self.features_df.iloc[-last_k:]
         
         print(f"✓ Features calculadas. Shape: {self.features_df.shape}")
         
         return self.features_df
     
-    # ========== PILAR 1: REGRAS PROBABILÍSTICAS (10 REGRAS) ==========
+    def _set(self, name: str, values):
+        """Registra uma coluna de feature (convertida para o dtype compacto, se ativo)."""
+        values = np.asarray(values)
+        if self.compact:
+            values = values.astype(np.int8 if name in FLAG_COLUMNS else np.float32)
+        self._columns[name] = values
     
-    def _calculate_probabilistic_rules(self):
-        """Calcula as 10 regras probabilísticas como features."""
-        
-        # 1. Engolfo de Cor Única (92.9%)
-        self.features_df['rule_engolfo'] = self._rule_engolfo()
-        
-        # 2. Três Soldados Brancos (92.0%)
-        self.features_df['rule_tres_soldados'] = self._rule_tres_soldados()
-        
-        # 3. Vela de Força (90.9%)
-        self.features_df['rule_vela_forca'] = self._rule_vela_forca()
+    def _assemble(self, subset: Optional[List[str]]) -> pd.DataFrame:
+        """
+        Junta as colunas de entrada e as features calculadas em um único
+        DataFrame, sem consolidar blocos, descartando as linhas com NaN
+        (em `subset` ou, se None, em qualquer coluna).
         
-        # 4. Três Vales/Picos (85.7%)
-        self.features_df['rule_tres_vales_picos'] = self._rule_tres_vales_picos()
+        As linhas descartadas são o aquecimento dos indicadores no início e
+        a última vela (sem target) no fim, então as linhas mantidas formam um
+        bloco contíguo e cada coluna final é uma fatia (view) do seu array.
+        """
+        base = self.features_df
+        columns = {col: base[col].to_numpy() for col in base.columns}
+        columns.update(self._columns)
+        
+        valid = np.ones(len(base), dtype=bool)
+        for col in (columns if subset is None else subset):
+            values = columns[col]
+            if values.dtype.kind == 'f':
+                valid &= ~np.isnan(values)
+            elif values.dtype.kind in 'mM':
+                valid &= ~np.isnat(values)
+            elif values.dtype.kind == 'O':
+                valid &= ~pd.isna(values)
+        
+        rows = np.flatnonzero(valid)
+        if len(rows) == 0 or rows[-1] - rows[0] + 1 == len(rows):
+            rows = slice(rows[0], rows[-1] + 1) if len(rows) else slice(0, 0)
+        
+        out = {col: values[rows] for col, values in columns.items()}
+        if self.compact and subset is None and 'target' in out:
+            # Sem NaN após o filtro: alvo 0/1
+            out['target'] = out['target'].astype(np.int8)
+        
+        return pd.DataFrame(out, index=base.index[rows], copy=False)
+    
+    def calculate_latest_features(self, last_k: int = 1) -> pd.DataFrame:
+        """
+        Features das últimas velas para previsão em tempo real.
         
-        # 5. MHI (85.0%)
-        self.features_df['rule_mhi'] = self._rule_mhi()
+        Diferente de calculate_all_features(), a vela que acabou de fechar é
+        incluída (não há target a construir), então predict() pontua a vela atual.
         
-        # 6. Reversão Pós-Doji (84.2%)
-        self.features_df['rule_reversao_doji'] = self._rule_reversao_doji()
+        Args:
+            last_k: Quantas velas mais recentes retornar
+            
+        Returns:
+            DataFrame com as últimas last_k linhas de features (sem coluna target)
+        """
+        return self.calculate_all_features(inference=True, last_k=last_k)
+    
+    # ========== PILAR 1: REGRAS PROBABILÍSTICAS (10 REGRAS) ==========
+    
+    def _calculate_probabilistic_rules(self):
+        """
+        Calcula as 10 regras probabilísticas como features.
         
-        # 7. Minoria (80.0%)
-        self.features_df['rule_minoria'] = self._rule_minoria()
+        Usa o kernel fundido de rule_kernel (tabela de cores + passada única
+        sobre arrays); os métodos _rule_* abaixo são a definição de referência
+        de cada regra, comparada com o kernel por check_rules_parity().
+        """
+        df = self.features_df
         
-        # 8. Primeira Vela do Quadrante (75.0%)
-        self.features_df['rule_primeira_quadrante'] = self._rule_primeira_quadrante()
+        rules = compute_rules(
+            df['open'].to_numpy(dtype=np.float64),
+            df['high'].to_numpy(dtype=np.float64),
+            df['low'].to_numpy(dtype=np.float64),
+            df['close'].to_numpy(dtype=np.float64),
+            minutes_from_timestamps(df['timestamp'])
+        )
         
-        # 9. Alternância de Cores (72.2%)
-        self.features_df['rule_alternancia'] = self._rule_alternancia()
+        for name in RULE_COLUMNS:
+            self._set(name, rules[name])
+    
+    def _calculate_probabilistic_rules_reference(self) -> Dict[str, np.ndarray]:
+        """
+        Calcula as 10 regras com as implementações de referência (_rule_*),
+        sem registrar features. Usado por check_rules_parity() para garantir
+        que o kernel fundido não alterou nenhuma regra.
         
-        # 10. Sequência Ímpar (71.4%)
-        self.features_df['rule_sequencia_impar'] = self._rule_sequencia_impar()
+        Returns:
+            Dict {coluna da regra: array int64 com -1/0/1}
+        """
+        df = self.features_df
+        if 'color' not in df:
+            df['color'] = (df['close'] > df['open']).astype(int)
+        
+        references = {
+            'rule_engolfo': self._rule_engolfo,                        # 1. Engolfo de Cor Única (92.9%)
+            'rule_tres_soldados': self._rule_tres_soldados,            # 2. Três Soldados Brancos (92.0%)
+            'rule_vela_forca': self._rule_vela_forca,                  # 3. Vela de Força (90.9%)
+            'rule_tres_vales_picos': self._rule_tres_vales_picos,      # 4. Três Vales/Picos (85.7%)
+            'rule_mhi': self._rule_mhi,                                # 5. MHI (85.0%)
+            'rule_reversao_doji': self._rule_reversao_doji,            # 6. Reversão Pós-Doji (84.2%)
+            'rule_minoria': self._rule_minoria,                        # 7. Minoria (80.0%)
+            'rule_primeira_quadrante': self._rule_primeira_quadrante,  # 8. Primeira Vela do Quadrante (75.0%)
+            'rule_alternancia': self._rule_alternancia,                # 9. Alternância de Cores (72.2%)
+            'rule_sequencia_impar': self._rule_sequencia_impar,        # 10. Sequência Ímpar (71.4%)
+        }
+        return {name: rule().to_numpy(dtype=np.int64) for name, rule in references.items()}
     
     def _rule_engolfo(self) -> pd.Series:
         """
@@ -319,73 +446,117 @@ class FeatureEngineer:
     def _calculate_technical_indicators(self):
         """Calcula indicadores técnicos padrão."""
         df = self.features_df
+        close = df['close']
         
         # RSI (14 períodos)
-        rsi_indicator = RSIIndicator(close=df['close'], window=14)
-        df['rsi'] = rsi_indicator.rsi()
-        df['rsi_oversold'] = (df['rsi'] < 30).astype(int)
-        df['rsi_overbought'] = (df['rsi'] > 70).astype(int)
+        rsi_indicator = RSIIndicator(close=close, window=14)
+        rsi = rsi_indicator.rsi()
+        self._set('rsi', rsi)
+        self._set('rsi_oversold', (rsi < 30).astype(int))
+        self._set('rsi_overbought', (rsi > 70).astype(int))
         
         # EMAs
-        ema9 = EMAIndicator(close=df['close'], window=9)
-        ema21 = EMAIndicator(close=df['close'], window=21)
+        ema9 = EMAIndicator(close=close, window=9).ema_indicator()
+        ema21 = EMAIndicator(close=close, window=21).ema_indicator()
         
-        df['ema_9'] = ema9.ema_indicator()
-        df['ema_21'] = ema21.ema_indicator()
-        df['ema_diff'] = df['ema_9'] - df['ema_21']
-        df['price_above_ema9'] = (df['close'] > df['ema_9']).astype(int)
-        df['price_above_ema21'] = (df['close'] > df['ema_21']).astype(int)
+        self._set('ema_9', ema9)
+        self._set('ema_21', ema21)
+        self._set('ema_diff', ema9 - ema21)
+        self._set('price_above_ema9', (close > ema9).astype(int))
+        self._set('price_above_ema21', (close > ema21).astype(int))
         
         # Bollinger Bands
-        bb = BollingerBands(close=df['close'], window=20, window_dev=2)
-        df['bb_upper'] = bb.bollinger_hband()
-        df['bb_middle'] = bb.bollinger_mavg()
-        df['bb_lower'] = bb.bollinger_lband()
-        df['bb_width'] = df['bb_upper'] - df['bb_lower']
+        bb = BollingerBands(close=close, window=20, window_dev=2)
+        bb_upper = bb.bollinger_hband()
+        bb_lower = bb.bollinger_lband()
+        bb_width = bb_upper - bb_lower
+        self._set('bb_upper', bb_upper)
+        self._set('bb_middle', bb.bollinger_mavg())
+        self._set('bb_lower', bb_lower)
+        self._set('bb_width', bb_width)
         
         # Posição do preço na banda (0 = na lower, 1 = na upper)
-        df['bb_position'] = (df['close'] - df['bb_lower']) / (df['bb_width'] + 1e-10)
-        
-        self.features_df = df
+        self._set('bb_position', (close - bb_lower) / (bb_width + 1e-10))
     
     # ========== PILAR 3: PRICE ACTION ==========
     
     def _calculate_price_action(self):
         """Calcula features de estrutura de preço."""
         df = self.features_df
+        open_, high, low, close = df['open'], df['high'], df['low'], df['close']
         
         # Suporte e Resistência (distância em % das últimas 50 velas)
-        rolling_high = df['high'].rolling(window=50).max()
-        rolling_low = df['low'].rolling(window=50).min()
+        rolling_high = high.rolling(window=50).max()
+        rolling_low = low.rolling(window=50).min()
         
-        df['distance_to_high'] = (rolling_high - df['close']) / (df['close'] + 1e-10)
-        df['distance_to_low'] = (df['close'] - rolling_low) / (df['close'] + 1e-10)
+        self._set('distance_to_high', (rolling_high - close) / (close + 1e-10))
+        self._set('distance_to_low', (close - rolling_low) / (close + 1e-10))
         
         # Estrutura de Pivots (simplificado: comparar closes recentes)
-        df['pivot_structure'] = (
-            (df['close'] > df['close'].shift(5)).astype(int) * 2 +
-            (df['close'] > df['close'].shift(10)).astype(int) * 1 -
-            (df['close'] < df['close'].shift(5)).astype(int) * 2 -
-            (df['close'] < df['close'].shift(10)).astype(int) * 1
-        )
+        self._set('pivot_structure', (
+            (close > close.shift(5)).astype(int) * 2 +
+            (close > close.shift(10)).astype(int) * 1 -
+            (close < close.shift(5)).astype(int) * 2 -
+            (close < close.shift(10)).astype(int) * 1
+        ))
         # Resultado: +2 (forte alta), 0 (lateral), -2 (forte baixa)
         
         # Análise de Pavios (Wicks)
-        body = abs(df['close'] - df['open'])
-        upper_wick = df['high'] - df[['open', 'close']].max(axis=1)
-        lower_wick = df[['open', 'close']].min(axis=1) - df['low']
-        total_range = df['high'] - df['low']
-        
-        df['upper_wick_pct'] = upper_wick / (total_range + 1e-10)
-        df['lower_wick_pct'] = lower_wick / (total_range + 1e-10)
-        df['body_size_pct'] = body / (total_range + 1e-10)
-        
-        self.features_df = df
+        body = abs(close - open_)
+        upper_wick = high - np.maximum(open_, close)
+        lower_wick = np.minimum(open_, close) - low
+        total_range = high - low
+        
+        self._set('upper_wick_pct', upper_wick / (total_range + 1e-10))
+        self._set('lower_wick_pct', lower_wick / (total_range + 1e-10))
+        self._set('body_size_pct', body / (total_range + 1e-10))
+
+
+def check_rules_parity(df: pd.DataFrame):
+    """
+    Compara o kernel fundido (rule_kernel.compute_rules) com as
+    implementações de referência das 10 regras, a partir da primeira vela
+    com RULE_LOOKBACK velas anteriores (antes disso o kernel devolve 0 e a
+    referência compara com NaN).
+    
+    Args:
+        df: DataFrame com colunas [timestamp, open, high, low, close]
+    
+    Raises:
+        AssertionError: Se alguma regra divergir em alguma vela
+    """
+    engineer = FeatureEngineer(df)
+    expected = engineer._calculate_probabilistic_rules_reference()
+    got = compute_rules(
+        df['open'].to_numpy(dtype=np.float64),
+        df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64),
+        df['close'].to_numpy(dtype=np.float64),
+        minutes_from_timestamps(df['timestamp'])
+    )
+    
+    mismatches = []
+    for name in RULE_COLUMNS:
+        diff = np.flatnonzero(expected[name][RULE_LOOKBACK:] != got[name][RULE_LOOKBACK:]) + RULE_LOOKBACK
+        if len(diff):
+            mismatches.append(f"{name}: {len(diff)} velas (primeira no índice {diff[0]})")
+    
+    if mismatches:
+        raise AssertionError("Regras divergentes da referência:\n  " + "\n  ".join(mismatches))
 
 
 # Função de teste
 if __name__ == "__main__":
     from data_collector import BinanceDataCollector
+    from synthetic_data import generate_ohlcv
+    
+    # Kernel fundido == definição de referência das 10 regras (preços
+    # arredondados geram dojis e empates de corpo, os casos de borda)
+    for seed in range(5):
+        candles = generate_ohlcv(5000, seed=seed)
+        check_rules_parity(candles)
+        check_rules_parity(candles.round({'open': 0, 'high': 0, 'low': 0, 'close': 0}))
+    print("✓ Regras do kernel idênticas à referência")
     
     print("Teste do Feature Engineer...")
     
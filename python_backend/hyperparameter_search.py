@@ -0,0 +1,374 @@
+"""
+Busca paralela de hiperparâmetros com validação cruzada temporal
+"""
+import contextlib
+import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import TimeSeriesSplit
+
+from ml_model import MLPredictor
+from feature_engineering import feature_matrix
+
+
+# Espaço de busca padrão por tipo de modelo (listas de valores candidatos)
+PARAM_SPACES = {
+    'xgboost': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [3, 4, 6, 8],
+        'learning_rate': [0.02, 0.05, 0.1],
+        'subsample': [0.7, 0.8, 1.0],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+    },
+    'random_forest': {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [6, 10, 14],
+        'min_samples_leaf': [5, 10, 50],
+    },
+    'gradient_boosting': {
+        'n_estimators': [100, 200],
+        'max_depth': [3, 5],
+        'learning_rate': [0.05, 0.1],
+        'subsample': [0.8, 1.0],
+    },
+    'lightgbm': {
+        'num_leaves': [31, 63, 127],
+        'max_depth': [6, 10],
+        'learning_rate': [0.02, 0.05, 0.1],
+        'min_child_samples': [20, 50, 200],
+        'colsample_bytree': [0.6, 0.8, 1.0],
+    },
+}
+
+# Parâmetros de paralelismo interno (desligado dentro dos processos da busca)
+_SINGLE_THREAD_PARAMS = {
+    'xgboost': {'n_jobs': 1},
+    'random_forest': {'n_jobs': 1},
+    'gradient_boosting': {},
+    'lightgbm': {'n_jobs': 1},
+}
+
+LATENCY_REPEATS = 50
+
+
+# ========== GERAÇÃO DE CANDIDATOS ==========
+
+def grid_candidates(model_types: Sequence[str], spaces: Dict = PARAM_SPACES) -> List[Tuple[str, Dict]]:
+    """Todas as combinações do espaço de cada tipo de modelo."""
+    candidates = []
+    for model_type in model_types:
+        space = spaces[model_type]
+        keys = list(space)
+        for values in itertools.product(*(space[k] for k in keys)):
+            candidates.append((model_type, dict(zip(keys, values))))
+    return candidates
+
+
+def random_candidates(
+    model_types: Sequence[str],
+    n_iter: int,
+    spaces: Dict = PARAM_SPACES,
+    seed: int = 42
+) -> List[Tuple[str, Dict]]:
+    """N combinações sorteadas (sem repetição), divididas igualmente entre os tipos de modelo."""
+    rng = np.random.default_rng(seed)
+    candidates = []
+    for k, model_type in enumerate(model_types):
+        grid = grid_candidates([model_type], spaces)
+        n = n_iter // len(model_types) + (1 if k < n_iter % len(model_types) else 0)
+        chosen = rng.choice(len(grid), size=min(n, len(grid)), replace=False)
+        candidates.extend(grid[i] for i in sorted(chosen))
+    return candidates
+
+
+# ========== AVALIAÇÃO (PROCESSOS) ==========
+
+# Matrizes mapeadas em memória, abertas uma vez por processo
+_shared_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _load_shared(data_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    if data_dir not in _shared_arrays:
+        X = np.load(os.path.join(data_dir, 'X.npy'), mmap_mode='r')
+        y = np.load(os.path.join(data_dir, 'y.npy'), mmap_mode='r')
+        _shared_arrays[data_dir] = (X, y)
+    return _shared_arrays[data_dir]
+
+
+def _single_row_latency_us(model, scaler, row: np.ndarray) -> float:
+    """Latência mediana de previsão de uma linha pelo caminho de produção (MLPredictor)."""
+    predictor = MLPredictor()
+    predictor.model = model
+    predictor.scaler = scaler
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor.compile_model()
+    
+    timings = np.empty(LATENCY_REPEATS)
+    for i in range(LATENCY_REPEATS):
+        started = time.perf_counter()
+        predictor.predict_batch(row)
+        timings[i] = time.perf_counter() - started
+    return float(np.median(timings) * 1e6)
+
+
+def evaluate_candidate(
+    data_dir: str,
+    model_type: str,
+    params: Dict,
+    n_splits: int = 3,
+    n_rows: Optional[int] = None,
+    single_thread: bool = False
+) -> Dict:
+    """
+    Avalia uma combinação nos folds do TimeSeriesSplit.
+    
+    Args:
+        data_dir: Diretório com X.npy / y.npy (lidos via memmap, sem cópia por processo)
+        model_type: Tipo de modelo
+        params: Hiperparâmetros do candidato
+        n_splits: Número de folds
+        n_rows: Usar apenas as N linhas mais recentes (recurso do successive halving)
+        single_thread: Desligar paralelismo interno do modelo
+    
+    Returns:
+        Dict com accuracy média/desvio, tempo de fit e latência de inferência
+    """
+    X, y = _load_shared(data_dir)
+    if n_rows is not None and n_rows < len(X):
+        X, y = X[-n_rows:], y[-n_rows:]
+    
+    model_params = dict(params, **(_SINGLE_THREAD_PARAMS[model_type] if single_thread else {}))
+    
+    accuracies, fit_times = [], []
+    model = scaler = None
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        # Os índices são contíguos: fatias do memmap, sem cópia até o scaler
+        train = slice(train_idx[0], train_idx[-1] + 1)
+        test = slice(test_idx[0], test_idx[-1] + 1)
+        
+        scaler = MLPredictor.build_scaler(model_type)
+        model = MLPredictor.build_model(model_type, model_params)
+        
+        started = time.perf_counter()
+        model.fit(scaler.fit_transform(X[train]), y[train])
+        fit_times.append(time.perf_counter() - started)
+        
+        proba_up = model.predict_proba(scaler.transform(X[test]))[:, 1]
+        accuracies.append(float(np.mean((proba_up > 0.5) == y[test])))
+    
+    return {
+        'model_type': model_type,
+        'params': params,
+        'n_rows': len(X),
+        'accuracy': float(np.mean(accuracies)),
+        'accuracy_std': float(np.std(accuracies)),
+        'fit_time': float(np.mean(fit_times)),
+        'latency_us': _single_row_latency_us(model, scaler, np.asarray(X[-1], dtype=np.float64)),
+    }
+
+
+# ========== BUSCA ==========
+
+class HyperparameterSearch:
+    """
+    Busca de hiperparâmetros (grid, aleatória ou successive halving) sobre
+    xgboost / random_forest / gradient_boosting / lightgbm.
+    
+    A matriz de features é gravada uma vez em .npy e aberta via memmap por
+    cada processo, em vez de ser serializada para cada tarefa.
+    """
+    
+    def __init__(
+        self,
+        model_types: Sequence[str] = ('xgboost', 'random_forest', 'gradient_boosting'),
+        strategy: str = 'random',
+        n_iter: int = 20,
+        n_splits: int = 3,
+        n_jobs: int = 4,
+        eta: int = 3,
+        min_rows: int = 5000,
+        spaces: Dict = PARAM_SPACES,
+        seed: int = 42
+    ):
+        """
+        Args:
+            model_types: Tipos de modelo incluídos
+            strategy: 'grid', 'random' ou 'halving'
+            n_iter: Candidatos sorteados ('random' e 'halving')
+            n_splits: Folds do TimeSeriesSplit
+            n_jobs: Processos em paralelo
+            eta: Fator de corte do successive halving (mantém 1/eta a cada rodada)
+            min_rows: Linhas na primeira rodada do successive halving
+            spaces: Espaço de busca por tipo de modelo
+            seed: Semente do sorteio
+        """
+        if strategy not in ('grid', 'random', 'halving'):
+            raise ValueError(f"Estratégia desconhecida: {strategy}")
+        
+        self.model_types = list(model_types)
+        self.strategy = strategy
+        self.n_iter = n_iter
+        self.n_splits = n_splits
+        self.n_jobs = n_jobs
+        self.eta = eta
+        self.min_rows = min_rows
+        self.spaces = spaces
+        self.seed = seed
+        
+        self.trials: Optional[pd.DataFrame] = None
+        self.best: Optional[Dict] = None
+    
+    def _candidates(self) -> List[Tuple[str, Dict]]:
+        if self.strategy == 'grid':
+            return grid_candidates(self.model_types, self.spaces)
+        return random_candidates(self.model_types, self.n_iter, self.spaces, self.seed)
+    
+    def _run_round(
+        self,
+        pool: Optional[ProcessPoolExecutor],
+        data_dir: str,
+        candidates: List[Tuple[str, Dict]],
+        n_rows: Optional[int],
+        round_id: int
+    ) -> List[Dict]:
+        single_thread = pool is not None
+        if pool is None:
+            results = [
+                evaluate_candidate(data_dir, model_type, params, self.n_splits, n_rows, single_thread)
+                for model_type, params in candidates
+            ]
+        else:
+            futures = [
+                pool.submit(evaluate_candidate, data_dir, model_type, params, self.n_splits, n_rows, single_thread)
+                for model_type, params in candidates
+            ]
+            results = [future.result() for future in futures]
+        
+        for result in results:
+            result['round'] = round_id
+            print(f"  [{round_id}] {result['model_type']:18s} acc={result['accuracy']*100:.2f}% "
+                  f"fit={result['fit_time']:.2f}s lat={result['latency_us']:.0f}µs {json.dumps(result['params'])}")
+        return results
+    
+    def run(self, features_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Executa a busca.
+        
+        Args:
+            features_df: DataFrame do FeatureEngineer (com FEATURE_COLUMNS e 'target')
+        
+        Returns:
+            DataFrame com uma linha por avaliação (tempo de fit, latência, accuracy)
+        """
+        df = features_df.dropna(subset=['target'])
+        candidates = self._candidates()
+        
+        print(f"\n{'='*60}")
+        print(f"BUSCA DE HIPERPARÂMETROS - {self.strategy.upper()} ({len(candidates)} candidatos, {len(df)} linhas)")
+        print(f"{'='*60}\n")
+        
+        data_dir = tempfile.mkdtemp(prefix='hpsearch_')
+        try:
+            np.save(os.path.join(data_dir, 'X.npy'), feature_matrix(df))
+            np.save(os.path.join(data_dir, 'y.npy'), df['target'].to_numpy(dtype=np.int64))
+            
+            pool = ProcessPoolExecutor(max_workers=self.n_jobs) if self.n_jobs > 1 else None
+            try:
+                results = self._search(pool, data_dir, candidates, len(df))
+            finally:
+                if pool is not None:
+                    pool.shutdown()
+        finally:
+            _shared_arrays.pop(data_dir, None)
+            shutil.rmtree(data_dir, ignore_errors=True)
+        
+        self.trials = pd.DataFrame(results)
+        final_round = self.trials[self.trials['round'] == self.trials['round'].max()]
+        best = final_round.sort_values(['accuracy', 'latency_us'], ascending=[False, True]).iloc[0]
+        self.best = {'model_type': best['model_type'], 'params': best['params'], 'accuracy': best['accuracy']}
+        
+        print(f"\n✓ Melhor: {self.best['model_type']} acc={self.best['accuracy']*100:.2f}% {json.dumps(self.best['params'])}")
+        return self.trials
+    
+    def _search(self, pool, data_dir: str, candidates: List[Tuple[str, Dict]], n_total: int) -> List[Dict]:
+        if self.strategy != 'halving':
+            return self._run_round(pool, data_dir, candidates, None, 0)
+        
+        # Successive halving: poucas linhas (as mais recentes) para muitos candidatos,
+        # todas as linhas para os sobreviventes
+        n_rounds = 1
+        while len(candidates) // self.eta ** n_rounds >= 1 and self.min_rows * self.eta ** n_rounds <= n_total:
+            n_rounds += 1
+        
+        results = []
+        for round_id in range(n_rounds):
+            n_rows = n_total if round_id == n_rounds - 1 else self.min_rows * self.eta ** round_id
+            round_results = self._run_round(pool, data_dir, candidates, n_rows, round_id)
+            results.extend(round_results)
+            
+            keep = max(1, len(candidates) // self.eta)
+            ranked = sorted(round_results, key=lambda r: r['accuracy'], reverse=True)[:keep]
+            candidates = [(r['model_type'], r['params']) for r in ranked]
+        return results
+    
+    def fit_best(self, features_df: pd.DataFrame, save_model: bool = True) -> MLPredictor:
+        """Treina o melhor candidato com MLPredictor.train_model (e salva via save_model)."""
+        if self.best is None:
+            raise ValueError("Execute run() antes de fit_best()")
+        
+        predictor = MLPredictor()
+        predictor.train_model(
+            features_df,
+            model_type=self.best['model_type'],
+            params=self.best['params'],
+            save_model=save_model
+        )
+        return predictor
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    from feature_engineering import FeatureEngineer
+    
+    parser = argparse.ArgumentParser(description="Busca de hiperparâmetros do Super Analista")
+    parser.add_argument('--strategy', choices=['grid', 'random', 'halving'], default='random')
+    parser.add_argument('--models', default='xgboost,random_forest,gradient_boosting')
+    parser.add_argument('--iter', type=int, default=20)
+    parser.add_argument('--jobs', type=int, default=4)
+    parser.add_argument('--days', type=int, default=30, help="Dias de histórico (armazenamento local/Binance)")
+    parser.add_argument('--synthetic', type=int, metavar='N_BARS', help="Usar N velas sintéticas em vez da Binance")
+    parser.add_argument('--save', action='store_true', help="Treinar e salvar o melhor modelo")
+    args = parser.parse_args()
+    
+    if args.synthetic:
+        from synthetic_data import generate_ohlcv
+        features_df = FeatureEngineer(generate_ohlcv(args.synthetic)).calculate_all_features()
+    else:
+        from data_collector import BinanceDataCollector
+        from candle_buffer import now_ms
+        from feature_cache import load_features
+        from config import SYMBOL, TIMEFRAME
+        start_ms = now_ms() - args.days * 24 * 60 * 60 * 1000
+        features_df = load_features(BinanceDataCollector(), SYMBOL, TIMEFRAME, start_ms)
+    
+    search = HyperparameterSearch(
+        model_types=args.models.split(','),
+        strategy=args.strategy,
+        n_iter=args.iter,
+        n_jobs=args.jobs
+    )
+    trials = search.run(features_df)
+    print(trials.sort_values('accuracy', ascending=False).head(10).to_string(index=False))
+    
+    if args.save:
+        search.fit_best(features_df)
@@ -0,0 +1,247 @@
+"""
+Métricas de latência por etapa do engine (histogramas leves, endpoint
+Prometheus em texto e linha de log estruturada)
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from config import METRICS_ENABLED
+
+
+# Limites superiores dos buckets (segundos): 1µs a 100s, 10 por década
+LATENCY_BUCKETS = tuple(round(10 ** (exp / 10), 12) for exp in range(-60, 21))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Etapas do caminho crítico, na ordem em que aparecem no endpoint
+ENGINE_STAGES = (
+    'ws_receive_lag',     # Horário local - horário do evento na Binance ('E')
+    'json_decode',        # json.loads da mensagem
+    'buffer_update',      # Resolução de sinais pendentes + buffer circular
+    'candle_total',       # Vela fechada: decodificação até o job no PredictionExecutor
+    'prediction_queue',   # Job enfileirado até começar a rodar no pool
+    'features',           # StreamingFeatureEngine.update (todas as velas do job)
+    'scoring',            # MLPredictor.predict_row_with_details
+    'candle_to_decision', # Vela enfileirada até a decisão do sinal no event loop
+    'persist_enqueue',    # SignalWriter.enqueue_insert
+    'persist_commit',     # Enfileiramento até o insert confirmado pelo banco
+    'close_to_commit',    # Fechamento da vela na Binance até o insert confirmado
+    'gap_backfill',       # Reconexão: REST das velas perdidas + caminho incremental
+)
+
+
+class LatencyHistogram:
+    """
+    Histograma de latências com buckets fixos em escala logarítmica.
+    
+    observe() custa uma busca binária e três somas (sem alocação); os
+    percentis são estimados a partir dos buckets (interpolação linear
+    dentro do bucket), com erro relativo limitado pela largura do bucket.
+    Cada histograma deve ser alimentado por uma única thread.
+    """
+    
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'max')
+    
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+    
+    def observe(self, seconds: float):
+        """Registra uma latência em segundos."""
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+    
+    def quantile(self, q: float) -> float:
+        """Percentil estimado (0 se vazio)."""
+        counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+
+class EngineMetrics:
+    """
+    Registro de histogramas por etapa e contadores do RealtimeEngine.
+    
+    Com enabled=False observe()/incr() retornam imediatamente, então o
+    custo no caminho crítico se resume às leituras de relógio.
+    """
+    
+    def __init__(self, enabled: bool = METRICS_ENABLED, prefix: str = 'superanalista'):
+        """
+        Args:
+            enabled: Registrar métricas
+            prefix: Prefixo dos nomes no formato Prometheus
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self.stages: Dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in ENGINE_STAGES}
+        self.counters: Dict[str, int] = {}
+        self.started_at = time.time()
+        self._server: Optional[ThreadingHTTPServer] = None
+    
+    # ========== REGISTRO ==========
+    
+    def observe(self, stage: str, seconds: float):
+        """Registra a latência de uma etapa (negativos, ex: relógio adiantado, viram 0)."""
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.observe(seconds if seconds > 0 else 0.0)
+    
+    def incr(self, name: str, value: int = 1):
+        """Incrementa um contador."""
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    # ========== LEITURA ==========
+    
+    def snapshot(self) -> Dict:
+        """
+        Resumo atual por etapa.
+        
+        Returns:
+            Dict {etapa: {'count', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}} (etapas sem amostras omitidas)
+        """
+        summary = {}
+        for stage, histogram in list(self.stages.items()):
+            if histogram.count == 0:
+                continue
+            summary[stage] = {
+                'count': histogram.count,
+                **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1e3, 4) for q in QUANTILES},
+                'max_ms': round(histogram.max * 1e3, 4),
+            }
+        return summary
+    
+    def log_line(self) -> str:
+        """Linha de log estruturada (JSON) com percentis e contadores."""
+        return json.dumps({
+            'event': 'engine_metrics',
+            'ts': round(time.time(), 3),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'stages': self.snapshot(),
+            'counters': dict(self.counters),
+        })
+    
+    def render_prometheus(self) -> str:
+        """Métricas no formato de texto do Prometheus (histogramas + percentis + contadores)."""
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines: List[str] = [
+            f"# HELP {name} Latência por etapa do engine de tempo real",
+            f"# TYPE {name} histogram",
+        ]
+        quantile_lines: List[str] = []
+        
+        for stage, histogram in list(self.stages.items()):
+            counts = list(histogram.counts)
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+            
+            for q in QUANTILES:
+                quantile_lines.append(
+                    f'{name}_quantile{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.9f}'
+                )
+        
+        lines.append(f"# HELP {name}_quantile Percentis estimados a partir dos buckets")
+        lines.append(f"# TYPE {name}_quantile gauge")
+        lines.extend(quantile_lines)
+        
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        
+        return "\n".join(lines) + "\n"
+    
+    # ========== ENDPOINT HTTP ==========
+    
+    def start_server(self, host: str, port: int) -> ThreadingHTTPServer:
+        """
+        Sobe o endpoint GET /metrics em uma thread própria (fora do event loop).
+        
+        Returns:
+            Servidor HTTP (server_address traz a porta efetiva quando port=0)
+        """
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True).start()
+        return self._server
+    
+    def stop_server(self):
+        """Encerra o endpoint HTTP (se ativo)."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Função de teste
+if __name__ == "__main__":
+    import random
+    from urllib.request import urlopen
+    
+    metrics = EngineMetrics(enabled=True)
+    rng = random.Random(42)
+    for _ in range(10000):
+        metrics.observe('features', rng.lognormvariate(-10, 0.5))
+        metrics.observe('scoring', rng.lognormvariate(-9, 0.3))
+    metrics.incr('candles', 10000)
+    
+    # Custo do observe() frente às etapas medidas (dezenas de µs)
+    started = time.perf_counter()
+    for _ in range(100000):
+        metrics.observe('json_decode', 2e-5)
+    print(f"observe(): {(time.perf_counter() - started) / 100000 * 1e9:.0f} ns por chamada")
+    
+    server = metrics.start_server('127.0.0.1', 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+    text = urlopen(url).read().decode()
+    print("\n".join(line for line in text.splitlines() if 'quantile' in line and 'features' in line))
+    print(metrics.log_line())
+    metrics.stop_server()
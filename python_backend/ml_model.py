@@ -1,18 +1,36 @@
 """
 Sistema de Machine Learning para previsão de velas
+
+Inferência só com NumPy (ensemble compilado); scikit-learn, XGBoost,
+LightGBM e joblib são importados apenas no treino (model_training) ou
+quando o modelo original precisa ser carregado.
 """
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, TimeSeriesSplit
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from xgboost import XGBClassifier
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
-import joblib
 import os
+import threading
 from datetime import datetime
-from typing import Tuple, Dict
-from config import FEATURE_COLUMNS, MODEL_PATH, SCALER_PATH
+from typing import Tuple, Dict, Optional, Union
+from config import (
+    FEATURE_COLUMNS, MODEL_PATH, SCALER_PATH, PREDICT_CHUNK_ROWS,
+    USE_COMPILED_MODEL, COMPILED_MODEL_TOLERANCE, COMPILED_MAX_BATCH_ROWS
+)
+from tree_compiler import (
+    CompiledEnsemble, compile_ensemble, max_probability_error, probe_rows, scaler_arrays, scaler_input_dtype
+)
+from rule_kernel import RULE_COLUMNS
+
+
+# Nomes do treino disponíveis em ml_model sob demanda (modelos LightGBM salvos
+# antes da separação referenciam ml_model.LightGBMRuleClassifier no pickle)
+_TRAINING_EXPORTS = ('DEFAULT_MODEL_PARAMS', 'MODEL_CLASSES', 'LightGBMRuleClassifier')
+
+
+def __getattr__(name: str):
+    if name in _TRAINING_EXPORTS:
+        import model_training
+        return getattr(model_training, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class MLPredictor:
@@ -21,10 +39,55 @@ class MLPredictor:
     """
     
     def __init__(self):
-        self.model = None
-        self.scaler = StandardScaler()
+        self._model = None
+        self._scaler = None
         self.feature_columns = FEATURE_COLUMNS
         
+        # (model_path, scaler_path) ainda não lidos: com o ensemble compilado
+        # carregado, o modelo original só é aberto se algum caminho precisar dele
+        self._deferred_paths: Optional[Tuple[str, str]] = None
+        self._load_lock = threading.Lock()
+        
+        # Parâmetros do scaler e buffers de entrada reutilizados entre chamadas
+        # (o lock serializa o uso dos buffers quando o preditor é compartilhado entre threads)
+        self._scaling = None
+        self._work_buffer = None
+        self._input_buffer = None
+        self._buffer_lock = threading.Lock()
+        
+        # Ensemble compilado em arrays planos (scaler incorporado aos limiares ou,
+        # com features compactas, aplicado em float32 antes das árvores)
+        self.compiled = None
+    
+    @property
+    def model(self):
+        """Classificador do framework (carregado no primeiro uso quando adiado)."""
+        if self._deferred_paths is not None:
+            self._load_deferred()
+        return self._model
+    
+    @model.setter
+    def model(self, value):
+        self._deferred_paths = None
+        self._model = value
+    
+    @property
+    def scaler(self):
+        """StandardScaler do treino (carregado junto com o modelo quando adiado)."""
+        if self._deferred_paths is not None:
+            self._load_deferred()
+        return self._scaler
+    
+    @scaler.setter
+    def scaler(self, value):
+        self._deferred_paths = None
+        self._scaler = value
+    
+    @property
+    def is_loaded(self) -> bool:
+        """True se há modelo para prever (compilado, original ou adiado)."""
+        return self.compiled is not None or self._deferred_paths is not None or self._model is not None
+        
     def prepare_data(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
         """
         Prepara os dados para treinamento/previsão.
@@ -44,25 +107,42 @@ class MLPredictor:
         
         return X, y
     
+    @staticmethod
+    def build_model(model_type: str = 'xgboost', params: Optional[Dict] = None):
+        """Cria o classificador (não treinado) de um tipo de modelo (ver model_training.build_model)."""
+        from model_training import build_model
+        return build_model(model_type, params)
+    
+    @staticmethod
+    def build_scaler(model_type: str = 'xgboost'):
+        """Scaler usado com cada tipo de modelo (ver model_training.build_scaler)."""
+        from model_training import build_scaler
+        return build_scaler(model_type)
+    
     def train_model(
         self, 
         df: pd.DataFrame, 
         model_type: str = 'xgboost',
         test_size: float = 0.2,
-        save_model: bool = True
+        save_model: bool = True,
+        params: Optional[Dict] = None
     ) -> Dict:
         """
         Treina o modelo de ML.
         
         Args:
             df: DataFrame com features calculadas
-            model_type: Tipo de modelo ('xgboost', 'random_forest', 'gradient_boosting')
+            model_type: Tipo de modelo ('xgboost', 'random_forest', 'gradient_boosting', 'lightgbm')
             test_size: Proporção de dados para teste
             save_model: Se True, salva o modelo treinado
+            params: Hiperparâmetros que substituem os padrões do tipo de modelo
             
         Returns:
             Dict com métricas de performance
         """
+        from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+        from model_training import DEFAULT_MODEL_PARAMS
+        
         print(f"\n{'='*60}")
         print(f"TREINAMENTO DO MODELO - {model_type.upper()}")
         print(f"{'='*60}\n")
@@ -83,43 +163,21 @@ class MLPredictor:
         print(f"Teste: {len(X_test)} samples")
         
         # Normalizar features
+        self.scaler = self.build_scaler(model_type)
         X_train_scaled = self.scaler.fit_transform(X_train)
+        # Features compactas (float32): a inferência normaliza no mesmo dtype
+        self.scaler.input_dtype_ = X_train.dtype.name
         X_test_scaled = self.scaler.transform(X_test)
         
         # Selecionar modelo
-        if model_type == 'xgboost':
-            self.model = XGBClassifier(
-                n_estimators=200,
-                max_depth=6,
-                learning_rate=0.05,
-                subsample=0.8,
-                colsample_bytree=0.8,
-                random_state=42,
-                eval_metric='logloss'
-            )
-        elif model_type == 'random_forest':
-            self.model = RandomForestClassifier(
-                n_estimators=200,
-                max_depth=10,
-                min_samples_split=20,
-                min_samples_leaf=10,
-                random_state=42,
-                n_jobs=-1
-            )
-        elif model_type == 'gradient_boosting':
-            self.model = GradientBoostingClassifier(
-                n_estimators=200,
-                max_depth=5,
-                learning_rate=0.05,
-                subsample=0.8,
-                random_state=42
-            )
-        else:
-            raise ValueError(f"Modelo desconhecido: {model_type}")
+        self.model = self.build_model(model_type, params)
         
         # Treinar
         print("\nTreinando modelo...")
         self.model.fit(X_train_scaled, y_train)
+        self.compiled = None
+        if USE_COMPILED_MODEL:
+            self.compile_model()
         
         # Avaliar
         y_pred_train = self.model.predict(X_train_scaled)
@@ -167,7 +225,8 @@ class MLPredictor:
             'train_accuracy': train_acc,
             'test_accuracy': test_acc,
             'confidence_analysis': confidence_analysis,
-            'model_type': model_type
+            'model_type': model_type,
+            'params': dict(DEFAULT_MODEL_PARAMS[model_type], **(params or {}))
         }
     
     def _analyze_by_confidence(self, y_true, y_pred, y_proba) -> pd.DataFrame:
@@ -210,6 +269,114 @@ class MLPredictor:
         
         return result
     
+    def _scaling_params(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Média e desvio do scaler (recalculados se o scaler mudar)."""
+        if self._scaling is None or self._scaling[0] is not self.scaler:
+            self._scaling = (self.scaler, *scaler_arrays(self.scaler, len(self.feature_columns)))
+        return self._scaling[1], self._scaling[2]
+    
+    def _input_dtype(self, X: np.ndarray) -> np.dtype:
+        """dtype do treino (features compactas = float32); sem registro, o da própria entrada."""
+        if hasattr(self.scaler, 'input_dtype_'):
+            return scaler_input_dtype(self.scaler)
+        return X.dtype
+    
+    def _as_matrix(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """Converte a entrada em matriz contígua (n_linhas, n_features) sem copiar arrays float32/float64."""
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_columns].to_numpy(dtype=np.float64)
+        X = np.asarray(X)
+        if X.dtype not in (np.float32, np.float64):
+            X = X.astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+    
+    def predict_proba_batch(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        """
+        Probabilidade de vela verde para várias linhas (ou símbolos) de uma vez.
+        
+        A normalização segue o dtype do treino: em float64, gravada na matriz
+        float32 que o modelo consome (features em nível de preço, como EMAs e
+        Bollinger, perdem resolução se já chegarem em float32); com features
+        compactas, em float32 com as mesmas operações do scaler.transform.
+        Os buffers são pré-alocados e reutilizados entre chamadas; cada bloco
+        de até PREDICT_CHUNK_ROWS linhas passa uma única vez pelo modelo.
+        
+        Args:
+            X: Matriz (n_linhas, n_features) na ordem de FEATURE_COLUMNS,
+               um vetor de uma linha ou um DataFrame com as features
+        
+        Returns:
+            Array float32 (n_linhas,) com P(verde)
+        """
+        if not self.is_loaded:
+            raise ValueError("Modelo não foi treinado ou carregado")
+        
+        X = self._as_matrix(X)
+        if self.compiled is not None and len(X) <= COMPILED_MAX_BATCH_ROWS:
+            # Poucas linhas (tempo real): árvores em arrays planos com o scaler
+            # incorporado, sem normalização nem chamada ao framework
+            return self.compiled.predict_proba(X).astype(np.float32)
+        
+        model = self.model
+        mean, scale = self._scaling_params()
+        compact = self._input_dtype(X) == np.float32
+        if compact:
+            mean32, scale32 = mean.astype(np.float32), scale.astype(np.float32)
+        n_rows, n_features = X.shape
+        
+        proba_up = np.empty(n_rows, dtype=np.float32)
+        with self._buffer_lock:
+            chunk = min(n_rows, PREDICT_CHUNK_ROWS)
+            if self._input_buffer is None or self._input_buffer.shape[0] < chunk or self._input_buffer.shape[1] != n_features:
+                self._work_buffer = np.empty((max(chunk, 1), n_features), dtype=np.float64)
+                self._input_buffer = np.empty((max(chunk, 1), n_features), dtype=np.float32)
+        
+            for start in range(0, n_rows, PREDICT_CHUNK_ROWS):
+                block = X[start:start + PREDICT_CHUNK_ROWS]
+                work = self._work_buffer[:len(block)]
+                scaled = self._input_buffer[:len(block)]
+                if compact:
+                    # Como o StandardScaler.transform em float32: média/desvio convertidos
+                    scaled[:] = block
+                    np.subtract(scaled, mean32, out=scaled)
+                    np.divide(scaled, scale32, out=scaled)
+                else:
+                    np.subtract(block, mean, out=work)
+                    np.divide(work, scale, out=scaled)
+                proba_up[start:start + len(block)] = model.predict_proba(scaled)[:, 1]
+        
+        return proba_up
+    
+    def predict_batch(self, X: Union[np.ndarray, pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Previsão e confiança para várias linhas a partir de uma única
+        passada de probabilidades.
+        
+        Args:
+            X: Matriz (n_linhas, n_features), vetor de uma linha ou DataFrame
+        
+        Returns:
+            Tuple (previsões, confianças)
+            previsões: array int8 com 1 (CALL/Verde) ou 0 (PUT/Vermelha)
+            confianças: array float32 com 0-100 (%)
+        """
+        return self.signals_from_proba(self.predict_proba_batch(X))
+    
+    @staticmethod
+    def signals_from_proba(proba_up: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Previsão e confiança a partir da probabilidade de alta. Regra única do
+        engine e do backtest: empate (0.5 exato) vira PUT.
+        
+        Returns:
+            Tuple (previsões int8 com 1/0, confianças 0-100 no dtype de proba_up)
+        """
+        prediction = (proba_up > 0.5).astype(np.int8)
+        confidence = np.maximum(proba_up, 1 - proba_up) * 100
+        return prediction, confidence
+    
     def predict(self, df: pd.DataFrame) -> Tuple[int, float]:
         """
         Faz previsão para a próxima vela.
@@ -222,21 +389,9 @@ class MLPredictor:
             previsão: 1 (CALL/Verde), 0 (PUT/Vermelha)
             confiança: 0-100 (%)
         """
-        if self.model is None:
-            raise ValueError("Modelo não foi treinado ou carregado")
-        
         # Pegar última linha (vela mais recente)
-        X = df[self.feature_columns].iloc[-1:].values
-        
-        # Normalizar
-        X_scaled = self.scaler.transform(X)
-        
-        # Prever
-        prediction = self.model.predict(X_scaled)[0]
-        proba = self.model.predict_proba(X_scaled)[0]
-        confidence = np.max(proba) * 100
-        
-        return int(prediction), float(confidence)
+        prediction, confidence = self.predict_batch(df[self.feature_columns].iloc[-1:])
+        return int(prediction[0]), float(confidence[0])
     
     def predict_with_details(self, df: pd.DataFrame) -> Dict:
         """
@@ -248,20 +403,65 @@ class MLPredictor:
         Returns:
             Dict com previsão, confiança, timestamp, preço, etc.
         """
-        prediction, confidence = self.predict(df)
-        
         last_row = df.iloc[-1]
+        features = {col: float(last_row[col]) for col in self.feature_columns}
+        return self.predict_row_with_details(features, last_row['timestamp'], float(last_row['close']))
+        
+    def predict_row_with_details(self, features: Dict[str, float], timestamp, close: float) -> Dict:
+        """
+        Mesmo resultado de predict_with_details a partir de um dict de features
+        (ex: StreamingFeatureEngine.last_features), sem montar DataFrame.
+        
+        Args:
+            features: {coluna: valor} com todas as FEATURE_COLUMNS
+            timestamp: Timestamp da vela
+            close: Preço de fechamento da vela
+        
+        Returns:
+            Dict com previsão, confiança, timestamp, preço, etc.
+        """
+        vector = np.fromiter((features[col] for col in self.feature_columns), dtype=np.float64, count=len(self.feature_columns))
+        prediction, confidence = self.predict_batch(vector)
         
         return {
-            'timestamp': last_row['timestamp'],
-            'prediction': 'CALL' if prediction == 1 else 'PUT',
-            'confidence': confidence,
-            'current_price': float(last_row['close']),
-            'features': {col: float(last_row[col]) for col in self.feature_columns[:10]}  # Top 10 features
+            'timestamp': timestamp,
+            'prediction': 'CALL' if prediction[0] == 1 else 'PUT',
+            'confidence': float(confidence[0]),
+            'current_price': float(close),
+            'features': {col: float(features[col]) for col in self.feature_columns[:10]}  # Top 10 features
         }
     
+    def compile_model(self) -> CompiledEnsemble:
+        """
+        Compila o ensemble treinado em arrays NumPy planos e valida as
+        probabilidades contra o modelo original.
+        
+        Returns:
+            CompiledEnsemble, ou None se o modelo não for suportado ou divergir
+        """
+        self.compiled = None
+        try:
+            compiled = compile_ensemble(self.model, self.scaler)
+        except ValueError as e:
+            print(f"⚠ Modelo não compilado: {e}")
+            return None
+        
+        probe = probe_rows(self.scaler, len(self.feature_columns))
+        # Regras só assumem -1/0/1 (categóricas no LightGBM)
+        rule_idx = [self.feature_columns.index(col) for col in RULE_COLUMNS]
+        probe[:, rule_idx] = np.random.default_rng(0).integers(-1, 2, (len(probe), len(rule_idx)))
+        error = max_probability_error(compiled, self.model, self.scaler, probe)
+        if error > COMPILED_MODEL_TOLERANCE:
+            print(f"⚠ Modelo compilado diverge do original (erro máx {error:.2e}); usando o modelo original")
+            return None
+        
+        self.compiled = compiled
+        return compiled
+    
     def save_model(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH):
-        """Salva o modelo e scaler treinados."""
+        """Salva o modelo e scaler treinados (e o ensemble compilado, quando suportado)."""
+        import joblib
+        
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         
         joblib.dump(self.model, model_path)
@@ -269,23 +469,76 @@ class MLPredictor:
         
         print(f"\n✓ Modelo salvo em: {model_path}")
         print(f"✓ Scaler salvo em: {scaler_path}")
+        
+        if USE_COMPILED_MODEL and (self.compiled is not None or self.compile_model() is not None):
+            compiled_path = compiled_model_path(model_path)
+            self.compiled.save(compiled_path)
+            print(f"✓ Modelo compilado salvo em: {compiled_path} "
+                  f"({self.compiled.n_trees} árvores, {self.compiled.n_nodes} nós)")
     
-    def load_model(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH):
-        """Carrega modelo e scaler previamente treinados."""
+    def load_model(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH, lazy: bool = True):
+        """
+        Carrega modelo e scaler previamente treinados.
+        
+        Args:
+            model_path: Modelo salvo com joblib
+            scaler_path: Scaler salvo com joblib
+            lazy: Com um ensemble compilado atualizado, carregar só ele (NumPy) e
+                  adiar o modelo original (e o import do framework) até o primeiro uso
+        """
         if not os.path.exists(model_path) or not os.path.exists(scaler_path):
             raise FileNotFoundError(f"Modelo ou scaler não encontrado em {model_path}")
         
-        self.model = joblib.load(model_path)
-        self.scaler = joblib.load(scaler_path)
-        
+        self.compiled = None
+        compiled_path = compiled_model_path(model_path)
+        compiled_fresh = (
+            USE_COMPILED_MODEL and os.path.exists(compiled_path)
+            and os.path.getmtime(compiled_path) >= os.path.getmtime(model_path)
+        )
+        
+        if lazy and compiled_fresh:
+            self.compiled = CompiledEnsemble.load(compiled_path)
+            self._model = self._scaler = None
+            self._deferred_paths = (model_path, scaler_path)
+            print(f"✓ Modelo compilado carregado de: {compiled_path} (original sob demanda)")
+            return
+        
+        self._read_model_files(model_path, scaler_path)
         print(f"✓ Modelo carregado de: {model_path}")
         print(f"✓ Scaler carregado de: {scaler_path}")
+        
+        if compiled_fresh:
+            self.compiled = CompiledEnsemble.load(compiled_path)
+            print(f"✓ Modelo compilado carregado de: {compiled_path}")
+        elif USE_COMPILED_MODEL:
+            # Modelo salvo antes da exportação (ou mais novo que ela): compilar agora
+            self.compile_model()
+    
+    def _read_model_files(self, model_path: str, scaler_path: str):
+        """Lê modelo e scaler com joblib (importa o framework do modelo salvo)."""
+        import joblib
+        
+        self._model = joblib.load(model_path)
+        self._scaler = joblib.load(scaler_path)
+        self._deferred_paths = None
+    
+    def _load_deferred(self):
+        """Carrega o modelo original adiado por load_model(lazy=True)."""
+        with self._load_lock:
+            if self._deferred_paths is not None:
+                self._read_model_files(*self._deferred_paths)
+
+
+def compiled_model_path(model_path: str) -> str:
+    """Arquivo do ensemble compilado ao lado do modelo (ex: trained_model.compiled.npz)."""
+    return os.path.splitext(model_path)[0] + '.compiled.npz'
 
 
 # Script de treinamento
 if __name__ == "__main__":
     from data_collector import BinanceDataCollector
-    from feature_engineering import FeatureEngineer
+    from feature_cache import load_features
+    from config import SYMBOL, TIMEFRAME
     
     print("\n" + "="*60)
     print("SCRIPT DE TREINAMENTO DO SUPER ANALISTA")
@@ -299,20 +552,16 @@ if __name__ == "__main__":
     # Para produção, use 3-5 anos
     USE_FULL_DATASET = False
     
+    from datetime import timedelta
     if USE_FULL_DATASET:
-        df = collector.get_large_historical_dataset(years=3)
+        start_date = datetime.now() - timedelta(days=3 * 365)
     else:
         print("(Modo teste: coletando apenas 30 dias)")
-        from datetime import datetime, timedelta
-        start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-        df = collector.get_historical_klines(start_date=start_date, limit=50000)
-    
-    print(f"✓ Dados coletados: {len(df)} velas")
+        start_date = datetime.now() - timedelta(days=30)
     
-    # 2. Calcular features
+    # 2. Calcular features (reaproveita o cache de features; só velas novas são calculadas)
     print("\nETAPA 2: Calculando features...")
-    engineer = FeatureEngineer(df)
-    features_df = engineer.calculate_all_features()
+    features_df = load_features(collector, SYMBOL, TIMEFRAME, int(start_date.timestamp() * 1000))
     
     print(f"✓ Features calculadas: {features_df.shape}")
     
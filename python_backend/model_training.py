@@ -0,0 +1,160 @@
+"""
+Construção dos classificadores e scalers para treino (importa scikit-learn,
+XGBoost e LightGBM; a inferência em tempo real não depende deste módulo)
+"""
+from typing import Dict, Optional
+
+import lightgbm as lgb
+import numpy as np
+from lightgbm import LGBMClassifier
+from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier
+
+from config import FEATURE_COLUMNS, LGBM_VALIDATION_FRACTION, LGBM_EARLY_STOPPING_ROUNDS
+from rule_kernel import RULE_COLUMNS
+
+
+# Hiperparâmetros padrão de cada tipo de modelo
+DEFAULT_MODEL_PARAMS = {
+    'xgboost': {
+        'n_estimators': 200,
+        'max_depth': 6,
+        'learning_rate': 0.05,
+        'subsample': 0.8,
+        'colsample_bytree': 0.8,
+        'random_state': 42,
+        'eval_metric': 'logloss',
+    },
+    'random_forest': {
+        'n_estimators': 200,
+        'max_depth': 10,
+        'min_samples_split': 20,
+        'min_samples_leaf': 10,
+        'random_state': 42,
+        'n_jobs': -1,
+    },
+    'gradient_boosting': {
+        'n_estimators': 200,
+        'max_depth': 5,
+        'learning_rate': 0.05,
+        'subsample': 0.8,
+        'random_state': 42,
+    },
+    'lightgbm': {
+        'n_estimators': 1000,  # Limite; o early stopping escolhe o número de árvores
+        'learning_rate': 0.05,
+        'num_leaves': 63,
+        'max_depth': 10,
+        'max_bin': 255,
+        'min_child_samples': 50,
+        'subsample': 0.8,
+        'subsample_freq': 1,
+        'colsample_bytree': 0.8,
+        'random_state': 42,
+        'n_jobs': -1,
+        'verbose': -1,
+    },
+}
+
+
+class LightGBMRuleClassifier(LGBMClassifier):
+    """
+    LGBMClassifier com as regras probabilísticas tratadas como features
+    categóricas nativas.
+    
+    As regras valem -1/0/1 e o LightGBM trata categorias negativas como
+    ausentes, então elas são deslocadas para 0/1/2 antes do fit/predict.
+    Sem eval_set explícito, o fit separa a cauda temporal do treino
+    (LGBM_VALIDATION_FRACTION) para early stopping.
+    """
+    
+    CATEGORY_VALUES = (-1, 0, 1)
+    CATEGORY_OFFSET = 1
+    CATEGORICAL_FEATURES = [FEATURE_COLUMNS.index(col) for col in RULE_COLUMNS]
+    
+    def _encode(self, X) -> np.ndarray:
+        X = np.array(X, dtype=np.float64)
+        if X.shape[1] == len(FEATURE_COLUMNS):
+            X[:, self.CATEGORICAL_FEATURES] += self.CATEGORY_OFFSET
+        return X
+    
+    def fit(self, X, y, **kwargs):
+        X = self._encode(X)
+        y = np.asarray(y)
+        if X.shape[1] == len(FEATURE_COLUMNS):
+            kwargs.setdefault('categorical_feature', self.CATEGORICAL_FEATURES)
+        
+        if 'eval_set' in kwargs:
+            kwargs['eval_set'] = [(self._encode(X_val), y_val) for X_val, y_val in kwargs['eval_set']]
+        elif LGBM_VALIDATION_FRACTION > 0 and len(X) * LGBM_VALIDATION_FRACTION >= 100:
+            # Validação = trecho mais recente (sem embaralhar a ordem temporal)
+            split = int(len(X) * (1 - LGBM_VALIDATION_FRACTION))
+            kwargs['eval_set'] = [(X[split:], y[split:])]
+            kwargs.setdefault('callbacks', [lgb.early_stopping(LGBM_EARLY_STOPPING_ROUNDS, verbose=False)])
+            X, y = X[:split], y[:split]
+        
+        return super().fit(X, y, **kwargs)
+    
+    def predict_proba(self, X, **kwargs):
+        return super().predict_proba(self._encode(X), **kwargs)
+    
+    def predict(self, X, **kwargs):
+        # LGBMClassifier.predict chama self.predict_proba (que já codifica as
+        # regras); delegar ao super() deslocaria as categorias duas vezes
+        proba = self.predict_proba(X, **kwargs)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+
+MODEL_CLASSES = {
+    'xgboost': XGBClassifier,
+    'random_forest': RandomForestClassifier,
+    'gradient_boosting': GradientBoostingClassifier,
+    'lightgbm': LightGBMRuleClassifier,
+}
+
+
+def build_model(model_type: str = 'xgboost', params: Optional[Dict] = None):
+    """
+    Cria o classificador (não treinado) de um tipo de modelo.
+    
+    Args:
+        model_type: Tipo de modelo ('xgboost', 'random_forest', 'gradient_boosting', 'lightgbm')
+        params: Hiperparâmetros que substituem os padrões de DEFAULT_MODEL_PARAMS
+    
+    Returns:
+        Classificador com a interface do scikit-learn
+    """
+    if model_type not in MODEL_CLASSES:
+        raise ValueError(f"Modelo desconhecido: {model_type}")
+    
+    model_params = dict(DEFAULT_MODEL_PARAMS[model_type], **(params or {}))
+    return MODEL_CLASSES[model_type](**model_params)
+
+
+def build_scaler(model_type: str = 'xgboost') -> StandardScaler:
+    """
+    Scaler usado com cada tipo de modelo. O LightGBM recebe as features
+    sem normalização (as regras precisam manter os valores -1/0/1 para
+    serem tratadas como categóricas).
+    """
+    if model_type == 'lightgbm':
+        return StandardScaler(with_mean=False, with_std=False)
+    return StandardScaler()
+
+
+# Função de teste
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    X = rng.normal(100.0, 5.0, (5000, len(FEATURE_COLUMNS)))
+    X[:, LightGBMRuleClassifier.CATEGORICAL_FEATURES] = rng.integers(-1, 2, (5000, len(RULE_COLUMNS)))
+    y = (X[:, -1] + X[:, LightGBMRuleClassifier.CATEGORICAL_FEATURES[0]] * 3 + rng.normal(0, 5, 5000) > 100).astype(int)
+    
+    for model_type in MODEL_CLASSES:
+        model = build_model(model_type).fit(X, y)
+        labels = model.predict(X)
+        from_proba = (model.predict_proba(X)[:, 1] > 0.5).astype(int)
+        disagree = int(np.sum(labels != from_proba))
+        if disagree:
+            raise AssertionError(f"{model_type}: predict() diverge de predict_proba() em {disagree} linhas")
+        print(f"✓ {model_type:18s} predict() == predict_proba() > 0.5 | acurácia={np.mean(labels == y):.3f}")
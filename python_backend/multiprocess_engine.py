@@ -0,0 +1,488 @@
+"""
+Modo multiprocesso do engine de tempo real: um processo leve de ingestão
+(WebSocket), N workers de score e um processo de persistência, ligados
+por shared memory
+"""
+import asyncio
+import json
+import multiprocessing as mp
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from candle_buffer import interval_to_ms, now_ms
+from metrics import EngineMetrics
+from shared_buffers import SharedCandleRings, SharedSignalQueue
+from realtime_engine import build_signal_row, stream_name
+from stream_client import iter_candles, missing_range, run_kline_connection
+from config import (
+    STREAMS, BINANCE_WS_URL, MAX_STREAMS_PER_CONNECTION, DOWNLOAD_WORKERS, LOOKBACK_PERIODS,
+    MIN_CONFIDENCE_THRESHOLD, MODEL_PATH, SCALER_PATH, SIGNAL_GAP_CHECK_INTERVAL, SIGNAL_RESULT_GRACE_MS,
+    SCORING_WORKERS, SHM_RING_CAPACITY, SHM_SIGNAL_QUEUE_CAPACITY, FEATURE_COLUMNS, RECONNECT_MAX_BACKFILL
+)
+
+
+def supabase_signal_store():
+    """Store padrão do processo de persistência (cliente criado dentro do processo)."""
+    from signal_writer import SupabaseSignalStore
+    return SupabaseSignalStore.from_config()
+
+
+def _default_collector():
+    from data_collector import BinanceDataCollector
+    return BinanceDataCollector()
+
+
+# ========== PROCESSOS FILHOS ==========
+
+def _scoring_worker(spec: Dict):
+    """
+    Worker de score: carrega o modelo uma vez, mantém o estado incremental dos
+    streams atribuídos (stream i -> worker i % N, o que preserva a ordem por
+    stream) e publica os sinais acima do limiar na sua fila compartilhada.
+    Velas acumuladas desde a última passada avançam o estado, mas só a mais
+    recente é pontuada.
+    """
+    from ml_model import MLPredictor
+    from streaming_features import StreamingFeatureEngine
+    
+    rings = SharedCandleRings.attach(**spec['rings'])
+    queue = SharedSignalQueue.attach(**spec['queue'])
+    notify, stop = spec['notify'], spec['stop']
+    
+    predictor = MLPredictor()
+    predictor.load_model(spec['model_path'], spec['scaler_path'])
+    
+    engines = {}
+    seen = {}
+    for stream in spec['streams']:
+        engine = StreamingFeatureEngine()
+        engine.warm_up_from_buffer(rings.view(stream, limit=LOOKBACK_PERIODS))
+        engines[stream] = engine
+        seen[stream] = rings.count(stream)
+    spec['ready'].set()
+    
+    stats = {'candles': 0, 'scored': 0, 'signals': 0, 'overruns': 0, 'dropped': 0}
+    try:
+        while not stop.is_set():
+            if not notify.wait(0.5):
+                continue
+            notify.clear()
+            
+            for stream, engine in engines.items():
+                count = rings.count(stream)
+                if count == seen[stream]:
+                    continue
+                
+                first = max(seen[stream], count - rings.capacity + 1)
+                stats['overruns'] += first - seen[stream]
+                for seq in range(first, count):
+                    candle = rings.candle(stream, seq)
+                    if candle is None:
+                        stats['overruns'] += 1
+                        continue
+                    engine.update(candle)
+                    stats['candles'] += 1
+                seen[stream] = count
+                
+                if engine.last_features is None or not engine.is_ready:
+                    continue
+                details = predictor.predict_row_with_details(
+                    engine.last_features, engine.last_timestamp, engine.last_close
+                )
+                stats['scored'] += 1
+                if details['confidence'] < MIN_CONFIDENCE_THRESHOLD:
+                    continue
+                
+                published = queue.put(
+                    stream,
+                    int(engine.last_timestamp.value // 1_000_000),
+                    details['prediction'] == 'CALL',
+                    details['confidence'],
+                    details['current_price'],
+                    [details['features'][col] for col in FEATURE_COLUMNS[:10]]
+                )
+                stats['signals' if published else 'dropped'] += 1
+    finally:
+        print(f"✓ Worker {spec['index']}: {stats}", flush=True)
+        rings.close()
+        queue.close()
+
+
+def _persistence_worker(spec: Dict):
+    """
+    Processo de persistência: consome as filas de sinais dos workers, grava
+    pelo SignalWriter e resolve os sinais pendentes lendo as velas alvo
+    direto dos ring buffers (e via REST quando a vela não chegou).
+    """
+    from signal_writer import SignalWriter
+    from signal_registry import PendingSignal, PendingSignalRegistry
+    import pandas as pd
+    
+    rings = SharedCandleRings.attach(**spec['rings'])
+    queues = [SharedSignalQueue.attach(**queue_spec) for queue_spec in spec['queues']]
+    streams: List[Tuple[str, str]] = spec['stream_list']
+    stop = spec['stop']
+    
+    writer = SignalWriter(spec['store_factory']())
+    registry = PendingSignalRegistry(writer.enqueue_update)
+    collector = spec['collector_factory']() if spec['collector_factory'] else None
+    seen = [rings.count(i) for i in range(len(streams))]
+    interval_ms = [interval_to_ms(interval) for _, interval in streams]
+    feature_names = FEATURE_COLUMNS[:10]
+    next_gap_check = time.monotonic() + SIGNAL_GAP_CHECK_INTERVAL
+    spec['ready'].set()
+    
+    inserted = 0
+    try:
+        while True:
+            stopping = stop.is_set()
+            idle = True
+            
+            for queue in queues:
+                for record in queue.get_all():
+                    idle = False
+                    stream = int(record['stream'])
+                    symbol, interval = streams[stream]
+                    open_time = int(record['open_time'])
+                    details = {
+                        'timestamp': pd.Timestamp(open_time, unit='ms'),
+                        'symbol': symbol,
+                        'interval': interval,
+                        'prediction': 'CALL' if record['call'] else 'PUT',
+                        'confidence': float(record['confidence']),
+                        'current_price': float(record['close']),
+                        'features': dict(zip(feature_names, record['features'].tolist())),
+                    }
+                    signal_id = str(uuid.uuid4())
+                    writer.enqueue_insert(build_signal_row(signal_id, details))
+                    inserted += 1
+                    
+                    target_open_time = open_time + interval_ms[stream]
+                    registry.add(PendingSignal(
+                        signal_id, symbol, interval, target_open_time, details['prediction'], details['current_price']
+                    ))
+                    # A vela alvo pode ter chegado antes do sinal
+                    close = rings.find_close(stream, target_open_time)
+                    if close is not None:
+                        registry.resolve(symbol, interval, target_open_time, close)
+            
+            # Velas novas resolvem os sinais pendentes (fechamento exato)
+            for stream, (symbol, interval) in enumerate(streams):
+                count = rings.count(stream)
+                if count == seen[stream]:
+                    continue
+                if len(registry):
+                    for seq in range(max(seen[stream], count - rings.capacity + 1), count):
+                        candle = rings.candle(stream, seq)
+                        if candle is not None:
+                            registry.resolve(symbol, interval, candle['timestamp'].value // 1_000_000, candle['close'])
+                seen[stream] = count
+            
+            if collector is not None and time.monotonic() >= next_gap_check:
+                next_gap_check = time.monotonic() + SIGNAL_GAP_CHECK_INTERVAL
+                registry.resolve_gaps(
+                    lambda s, i, start, end: collector.get_candles_range(symbol=s, interval=i, start_ms=start, end_ms=end),
+                    grace_ms=SIGNAL_RESULT_GRACE_MS
+                )
+            
+            if stopping and idle:
+                break
+            if idle:
+                time.sleep(0.01)
+    finally:
+        writer.close()
+        print(f"✓ Persistência: {inserted} sinais enfileirados, {writer.stats['inserted']} gravados, "
+              f"{len(registry)} pendentes", flush=True)
+        rings.close()
+        for queue in queues:
+            queue.close()
+
+
+# ========== PROCESSO DE INGESTÃO ==========
+
+class MultiProcessEngine:
+    """
+    Modo multiprocesso do RealtimeEngine para centenas de streams em uma
+    máquina com muitos núcleos.
+    
+    - Ingestão (este processo): WebSocket, json.loads e escrita das velas
+      fechadas nos ring buffers em shared memory; não carrega o modelo.
+    - N workers de score (processos): cada um carrega o modelo uma vez e lê
+      as velas dos seus streams direto da shared memory, sem serialização.
+    - Persistência (processo): recebe os sinais por filas em shared memory,
+      grava em lote (SignalWriter) e resolve os resultados.
+    """
+    
+    def __init__(
+        self,
+        streams: Optional[List[Tuple[str, str]]] = None,
+        n_workers: int = SCORING_WORKERS,
+        ws_url: str = BINANCE_WS_URL,
+        collector=None,
+        store_factory: Callable = supabase_signal_store,
+        collector_factory: Optional[Callable] = _default_collector,
+        model_path: str = MODEL_PATH,
+        scaler_path: str = SCALER_PATH,
+        ring_capacity: int = SHM_RING_CAPACITY,
+        metrics: Optional[EngineMetrics] = None
+    ):
+        """
+        Args:
+            streams: Lista de (símbolo, timeframe). Padrão: STREAMS do config
+            n_workers: Processos de score
+            ws_url: Endpoint base de streams combinados
+            collector: Coletor do histórico inicial (padrão: BinanceDataCollector)
+            store_factory: Função sem argumentos que cria o SignalStore no processo
+                           de persistência (precisa ser serializável por pickle)
+            collector_factory: Cria o coletor usado para resolver sinais atrasados
+                               via REST na persistência (None = desativado)
+            model_path: Modelo carregado por cada worker
+            scaler_path: Scaler carregado por cada worker
+            ring_capacity: Velas por stream na shared memory (>= LOOKBACK_PERIODS)
+            metrics: Histogramas de latência da ingestão
+        """
+        self.stream_list = [(symbol.upper(), interval) for symbol, interval in (streams or STREAMS)]
+        self.names = [stream_name(symbol, interval) for symbol, interval in self.stream_list]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.interval_ms = [interval_to_ms(interval) for _, interval in self.stream_list]
+        self.n_workers = max(1, min(n_workers, len(self.names)))
+        self.ws_url = ws_url.rstrip('/')
+        self.collector = collector or _default_collector()
+        self.store_factory = store_factory
+        self.collector_factory = collector_factory
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.metrics = metrics or EngineMetrics()
+        
+        self.rings = SharedCandleRings.create(len(self.names), max(ring_capacity, LOOKBACK_PERIODS))
+        self.queues = [SharedSignalQueue.create(SHM_SIGNAL_QUEUE_CAPACITY) for _ in range(self.n_workers)]
+        
+        # spawn: filhos sem o estado do event loop/threads do processo de ingestão
+        self._ctx = mp.get_context('spawn')
+        self._notify = [self._ctx.Event() for _ in range(self.n_workers)]
+        self._stop = self._ctx.Event()
+        self._processes: List[mp.Process] = []
+        self.candles_written = 0
+    
+    def owner(self, stream: int) -> int:
+        """Worker responsável por um stream."""
+        return stream % self.n_workers
+    
+    # ========== INICIALIZAÇÃO ==========
+    
+    async def init_history(self):
+        """Publica nos rings as últimas LOOKBACK_PERIODS velas fechadas de cada stream."""
+        semaphore = asyncio.Semaphore(DOWNLOAD_WORKERS)
+        
+        async def init_one(i: int):
+            symbol, interval = self.stream_list[i]
+            async with semaphore:
+                df = await asyncio.to_thread(
+                    self.collector.get_latest_candles, symbol=symbol, interval=interval, limit=LOOKBACK_PERIODS
+                )
+            if not df.empty:
+                open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+                df = df[open_times + self.interval_ms[i] <= now_ms()]
+            self.rings.extend_from_frame(i, df)
+        
+        await asyncio.gather(*(init_one(i) for i in range(len(self.names))))
+        print(f"✓ Histórico de {len(self.names)} streams publicado na shared memory")
+    
+    def start_processes(self, timeout: float = 120.0):
+        """Sobe os workers de score e o processo de persistência e aguarda ficarem prontos."""
+        ready = []
+        for w in range(self.n_workers):
+            event = self._ctx.Event()
+            spec = {
+                'index': w,
+                'rings': self.rings.spec,
+                'queue': self.queues[w].spec,
+                'streams': [i for i in range(len(self.names)) if self.owner(i) == w],
+                'notify': self._notify[w],
+                'stop': self._stop,
+                'ready': event,
+                'model_path': self.model_path,
+                'scaler_path': self.scaler_path,
+            }
+            process = self._ctx.Process(target=_scoring_worker, args=(spec,), name=f'scoring-{w}', daemon=True)
+            process.start()
+            self._processes.append(process)
+            ready.append(event)
+        
+        event = self._ctx.Event()
+        spec = {
+            'rings': self.rings.spec,
+            'queues': [queue.spec for queue in self.queues],
+            'stream_list': self.stream_list,
+            'stop': self._stop,
+            'ready': event,
+            'store_factory': self.store_factory,
+            'collector_factory': self.collector_factory,
+        }
+        persistence = self._ctx.Process(target=_persistence_worker, args=(spec,), name='persistence', daemon=True)
+        persistence.start()
+        self._processes.append(persistence)
+        ready.append(event)
+        
+        deadline = time.monotonic() + timeout
+        for event, process in zip(ready, self._processes):
+            while not event.wait(0.1):
+                if not process.is_alive() or time.monotonic() > deadline:
+                    raise RuntimeError(f"Processo {process.name} não ficou pronto")
+        print(f"✓ {self.n_workers} workers de score + persistência prontos")
+    
+    async def start(self):
+        """Inicia o modo multiprocesso."""
+        print("\n" + "="*60)
+        print("SUPER ANALISTA - ENGINE DE TEMPO REAL (MULTIPROCESSO)")
+        print("="*60 + "\n")
+        
+        await self.init_history()
+        await asyncio.to_thread(self.start_processes)
+        
+        groups = [
+            self.names[i:i + MAX_STREAMS_PER_CONNECTION]
+            for i in range(0, len(self.names), MAX_STREAMS_PER_CONNECTION)
+        ]
+        await asyncio.gather(*(self._run_connection(group) for group in groups))
+    
+    async def _run_connection(self, names: List[str]):
+        """Mantém uma conexão inscrita nos streams informados (reconecta com backfill)."""
+        async def on_message(message: str):
+            self.process_message(message)
+            
+        await run_kline_connection(self.ws_url, names, on_message, on_connected=lambda: self.backfill_gaps(names))
+    
+    async def backfill_gaps(self, names: List[str]) -> int:
+        """
+        Publica nos rings as velas fechadas perdidas desde a última vela de cada
+        stream (uma consulta REST paginada por stream); os workers as aplicam em
+        ordem pelo caminho incremental normal.
+        
+        Returns:
+            Velas publicadas
+        """
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(DOWNLOAD_WORKERS)
+        
+        async def backfill_one(i: int) -> int:
+            gap = missing_range(self.rings.last_open_time(i), self.interval_ms[i])
+            if gap is None:
+                return 0
+            start_ms, end_ms = gap
+            if (end_ms - start_ms) // self.interval_ms[i] > RECONNECT_MAX_BACKFILL:
+                # Lacuna longa: só as velas mais recentes (o worker segue a partir delas)
+                print(f"⚠ {self.names[i]}: lacuna maior que {RECONNECT_MAX_BACKFILL} velas, recuperando apenas as últimas")
+                start_ms = end_ms - RECONNECT_MAX_BACKFILL * self.interval_ms[i]
+            
+            symbol, interval = self.stream_list[i]
+            try:
+                async with semaphore:
+                    df = await asyncio.to_thread(
+                        self.collector.get_candles_range,
+                        symbol=symbol, interval=interval, start_ms=start_ms, end_ms=end_ms
+                    )
+            except Exception as e:
+                print(f"⚠ Erro no backfill de {self.names[i]}: {e}")
+                return 0
+            
+            filled = 0
+            for candle in iter_candles(df, start_ms, end_ms):
+                self.rings.append(i, *candle)
+                filled += 1
+            if filled:
+                self._notify[self.owner(i)].set()
+                self.candles_written += filled
+            return filled
+        
+        total = sum(await asyncio.gather(*(backfill_one(self.index[name]) for name in names)))
+        if total:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe('gap_backfill', elapsed)
+            self.metrics.incr('backfilled_candles', total)
+            print(f"✓ Backfill: {total} velas em {elapsed * 1000:.0f}ms")
+        return total
+    
+    # ========== CAMINHO CRÍTICO ==========
+    
+    def process_message(self, message: str) -> bool:
+        """
+        Publica uma vela fechada no ring do stream e acorda o worker dono.
+        
+        Returns:
+            True se uma vela nova foi publicada
+        """
+        received_ms = time.time() * 1000
+        started = time.perf_counter()
+        data = json.loads(message)
+        metrics = self.metrics
+        metrics.observe('json_decode', time.perf_counter() - started)
+        
+        if 'stream' in data and 'data' in data:
+            stream, event = self.index.get(data['stream']), data['data']
+        elif 'k' in data:
+            event = data
+            stream = self.index.get(stream_name(event['k']['s'], event['k']['i']))
+        else:
+            return False
+        if stream is None or 'k' not in event:
+            return False
+        
+        kline = event['k']
+        event_time = event.get('E')
+        if event_time is not None:
+            metrics.observe('ws_receive_lag', (received_ms - event_time) / 1000)
+        if not kline['x']:
+            return False
+        
+        buffer_started = time.perf_counter()
+        open_time = int(kline['t'])
+        last = self.rings.last_open_time(stream)
+        if last is not None and open_time <= last:
+            metrics.incr('duplicate_candles')
+            return False
+        
+        self.rings.append(
+            stream, open_time,
+            float(kline['o']), float(kline['h']), float(kline['l']), float(kline['c']), float(kline['v'])
+        )
+        self._notify[self.owner(stream)].set()
+        self.candles_written += 1
+        metrics.observe('buffer_update', time.perf_counter() - buffer_started)
+        metrics.incr('candles')
+        return True
+    
+    # ========== ENCERRAMENTO ==========
+    
+    def stop(self, timeout: float = 30.0):
+        """Encerra os processos (a persistência esvazia as filas) e libera a shared memory."""
+        self._stop.set()
+        for event in self._notify:
+            event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+        self.rings.close()
+        for queue in self.queues:
+            queue.close()
+
+
+# Script de execução
+async def main():
+    engine = MultiProcessEngine()
+    try:
+        await engine.start()
+    finally:
+        engine.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n\n✓ Engine finalizado pelo usuário")
@@ -0,0 +1,119 @@
+"""
+Camada de execução entre o event loop e o trabalho de CPU do engine
+(features incrementais + modelo) em um pool de threads
+"""
+import asyncio
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config import PREDICTION_WORKERS, PREDICTION_MAX_PENDING
+
+
+class PredictionExecutor:
+    """
+    Despacha os jobs de previsão de cada stream para um pool de threads.
+    
+    - Ordem por stream: cada stream tem uma fila própria e no máximo um job
+      em execução, então o estado incremental avança sempre em ordem.
+    - Coalescência: um job recebe todas as velas acumuladas do stream; o
+      compute avança o estado por todas, mas só pontua a mais recente (a
+      previsão das anteriores já teria a vela alvo fechada).
+    - Backpressure: com max_pending velas aguardando, submit() espera em vez
+      de acumular; o engine para de ler o WebSocket e o TCP segura o resto.
+    
+    Com workers=0 o compute roda direto no event loop (comportamento síncrono).
+    """
+    
+    def __init__(
+        self,
+        compute: Callable[[Any, List], Any],
+        on_result: Callable[[Any, Any, float], Awaitable],
+        workers: int = PREDICTION_WORKERS,
+        max_pending: int = PREDICTION_MAX_PENDING
+    ):
+        """
+        Args:
+            compute: compute(state, itens) -> resultado (roda no pool; não deve levantar exceção)
+            on_result: Corrotina on_result(state, resultado, submetido_em) chamada no event loop;
+                       submetido_em é o perf_counter da submissão do item mais recente
+            workers: Threads do pool (0 = síncrono no event loop)
+            max_pending: Itens aguardando (todos os streams) antes de aplicar backpressure
+        """
+        self.compute = compute
+        self.on_result = on_result
+        self.workers = workers
+        self.max_pending = max_pending
+        
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='predict') if workers > 0 else None
+        self._queues: Dict[str, List[Tuple[Any, float]]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._pending = 0
+        self._capacity: Optional[asyncio.Event] = None
+        
+        self.stats = {'submitted': 0, 'jobs': 0, 'coalesced': 0, 'backpressure_waits': 0}
+    
+    @property
+    def pending(self) -> int:
+        """Itens aguardando ou em execução."""
+        return self._pending
+    
+    def is_busy(self, name: str) -> bool:
+        """True se o stream tem itens na fila ou um job em execução."""
+        return name in self._running
+    
+    async def submit(self, state, item):
+        """
+        Enfileira um item (ex: vela fechada) do stream `state` (precisa de state.name).
+        Retorna assim que o item estiver na fila, exceto sob backpressure.
+        """
+        self.stats['submitted'] += 1
+        submitted = time.perf_counter()
+        
+        if self._pool is None:
+            self.stats['jobs'] += 1
+            await self.on_result(state, self.compute(state, [item]), submitted)
+            return
+        
+        if self._capacity is None:
+            self._capacity = asyncio.Event()
+        while self._pending >= self.max_pending:
+            self.stats['backpressure_waits'] += 1
+            self._capacity.clear()
+            await self._capacity.wait()
+        
+        self._queues.setdefault(state.name, []).append((item, submitted))
+        self._pending += 1
+        if state.name not in self._running:
+            self._running[state.name] = asyncio.create_task(self._drain(state))
+    
+    async def _drain(self, state):
+        """Processa a fila de um stream até esvaziar (um job por vez)."""
+        loop = asyncio.get_running_loop()
+        try:
+            while self._queues.get(state.name):
+                batch = self._queues.pop(state.name)
+                self.stats['jobs'] += 1
+                self.stats['coalesced'] += len(batch) - 1
+                try:
+                    result = await loop.run_in_executor(self._pool, self.compute, state, [item for item, _ in batch])
+                finally:
+                    self._pending -= len(batch)
+                    if self._pending < self.max_pending:
+                        self._capacity.set()
+                await self.on_result(state, result, batch[-1][1])
+        except Exception:
+            print(f"Erro no job de previsão de {state.name}:\n{traceback.format_exc()}")
+        finally:
+            del self._running[state.name]
+    
+    async def join(self):
+        """Aguarda todas as filas esvaziarem."""
+        while self._running:
+            await asyncio.gather(*list(self._running.values()))
+    
+    def close(self):
+        """Encerra o pool (jobs em execução terminam)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
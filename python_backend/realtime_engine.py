@@ -2,37 +2,202 @@
 Engine de tempo real - WebSocket + Previsões
 """
 import asyncio
-import websockets
+import time
+import traceback
+import uuid
 import json
 from datetime import datetime
 import pandas as pd
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from data_collector import BinanceDataCollector
-from feature_engineering import FeatureEngineer
+from candle_buffer import CandleRingBuffer, interval_to_ms, now_ms
+from streaming_features import StreamingFeatureEngine
 from ml_model import MLPredictor
-from config import SYMBOL, TIMEFRAME, MIN_CONFIDENCE_THRESHOLD, LOOKBACK_PERIODS
-from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY
+from signal_writer import SignalStore, SignalWriter, SupabaseSignalStore
+from signal_registry import PendingSignal, PendingSignalRegistry
+from metrics import EngineMetrics
+from prediction_executor import PredictionExecutor
+from stream_client import iter_candles, missing_range, run_kline_connection
+from engine_snapshot import load_snapshot, save_snapshot
+from config import (
+    STREAMS, MIN_CONFIDENCE_THRESHOLD, LOOKBACK_PERIODS,
+    STREAMING_PARITY_CHECK, BINANCE_WS_URL, MAX_STREAMS_PER_CONNECTION, DOWNLOAD_WORKERS,
+    SIGNAL_RESULT_GRACE_MS, SIGNAL_GAP_CHECK_INTERVAL, SIGNAL_QUEUE_MAXSIZE,
+    METRICS_HOST, METRICS_PORT, METRICS_LOG_INTERVAL, STREAM_RECORD_PATH, PREDICTION_WORKERS,
+    RECONNECT_MAX_BACKFILL, ENGINE_SNAPSHOT_PATH, ENGINE_SNAPSHOT_INTERVAL
+)
+
+
+# Moedas de cotação reconhecidas ao formatar o símbolo (BTCUSDT -> BTC/USDT)
+QUOTE_ASSETS = ('USDT', 'FDUSD', 'USDC', 'BUSD', 'TUSD', 'BTC', 'ETH', 'BNB', 'EUR', 'BRL')
+
+
+def stream_name(symbol: str, interval: str) -> str:
+    """Nome do stream de klines na Binance (ex: btcusdt@kline_1m)."""
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+def format_symbol(symbol: str) -> str:
+    """Formata o par para exibição/banco (ex: BTCUSDT -> BTC/USDT)."""
+    symbol = symbol.upper()
+    for quote in QUOTE_ASSETS:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return f"{symbol[:-len(quote)]}/{quote}"
+    return symbol
+
+
+def format_timeframe(interval: str) -> str:
+    """Formata o timeframe para o banco (ex: 1m -> M1, 1h -> H1)."""
+    return f"{interval[-1].upper()}{interval[:-1]}"
+
+
+def build_signal_row(signal_id: str, prediction_details: Dict) -> Dict:
+    """Linha da tabela `signals` para uma previsão (com symbol/interval nos detalhes)."""
+    return {
+        'id': signal_id,
+        'timestamp': prediction_details['timestamp'].isoformat(),
+        'symbol': format_symbol(prediction_details['symbol']),
+        'timeframe': format_timeframe(prediction_details['interval']),
+        'prediction': prediction_details['prediction'],
+        'confidence_score': prediction_details['confidence'],
+        'open_price': prediction_details['current_price'],
+        'result': 'PENDING',
+        'features': prediction_details['features']
+    }
+
+
+class StreamState:
+    """
+    Estado de um par (símbolo, timeframe): buffer de velas, features
+    incrementais e o preditor usado para ele.
+    """
+    
+    def __init__(self, symbol: str, interval: str, predictor: MLPredictor):
+        self.symbol = symbol.upper()
+        self.interval = interval
+        self.name = stream_name(symbol, interval)
+        self.interval_ms = interval_to_ms(interval)
+        self.predictor = predictor
+        
+        # Cache de velas recentes (buffer circular de capacidade fixa)
+        self.candles_buffer = CandleRingBuffer(capacity=LOOKBACK_PERIODS)
+        
+        # Estado incremental das features (O(1) por vela)
+        self.feature_engine = StreamingFeatureEngine(parity_check=STREAMING_PARITY_CHECK)
+        self.last_prediction = None
+
+    def load_history(self, df: pd.DataFrame):
+        """Recarrega o buffer com velas fechadas e aquece os indicadores incrementais."""
+        self.candles_buffer.clear()
+        self.candles_buffer.extend_from_frame(df)
+        self.feature_engine.reset()
+        self.feature_engine.warm_up_from_buffer(self.candles_buffer)
+
+    def snapshot(self) -> Dict:
+        """
+        Buffer, estado incremental e última vela processada (chamar sem job de
+        previsão em execução para o stream).
+        """
+        return {
+            'buffer': {col: values.copy() for col, values in self.candles_buffer.views().items()},
+            'features': self.feature_engine.get_state(),
+            'last_open_time': self.candles_buffer.last_open_time,
+        }
+    
+    def restore(self, snapshot: Dict):
+        """Recarrega o buffer e os indicadores de um snapshot (sem recalcular o histórico)."""
+        self.candles_buffer.clear()
+        self.candles_buffer.extend_from_views(snapshot['buffer'])
+        self.feature_engine.set_state(snapshot['features'])
 
 
 class RealtimeEngine:
     """
     Engine que processa dados em tempo real via WebSocket da Binance
     e gera sinais quando o modelo atinge confiança suficiente.
+    
+    Vários pares (símbolo, timeframe) são atendidos pelo mesmo processo:
+    os streams são agrupados em poucas conexões do endpoint combinado e
+    cada vela fechada é roteada para o estado do seu stream.
     """
     
-    def __init__(self):
-        self.collector = BinanceDataCollector()
+    def __init__(
+        self,
+        streams: Optional[List[Tuple[str, str]]] = None,
+        symbol_models: Optional[Dict[str, Tuple[str, str]]] = None,
+        ws_url: str = BINANCE_WS_URL,
+        collector: Optional[BinanceDataCollector] = None,
+        signal_store: Optional[SignalStore] = None,
+        metrics: Optional[EngineMetrics] = None,
+        recorder=None,
+        prediction_workers: int = PREDICTION_WORKERS,
+        backfill: bool = True,
+        snapshot_path: Optional[str] = ENGINE_SNAPSHOT_PATH
+    ):
+        """
+        Args:
+            streams: Lista de (símbolo, timeframe). Padrão: STREAMS do config
+            symbol_models: Modelos específicos por símbolo {símbolo: (model_path, scaler_path)};
+                           símbolos sem entrada usam o modelo padrão compartilhado
+            ws_url: Endpoint base de streams combinados
+            collector: Coletor de dados (injetável para testes)
+            signal_store: Destino dos sinais (padrão: tabela `signals` do Supabase)
+            metrics: Histogramas de latência por etapa (padrão: METRICS_ENABLED do config)
+            recorder: Gravador das mensagens brutas recebidas (ex: stream_replay.StreamRecorder)
+            prediction_workers: Threads para features + modelo (0 = no próprio event loop)
+            backfill: Buscar via REST as velas perdidas a cada (re)conexão do WebSocket
+            snapshot_path: Snapshot do estado para reinício a quente (None/'' = desativado)
+        """
+        self.collector = collector or BinanceDataCollector()
+        if signal_store is None:
+            signal_store = SupabaseSignalStore.from_config()
+        
+        # Latência por etapa; {signal_id: (perf_counter do enfileiramento, fechamento da vela em ms)}
+        self.metrics = metrics or EngineMetrics()
+        self._signal_origins: Dict[str, Tuple[float, int]] = {}
+        
+        # Escrita no banco em thread própria (o event loop só enfileira)
+        self.signal_writer = SignalWriter(
+            signal_store,
+            on_commit=self._on_signals_committed if self.metrics.enabled else None
+        )
+        
+        # Features e modelo fora do event loop (ordem por stream, velas acumuladas coalescidas)
+        self.prediction_executor = PredictionExecutor(
+            self._compute_prediction, self._on_prediction, workers=prediction_workers
+        )
+        
+        # Sinais aguardando a vela alvo (resolvidos pelo próprio stream)
+        self.pending_signals = PendingSignalRegistry(self._on_signal_result)
+        self.ws_url = ws_url.rstrip('/')
+        self.recorder = recorder
+        self.backfill = backfill
+        
+        # Último snapshot de cada stream (streams ocupados no pool mantêm o anterior)
+        self.snapshot_path = snapshot_path
+        self._stream_snapshots: Dict[str, Dict] = {}
+        
+        # Preditor compartilhado (modelo carregado uma única vez)
         self.predictor = MLPredictor()
-        self.supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        self._load_predictor(self.predictor)
         
-        # Cache de velas recentes
-        self.candles_buffer = []
-        self.last_prediction = None
+        symbol_predictors = {}
+        for symbol, (model_path, scaler_path) in (symbol_models or {}).items():
+            predictor = MLPredictor()
+            self._load_predictor(predictor, model_path, scaler_path)
+            symbol_predictors[symbol.upper()] = predictor
+        
+        self.streams: Dict[str, StreamState] = {}
+        for symbol, interval in (streams or STREAMS):
+            predictor = symbol_predictors.get(symbol.upper(), self.predictor)
+            state = StreamState(symbol, interval, predictor)
+            self.streams[state.name] = state
         
-        # Carregar modelo treinado
+    @staticmethod
+    def _load_predictor(predictor: MLPredictor, *paths):
+        """Carrega o modelo treinado no preditor."""
         try:
-            self.predictor.load_model()
+            predictor.load_model(*paths)
             print("✓ Modelo carregado com sucesso")
         except Exception as e:
             print(f"⚠ Erro ao carregar modelo: {e}")
@@ -44,39 +209,165 @@ class RealtimeEngine:
         print("SUPER ANALISTA - ENGINE DE TEMPO REAL")
         print("="*60 + "\n")
         
-        # Inicializar buffer com dados históricos
-        print("Inicializando buffer com dados históricos...")
-        await self._init_buffer()
+        # Restaurar o último snapshot; só os streams sem snapshot válido vão ao REST
+        restored = self.restore_snapshot()
+        cold = [state for name, state in self.streams.items() if name not in restored]
+        if cold:
+            print(f"Inicializando buffers de {len(cold)} streams com dados históricos...")
+            await self._init_buffers(cold)
         
-        # Conectar ao WebSocket da Binance
-        symbol = SYMBOL.lower()
-        ws_url = f"wss://stream.binance.com:9443/ws/{symbol}@kline_{TIMEFRAME}"
+        # Agrupar streams no menor número de conexões possível
+        names = list(self.streams)
+        groups = [
+            names[i:i + MAX_STREAMS_PER_CONNECTION]
+            for i in range(0, len(names), MAX_STREAMS_PER_CONNECTION)
+        ]
         
-        print(f"Conectando ao WebSocket: {ws_url}\n")
+        tasks = [self._run_connection(group) for group in groups]
+        tasks.append(self._resolve_gaps_loop())
+        if self.snapshot_path and ENGINE_SNAPSHOT_INTERVAL > 0:
+            tasks.append(self._snapshot_loop())
+        if self.metrics.enabled:
+            if METRICS_PORT:
+                self.metrics.start_server(METRICS_HOST, METRICS_PORT)
+                print(f"✓ Métricas em http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+            if METRICS_LOG_INTERVAL > 0:
+                tasks.append(self._metrics_log_loop())
         
-        async with websockets.connect(ws_url) as websocket:
-            print("✓ Conectado! Aguardando velas...\n")
+        await asyncio.gather(*tasks)
+        
+    async def _run_connection(self, names: List[str]):
+        """
+        Mantém uma conexão do endpoint combinado inscrita nos streams informados.
+        Quedas reconectam com backoff; as velas perdidas são recuperadas antes
+        de voltar às mensagens ao vivo.
+        """
+        print(f"Conectando ao WebSocket: {self.ws_url}/stream ({len(names)} streams)\n")
+        
+        async def on_message(message: str):
+            if self.recorder is not None:
+                self.recorder.write(message)
+            await self._process_message(message)
+        
+        await run_kline_connection(self.ws_url, names, on_message, on_connected=lambda: self._backfill_gaps(names))
+    
+    async def _backfill_gaps(self, names: List[str]):
+        """
+        Recupera as velas fechadas desde a última vela de cada buffer (queda do
+        WebSocket ou intervalo entre o histórico inicial e a conexão): uma
+        consulta REST paginada por stream, só do intervalo que faltou, aplicada
+        pelo mesmo caminho incremental das velas ao vivo.
+        """
+        if not self.backfill:
+            return
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(DOWNLOAD_WORKERS)
+        
+        async def backfill_one(state: StreamState) -> int:
+            gap = missing_range(state.candles_buffer.last_open_time, state.interval_ms)
+            if gap is None:
+                return 0
+            start_ms, end_ms = gap
+            missing = (end_ms - start_ms) // state.interval_ms
+            
+            try:
+                if missing > RECONNECT_MAX_BACKFILL:
+                    # Lacuna longa: recomeçar do histórico recente sai mais barato
+                    print(f"⚠ {state.name}: {missing} velas perdidas, recarregando o buffer")
+                    await self.prediction_executor.join()
+                    async with semaphore:
+                        await self._init_buffer(state)
+                    return 0
+                
+                async with semaphore:
+                    df = await asyncio.to_thread(
+                        self.collector.get_candles_range,
+                        symbol=state.symbol, interval=state.interval, start_ms=start_ms, end_ms=end_ms
+                    )
+            except Exception as e:
+                print(f"⚠ Erro no backfill de {state.name}: {e}")
+                return 0
             
-            async for message in websocket:
-                await self._process_message(message)
+            filled = 0
+            for open_time, o, h, l, c, v in iter_candles(df, start_ms, end_ms):
+                candle = {
+                    'timestamp': pd.to_datetime(open_time, unit='ms'),
+                    'open': o, 'high': h, 'low': l, 'close': c, 'volume': v
+                }
+                filled += await self._ingest_candle(state, open_time, candle)
+            return filled
+        
+        filled = await asyncio.gather(*(backfill_one(self.streams[name]) for name in names))
+        total = sum(filled)
+        if total:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe('gap_backfill', elapsed)
+            self.metrics.incr('backfilled_candles', total)
+            print(f"✓ Backfill: {total} velas de {sum(1 for n in filled if n)} streams em {elapsed * 1000:.0f}ms")
     
-    async def _init_buffer(self):
-        """Inicializa o buffer com as últimas N velas."""
-        df = self.collector.get_latest_candles(limit=LOOKBACK_PERIODS)
-        self.candles_buffer = df.to_dict('records')
-        print(f"✓ Buffer inicializado com {len(self.candles_buffer)} velas")
+    async def _init_buffers(self, states: Optional[List[StreamState]] = None):
+        """Inicializa os buffers dos streams (padrão: todos) em paralelo (REST limitado)."""
+        semaphore = asyncio.Semaphore(DOWNLOAD_WORKERS)
+        
+        async def init_one(state: StreamState):
+            async with semaphore:
+                await self._init_buffer(state)
+        
+        await asyncio.gather(*(init_one(state) for state in (states or self.streams.values())))
+    
+    async def _init_buffer(self, state: StreamState):
+        """Inicializa o buffer de um stream com as últimas N velas."""
+        df = await asyncio.to_thread(
+            self.collector.get_latest_candles,
+            symbol=state.symbol, interval=state.interval, limit=LOOKBACK_PERIODS
+        )
+        
+        # Descartar a vela ainda em formação (ela chegará fechada pelo WebSocket)
+        if not df.empty:
+            open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype('int64')
+            df = df[open_times + state.interval_ms <= now_ms()]
+        
+        # Aquecer indicadores incrementais com o histórico
+        state.load_history(df)
+        print(f"✓ Buffer {state.name} inicializado com {len(state.candles_buffer)} velas")
+    
+    def _route(self, data: Dict) -> Tuple[Optional[StreamState], Optional[Dict]]:
+        """Identifica o stream de uma mensagem (combinada ou de stream único)."""
+        if 'stream' in data and 'data' in data:
+            return self.streams.get(data['stream']), data['data']
+        
+        if 'k' in data:
+            kline = data['k']
+            return self.streams.get(stream_name(kline['s'], kline['i'])), data
+        
+        return None, None
     
     async def _process_message(self, message: str):
         """Processa mensagem do WebSocket."""
+        received_ms = time.time() * 1000
+        started = time.perf_counter()
         data = json.loads(message)
+        decoded = time.perf_counter()
         
-        if 'k' not in data:
+        metrics = self.metrics
+        metrics.observe('json_decode', decoded - started)
+        
+        state, event = self._route(data)
+        if state is None or 'k' not in event:
             return
         
-        kline = data['k']
+        kline = event['k']
         is_closed = kline['x']  # True se a vela fechou
         
-        # Atualizar vela atual no buffer
+        # Atraso de entrega: horário do evento na Binance até a chegada aqui
+        event_time = event.get('E')
+        if event_time is not None:
+            metrics.observe('ws_receive_lag', (received_ms - event_time) / 1000)
+        
+        # Apenas quando a vela fecha
+        if not is_closed:
+            return
+        
         current_candle = {
             'timestamp': pd.to_datetime(kline['t'], unit='ms'),
             'open': float(kline['o']),
@@ -86,124 +377,311 @@ class RealtimeEngine:
             'volume': float(kline['v'])
         }
         
-        # Apenas quando a vela fecha
-        if is_closed:
-            print(f"\n{'='*60}")
-            print(f"NOVA VELA FECHADA - {current_candle['timestamp']}")
-            print(f"{'='*60}")
-            print(f"O: {current_candle['open']:.2f} | H: {current_candle['high']:.2f} | "
-                  f"L: {current_candle['low']:.2f} | C: {current_candle['close']:.2f}")
+        # Uma única escrita no stdout por vela
+        print(f"\n{'='*60}\n"
+              f"NOVA VELA FECHADA - {state.symbol} {state.interval} - {current_candle['timestamp']}\n"
+              f"{'='*60}\n"
+              f"O: {current_candle['open']:.2f} | H: {current_candle['high']:.2f} | "
+              f"L: {current_candle['low']:.2f} | C: {current_candle['close']:.2f}")
+            
+        if await self._ingest_candle(state, kline['t'], current_candle):
+            metrics.observe('candle_total', time.perf_counter() - started)
+    
+    async def _ingest_candle(self, state: StreamState, open_time: int, candle: Dict) -> bool:
+        """
+        Aplica uma vela fechada (WebSocket ou backfill) ao estado do stream.
+        
+        Returns:
+            True se a vela era nova e foi enviada ao pool de previsão
+        """
+        metrics = self.metrics
+        
+        # Resolver sinais cuja vela alvo é esta (fechamento exato, sem REST)
+        buffer_started = time.perf_counter()
+        self.pending_signals.resolve(state.symbol, state.interval, open_time, candle['close'])
+        
+        # Adicionar ao buffer (O(1), descarta automaticamente a vela mais antiga)
+        is_new = state.candles_buffer.append(
+            open_time,
+            candle['open'],
+            candle['high'],
+            candle['low'],
+            candle['close'],
+            candle['volume']
+        )
             
-            # Adicionar ao buffer
-            self.candles_buffer.append(current_candle)
+        if not is_new:
+            # Vela repetida ou fora de ordem: estado já contabilizado
+            metrics.incr('duplicate_candles')
+            return False
             
-            # Manter apenas as últimas N velas
-            if len(self.candles_buffer) > LOOKBACK_PERIODS:
-                self.candles_buffer.pop(0)
+        metrics.observe('buffer_update', time.perf_counter() - buffer_started)
+        metrics.incr('candles')
             
-            # Fazer previsão
-            await self._make_prediction()
+        # Features incrementais + previsão no pool (retorna sem esperar o modelo)
+        await self.prediction_executor.submit(state, (open_time, candle))
+        return True
     
-    async def _make_prediction(self):
-        """Faz previsão com os dados atuais."""
+    def _compute_prediction(self, state: StreamState, candles: List[Tuple[int, Dict]]) -> Dict:
+        """
+        Avança as features incrementais por todas as velas do job e pontua a
+        mais recente (roda no pool do PredictionExecutor, sem prints).
+        
+        Args:
+            state: Stream das velas
+            candles: Lista de (open_time em ms, vela) em ordem
+        
+        Returns:
+            Dict com open_time, detalhes da previsão (None se em aquecimento),
+            tempos das etapas e o traceback em caso de erro
+        """
+        started = time.perf_counter()
+        result = {'open_time': candles[-1][0], 'candles': len(candles), 'started': started,
+                  'details': None, 'error': None}
         try:
-            # Converter buffer para DataFrame
-            df = pd.DataFrame(self.candles_buffer)
-            
-            # Calcular features
-            engineer = FeatureEngineer(df)
-            features_df = engineer.calculate_all_features()
+            engine = state.feature_engine
+            for _, candle in candles:
+                engine.update(candle)
+            scoring_started = time.perf_counter()
+            result['features_s'] = scoring_started - started
             
-            if len(features_df) == 0:
-                print("⚠ Features insuficientes para previsão")
-                return
+            if engine.last_features is None or not engine.is_ready:
+                return result
             
-            # Fazer previsão
-            prediction_details = self.predictor.predict_with_details(features_df)
+            # Fazer previsão (direto do dict de features, sem DataFrame)
+            details = state.predictor.predict_row_with_details(
+                engine.last_features, engine.last_timestamp, engine.last_close
+            )
+            result['scoring_s'] = time.perf_counter() - scoring_started
+            details['symbol'] = state.symbol
+            details['interval'] = state.interval
+            result['details'] = details
+        except Exception:
+            result['error'] = traceback.format_exc()
+        return result
+    
+    async def _on_prediction(self, state: StreamState, result: Dict, submitted: float):
+        """Registra as métricas do job e decide o sinal (no event loop)."""
+        metrics = self.metrics
+        metrics.observe('prediction_queue', result['started'] - submitted)
+        if result['candles'] > 1:
+            metrics.incr('coalesced_candles', result['candles'] - 1)
+        if 'features_s' in result:
+            metrics.observe('features', result['features_s'])
+        
+        if result['error'] is not None:
+            print(f"Erro ao fazer previsão:\n{result['error']}")
+            return
+        
+        prediction_details = result['details']
+        if prediction_details is None:
+            print("⚠ Features insuficientes para previsão")
+            return
+        metrics.observe('scoring', result['scoring_s'])
             
-            prediction = prediction_details['prediction']
-            confidence = prediction_details['confidence']
+        prediction = prediction_details['prediction']
+        confidence = prediction_details['confidence']
+        lines = [
+            f"\n--- PREVISÃO {state.symbol} {state.interval} ---",
+            f"Direção: {prediction} ({'🟩 CALL' if prediction == 'CALL' else '🟥 PUT'})",
+            f"Confiança: {confidence:.2f}%",
+        ]
             
-            print(f"\n--- PREVISÃO ---")
-            print(f"Direção: {prediction} ({'🟩 CALL' if prediction == 'CALL' else '🟥 PUT'})")
-            print(f"Confiança: {confidence:.2f}%")
+        # A vela alvo é a seguinte; se ela já fechou enquanto o job esperava, o sinal seria inútil
+        target_open_time = result['open_time'] + state.interval_ms
+        if state.candles_buffer.last_open_time >= target_open_time:
+            metrics.incr('stale_predictions')
+            lines.append("\n⚠ Vela alvo já fechou enquanto a previsão era calculada. Sinal descartado.")
+            print("\n".join(lines))
+            return
             
-            # Verificar se atinge o limiar mínimo
-            if confidence >= MIN_CONFIDENCE_THRESHOLD:
-                print(f"\n✓ SINAL GERADO! (Confiança acima de {MIN_CONFIDENCE_THRESHOLD}%)")
-                await self._save_signal(prediction_details)
-            else:
-                print(f"\n⚠ Confiança abaixo do limiar ({MIN_CONFIDENCE_THRESHOLD}%). Sinal não gerado.")
+        # Verificar se atinge o limiar mínimo
+        if confidence >= MIN_CONFIDENCE_THRESHOLD:
+            lines.append(f"\n✓ SINAL GERADO! (Confiança acima de {MIN_CONFIDENCE_THRESHOLD}%)")
+            print("\n".join(lines))
+            await self._save_signal(state, prediction_details, target_open_time)
+        else:
+            lines.append(f"\n⚠ Confiança abaixo do limiar ({MIN_CONFIDENCE_THRESHOLD}%). Sinal não gerado.")
+            print("\n".join(lines))
             
-            self.last_prediction = prediction_details
+        state.last_prediction = prediction_details
+        metrics.observe('candle_to_decision', time.perf_counter() - submitted)
             
-        except Exception as e:
-            print(f"Erro ao fazer previsão: {e}")
-            import traceback
-            traceback.print_exc()
+    async def _save_signal(self, state: StreamState, prediction_details: Dict, target_open_time: int):
+        """
+        Enfileira o sinal para gravação no banco (não bloqueia o event loop).
     
-    async def _save_signal(self, prediction_details: Dict):
-        """Salva sinal no Supabase."""
+        Args:
+            state: Stream do sinal
+            prediction_details: Resultado de predict_row_with_details
+            target_open_time: Abertura da vela prevista (= fechamento da vela pontuada), em ms
+        """
         try:
-            signal_data = {
-                'timestamp': prediction_details['timestamp'].isoformat(),
-                'symbol': 'BTC/USDT',
-                'timeframe': 'M1',
-                'prediction': prediction_details['prediction'],
-                'confidence_score': prediction_details['confidence'],
-                'open_price': prediction_details['current_price'],
-                'result': 'PENDING',
-                'features': prediction_details['features']
-            }
+            # ID gerado localmente: a atualização do resultado não depende da resposta do insert
+            signal_id = str(uuid.uuid4())
+            signal_data = build_signal_row(signal_id, prediction_details)
             
-            result = self.supabase.table('signals').insert(signal_data).execute()
+            enqueue_started = time.perf_counter()
+            if self.metrics.enabled:
+                self._track_signal(signal_id, enqueue_started, target_open_time)
+            self.signal_writer.enqueue_insert(signal_data)
+            self.metrics.observe('persist_enqueue', time.perf_counter() - enqueue_started)
+            self.metrics.incr('signals')
             
-            print(f"✓ Sinal salvo no banco de dados (ID: {result.data[0]['id']})")
+            print(f"✓ Sinal enfileirado para o banco de dados (ID: {signal_id})")
             
-            # Agendar verificação de resultado em 60 segundos
-            asyncio.create_task(self._verify_signal_result(result.data[0]['id'], prediction_details))
+            # O resultado sai do fechamento da próxima vela deste stream
+            self.pending_signals.add(PendingSignal(
+                signal_id,
+                state.symbol,
+                state.interval,
+                target_open_time,
+                prediction_details['prediction'],
+                prediction_details['current_price']
+            ))
             
         except Exception as e:
             print(f"Erro ao salvar sinal: {e}")
     
-    async def _verify_signal_result(self, signal_id: str, prediction_details: Dict):
+    def _on_signal_result(self, signal_id: str, fields: Dict):
+        """Enfileira o resultado de um sinal resolvido."""
+        self.signal_writer.enqueue_update(signal_id, fields)
+        
+        emoji = '✅' if fields['result'] == 'WIN' else '❌'
+        print(f"\n{emoji} Resultado do sinal {signal_id}: {fields['result']} (Close: {fields['close_price']:.2f})")
+    
+    def _track_signal(self, signal_id: str, enqueued: float, close_ms: int):
+        """Guarda a origem do sinal para medir a latência até o commit (limitado ao tamanho da fila)."""
+        origins = self._signal_origins
+        if len(origins) >= SIGNAL_QUEUE_MAXSIZE:
+            # Sinais que foram para o journal nunca recebem commit pela fila
+            origins.pop(next(iter(origins)), None)
+        origins[signal_id] = (enqueued, close_ms)
+    
+    def _on_signals_committed(self, rows: List[Dict]):
+        """Registra as latências de persistência (executa na thread do SignalWriter)."""
+        committed = time.perf_counter()
+        committed_ms = time.time() * 1000
+        for row in rows:
+            origin = self._signal_origins.pop(row['id'], None)
+            if origin is None:
+                continue
+            enqueued, close_ms = origin
+            self.metrics.observe('persist_commit', committed - enqueued)
+            self.metrics.observe('close_to_commit', (committed_ms - close_ms) / 1000)
+    
+    # ========== SNAPSHOT ==========
+    
+    def _capture_snapshot(self) -> Dict[str, Dict]:
+        """Estado atual dos streams sem job de previsão em andamento (no event loop)."""
+        for name, state in self.streams.items():
+            if not self.prediction_executor.is_busy(name) and state.candles_buffer.last_open_time is not None:
+                self._stream_snapshots[name] = state.snapshot()
+        return dict(self._stream_snapshots)
+    
+    def save_snapshot(self) -> int:
+        """
+        Grava o snapshot do estado atual (ex: ao encerrar, com o pool parado).
+        
+        Returns:
+            Tamanho do arquivo em bytes (0 se desativado)
         """
-        Verifica o resultado do sinal após 60 segundos.
+        if not self.snapshot_path:
+            return 0
+        return save_snapshot(self.snapshot_path, self._capture_snapshot(), self.pending_signals.signals())
+    
+    def restore_snapshot(self) -> List[str]:
         """
-        await asyncio.sleep(65)  # Aguardar 65 segundos (vela fechar + margem)
+        Restaura buffers, indicadores e sinais pendentes do último snapshot.
+        Streams cuja lacuna desde o snapshot passa de RECONNECT_MAX_BACKFILL
+        velas ficam de fora (inicializados via REST); os demais só recuperam
+        as velas da lacuna no backfill da conexão.
         
-        try:
-            # Buscar preço de fechamento atual
-            df = self.collector.get_latest_candles(limit=2)
-            close_price = float(df.iloc[-1]['close'])
-            
-            open_price = prediction_details['current_price']
-            prediction = prediction_details['prediction']
-            
-            # Determinar resultado
-            if prediction == 'CALL':
-                result = 'WIN' if close_price > open_price else 'LOSS'
-            else:  # PUT
-                result = 'WIN' if close_price < open_price else 'LOSS'
-            
-            # Atualizar no banco
-            self.supabase.table('signals').update({
-                'close_price': close_price,
-                'result': result
-            }).eq('id', signal_id).execute()
-            
-            emoji = '✅' if result == 'WIN' else '❌'
-            print(f"\n{emoji} Resultado do sinal {signal_id}: {result}")
-            print(f"   Open: {open_price:.2f} | Close: {close_price:.2f} | Diff: {close_price - open_price:.2f}")
+        Returns:
+            Streams restaurados
+        """
+        snapshot = load_snapshot(self.snapshot_path)
+        if snapshot is None:
+            return []
+        
+        restored = []
+        for name, state in self.streams.items():
+            entry = snapshot['streams'].get(name)
+            if entry is None:
+                continue
+            gap = missing_range(entry['last_open_time'], state.interval_ms)
+            if gap is not None and (gap[1] - gap[0]) // state.interval_ms > RECONNECT_MAX_BACKFILL:
+                continue
+            state.restore(entry)
+            self._stream_snapshots[name] = entry
+            restored.append(name)
+        
+        for signal in snapshot['pending']:
+            self.pending_signals.add(signal)
+        
+        age = (now_ms() - snapshot['saved_at']) / 1000
+        print(f"✓ Snapshot restaurado: {len(restored)}/{len(self.streams)} streams, "
+              f"{len(snapshot['pending'])} sinais pendentes (gravado há {age:.0f}s)")
+        return restored
+    
+    async def _snapshot_loop(self):
+        """Grava periodicamente o snapshot (serialização fora do event loop)."""
+        while True:
+            await asyncio.sleep(ENGINE_SNAPSHOT_INTERVAL)
+            try:
+                streams = self._capture_snapshot()
+                await asyncio.to_thread(save_snapshot, self.snapshot_path, streams, self.pending_signals.signals())
+            except Exception as e:
+                print(f"⚠ Erro ao gravar snapshot: {e}")
+    
+    async def _metrics_log_loop(self):
+        """Emite periodicamente uma linha de log estruturada com os percentis por etapa."""
+        while True:
+            await asyncio.sleep(METRICS_LOG_INTERVAL)
+            print(self.metrics.log_line(), flush=True)
+    
+    async def _resolve_gaps_loop(self):
+        """
+        Resolve via REST apenas os sinais cuja vela alvo não chegou pelo
+        WebSocket (desconexão ou lacuna no stream).
+        """
+        while True:
+            await asyncio.sleep(SIGNAL_GAP_CHECK_INTERVAL)
             
-        except Exception as e:
-            print(f"Erro ao verificar resultado: {e}")
+            # Uma consulta por stream, só do intervalo que faltou; o registro
+            # é alterado apenas no event loop
+            for (symbol, interval), (start_ms, end_ms) in self.pending_signals.gap_ranges(
+                grace_ms=SIGNAL_RESULT_GRACE_MS
+            ).items():
+                try:
+                    df = await asyncio.to_thread(
+                        self.collector.get_candles_range,
+                        symbol=symbol, interval=interval, start_ms=start_ms, end_ms=end_ms
+                    )
+                    resolved = self.pending_signals.resolve_from_candles(symbol, interval, df)
+                    if resolved:
+                        print(f"✓ {len(resolved)} sinais atrasados de {symbol} {interval} resolvidos via REST")
+                except Exception as e:
+                    print(f"Erro ao resolver sinais atrasados de {symbol} {interval}: {e}")
 
 
 # Script de execução
 async def main():
-    engine = RealtimeEngine()
-    await engine.start()
+    recorder = None
+    if STREAM_RECORD_PATH:
+        from stream_replay import StreamRecorder
+        recorder = StreamRecorder(STREAM_RECORD_PATH)
+    
+    engine = RealtimeEngine(recorder=recorder)
+    try:
+        await engine.start()
+    finally:
+        engine.prediction_executor.close()
+        engine.save_snapshot()
+        engine.signal_writer.close()
+        engine.metrics.stop_server()
+        if recorder is not None:
+            recorder.close()
 
 
 if __name__ == "__main__":
@@ -215,4 +693,3 @@ if __name__ == "__main__":
         print(f"\n\n❌ Erro fatal: {e}")
         import traceback
         traceback.print_exc()
-
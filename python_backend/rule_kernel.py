@@ -0,0 +1,174 @@
+"""
+Kernel vetorizado das 10 regras probabilísticas
+"""
+from typing import Dict
+
+import numpy as np
+
+
+# Ordem em que as regras são adicionadas ao DataFrame de features
+RULE_COLUMNS = [
+    'rule_engolfo',
+    'rule_tres_soldados',
+    'rule_vela_forca',
+    'rule_tres_vales_picos',
+    'rule_mhi',
+    'rule_reversao_doji',
+    'rule_minoria',
+    'rule_primeira_quadrante',
+    'rule_alternancia',
+    'rule_sequencia_impar',
+]
+
+# Regras que dependem apenas das cores das últimas 3 velas
+COLOR_RULES = ['rule_mhi', 'rule_minoria', 'rule_alternancia', 'rule_sequencia_impar']
+
+# Código das cores das últimas 3 velas: bit0 = atual, bit1 = anterior, bit2 = duas atrás.
+# O código 8 marca linhas sem histórico suficiente (todas as regras = 0).
+N_COLOR_CODES = 8
+NO_HISTORY_CODE = N_COLOR_CODES
+
+# Velas anteriores consultadas pelas regras (as primeiras linhas ficam dentro
+# do aquecimento dos indicadores e são descartadas do treino e da inferência)
+RULE_LOOKBACK = 2
+
+EPS = 1e-10
+
+
+def _build_color_lut() -> np.ndarray:
+    """
+    Tabela (código de cores -> saída de cada regra de cor), derivada das mesmas
+    definições de FeatureEngineer._rule_mhi/_rule_minoria/_rule_alternancia/_rule_sequencia_impar.
+    """
+    lut = np.zeros((N_COLOR_CODES + 1, len(COLOR_RULES)), dtype=np.int64)
+    
+    for code in range(N_COLOR_CODES):
+        c0, c1, c2 = code & 1, (code >> 1) & 1, (code >> 2) & 1
+        last_3_sum = c0 + c1 + c2
+        
+        # MHI: maioria verde → PUT, maioria vermelha → CALL
+        mhi = -1 if last_3_sum >= 2 else 1
+        
+        # Minoria: entra a favor da cor minoritária
+        minoria = 1 if last_3_sum == 1 else (-1 if last_3_sum == 2 else 0)
+        
+        # Alternância: próxima cor oposta à atual
+        alternancia = (-1 if c0 == 1 else 1) if (c0 != c1 and c1 != c2) else 0
+        
+        # Sequência ímpar: contra 3 velas iguais
+        sequencia = (-1 if c0 == 1 else 1) if (c0 == c1 == c2) else 0
+        
+        lut[code] = (mhi, minoria, alternancia, sequencia)
+    
+    return lut
+
+
+COLOR_RULES_LUT = _build_color_lut()
+
+
+def color_codes(color: np.ndarray) -> np.ndarray:
+    """
+    Empacota as cores das últimas 3 velas de cada linha em um inteiro 0-7.
+    
+    Args:
+        color: Array de cores (1 = verde, 0 = vermelha)
+    
+    Returns:
+        Array int8 de códigos (NO_HISTORY_CODE nas duas primeiras linhas)
+    """
+    color = color.astype(np.int8, copy=False)
+    codes = np.full(len(color), NO_HISTORY_CODE, dtype=np.int8)
+    if len(color) > 2:
+        codes[2:] = color[2:] | (color[1:-1] << 1) | (color[:-2] << 2)
+    return codes
+
+
+def compute_rules(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    minute: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula as 10 regras em uma única passada sobre arrays contíguos.
+    
+    As regras de cor são lidas da tabela COLOR_RULES_LUT pelo código das
+    últimas 3 cores; as regras geométricas (engolfo, vela de força, doji,
+    vales/picos, soldados, quadrante) compartilham corpo/range/cor calculados
+    uma única vez.
+    
+    Args:
+        open_, high, low, close: Arrays float64 de preços
+        minute: Minuto (0-59) de abertura de cada vela
+    
+    Returns:
+        Dict {coluna da regra: array int64 com -1/0/1}
+    """
+    n = len(close)
+    color = (close > open_).astype(np.int8)
+    body = np.abs(close - open_)
+    body_ratio = body / ((high - low) + EPS)
+    direction = np.where(color == 1, 1, -1).astype(np.int64)
+    
+    out = {name: np.zeros(n, dtype=np.int64) for name in RULE_COLUMNS}
+    
+    # ---------- Regras de cor (tabela) ----------
+    lut_values = COLOR_RULES_LUT[color_codes(color)]
+    for j, name in enumerate(COLOR_RULES):
+        out[name] = np.ascontiguousarray(lut_values[:, j])
+    
+    # ---------- Regras de uma vela ----------
+    # 3. Vela de Força
+    out['rule_vela_forca'] = np.where(body_ratio > 0.7, direction, 0)
+    
+    # 8. Primeira Vela do Quadrante
+    quadrante = (minute % 15 == 0) & (body_ratio > 0.6)
+    out['rule_primeira_quadrante'] = np.where(quadrante, direction, 0)
+    
+    # ---------- Regras com a vela anterior ----------
+    if n > 1:
+        cur, prev = slice(1, None), slice(None, -1)
+        
+        # 1. Engolfo de Cor Única
+        engolfo = (
+            (color[cur] == color[prev]) &
+            (body[cur] > body[prev] * 1.5) &
+            (low[cur] <= low[prev]) &
+            (high[cur] >= high[prev])
+        )
+        out['rule_engolfo'][1:] = np.where(engolfo, direction[cur], 0)
+        
+        # 6. Reversão Pós-Doji
+        doji_anterior = body_ratio[prev] < 0.2
+        out['rule_reversao_doji'][1:] = np.where(doji_anterior, direction[cur], 0)
+    
+    # ---------- Regras com as duas velas anteriores ----------
+    if n > 2:
+        cur, prev, prev2 = slice(2, None), slice(1, -1), slice(None, -2)
+        
+        # 2. Três Soldados Brancos
+        out['rule_tres_soldados'][2:] = (
+            (color[cur] == 1) & (color[prev] == 1) & (color[prev2] == 1) &
+            (close[cur] > close[prev]) & (close[prev] > close[prev2])
+        )
+        
+        # 4. Três Vales/Picos (picos têm prioridade, como no FeatureEngineer)
+        vales = (low[cur] > low[prev]) & (low[prev] > low[prev2])
+        picos = (high[cur] < high[prev]) & (high[prev] < high[prev2])
+        out['rule_tres_vales_picos'][2:] = np.where(picos, -1, np.where(vales, 1, 0))
+    
+    return out
+
+
+def minutes_from_timestamps(timestamps) -> np.ndarray:
+    """
+    Minuto (0-59) de cada vela a partir de uma coluna de timestamps
+    (datetime ou epoch-ms), sem copiar o DataFrame.
+    """
+    values = np.asarray(timestamps)
+    if np.issubdtype(values.dtype, np.integer):
+        epoch_minutes = values // 60_000
+    else:
+        epoch_minutes = values.astype('datetime64[m]').astype(np.int64)
+    return epoch_minutes % 60
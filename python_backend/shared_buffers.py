@@ -0,0 +1,257 @@
+"""
+Estruturas em multiprocessing.shared_memory para o modo multiprocesso:
+ring buffers de velas por stream e filas de sinais
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import OHLCV_COLUMNS, _timestamps_to_epoch_ms
+
+
+# Registro de sinal publicado por um worker de score
+SIGNAL_RECORD_DTYPE = np.dtype([
+    ('stream', np.int32),      # Índice do stream
+    ('open_time', np.int64),   # Vela pontuada (epoch-ms)
+    ('call', np.int8),         # 1 = CALL, 0 = PUT
+    ('confidence', np.float32),
+    ('close', np.float64),     # Fechamento da vela pontuada (preço de entrada)
+    ('features', np.float64, (10,)),  # Primeiras 10 FEATURE_COLUMNS (coluna `features` da tabela)
+])
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Abre um bloco existente. Os processos filhos (spawn) compartilham o
+    resource_tracker do processo que criou o bloco, então o registro extra
+    é inócuo e a remoção fica a cargo do dono (close()).
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedCandleRings:
+    """
+    Ring buffers de velas (um por stream) em um único bloco de shared memory.
+    
+    Mesmo layout do CandleRingBuffer (valores espelhados em i e i + capacity,
+    então as últimas N velas são sempre uma fatia contígua), com um contador
+    de velas publicadas por stream. Um único escritor (processo de ingestão)
+    grava a vela e só depois incrementa o contador; os leitores consultam o
+    contador e leem as posições já publicadas, sem cópia e sem lock.
+    Uma leitura é válida enquanto o escritor não der a volta no ring (o
+    leitor confere o contador de novo depois de ler).
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, n_streams: int, capacity: int, owner: bool):
+        self.shm = shm
+        self.n_streams = n_streams
+        self.capacity = capacity
+        self.owner = owner
+        
+        width = 2 * capacity
+        offset = 0
+        self.counts = np.ndarray((n_streams,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.counts.nbytes
+        self.open_time = np.ndarray((n_streams, width), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self.open_time.nbytes
+        self.values = np.ndarray((n_streams, len(OHLCV_COLUMNS), width), dtype=np.float64, buffer=shm.buf, offset=offset)
+    
+    @staticmethod
+    def nbytes(n_streams: int, capacity: int) -> int:
+        return 8 * n_streams * (1 + 2 * capacity * (1 + len(OHLCV_COLUMNS)))
+    
+    @classmethod
+    def create(cls, n_streams: int, capacity: int) -> 'SharedCandleRings':
+        """Aloca o bloco (processo de ingestão)."""
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(n_streams, capacity))
+        rings = cls(shm, n_streams, capacity, owner=True)
+        rings.counts[:] = 0
+        return rings
+    
+    @classmethod
+    def attach(cls, name: str, n_streams: int, capacity: int) -> 'SharedCandleRings':
+        """Abre o bloco criado por outro processo."""
+        return cls(_attach(name), n_streams, capacity, owner=False)
+    
+    @property
+    def spec(self) -> Dict:
+        """Argumentos de attach() (enviados aos processos filhos)."""
+        return {'name': self.shm.name, 'n_streams': self.n_streams, 'capacity': self.capacity}
+    
+    # ========== ESCRITA (processo de ingestão) ==========
+    
+    def append(self, stream: int, open_time: int, open_: float, high: float, low: float, close: float, volume: float):
+        """Publica uma vela fechada no ring do stream."""
+        count = int(self.counts[stream])
+        pos = count % self.capacity
+        mirror = pos + self.capacity
+        self.open_time[stream, pos] = open_time
+        self.open_time[stream, mirror] = open_time
+        values = self.values[stream]
+        for i, value in enumerate((open_, high, low, close, volume)):
+            values[i, pos] = value
+            values[i, mirror] = value
+        # Publicação: o contador só avança depois da vela escrita
+        self.counts[stream] = count + 1
+    
+    def extend_from_frame(self, stream: int, df: pd.DataFrame):
+        """Publica as velas de um DataFrame [timestamp, open, high, low, close, volume]."""
+        if df.empty:
+            return
+        df = df.iloc[-self.capacity:]
+        open_times = _timestamps_to_epoch_ms(df['timestamp'])
+        for t, row in zip(open_times, df[list(OHLCV_COLUMNS)].to_numpy(dtype=np.float64)):
+            self.append(stream, int(t), *row)
+    
+    # ========== LEITURA (workers) ==========
+    
+    def count(self, stream: int) -> int:
+        """Velas publicadas no stream desde a criação."""
+        return int(self.counts[stream])
+    
+    def last_open_time(self, stream: int) -> Optional[int]:
+        count = int(self.counts[stream])
+        if count == 0:
+            return None
+        return int(self.open_time[stream, (count - 1) % self.capacity])
+    
+    def candle(self, stream: int, seq: int) -> Optional[Dict]:
+        """
+        Vela de número `seq` (0 = primeira publicada) como dict para o
+        StreamingFeatureEngine, ou None se já foi sobrescrita.
+        """
+        pos = seq % self.capacity
+        values = self.values[stream]
+        candle = {
+            'timestamp': pd.Timestamp(int(self.open_time[stream, pos]), unit='ms'),
+            'open': float(values[0, pos]),
+            'high': float(values[1, pos]),
+            'low': float(values[2, pos]),
+            'close': float(values[3, pos]),
+            'volume': float(values[4, pos]),
+        }
+        if int(self.counts[stream]) - seq >= self.capacity:
+            return None
+        return candle
+    
+    def find_close(self, stream: int, open_time: int) -> Optional[float]:
+        """Fechamento da vela com o open_time informado, se ainda estiver no ring."""
+        count = int(self.counts[stream])
+        for seq in range(count - 1, max(count - self.capacity, 0) - 1, -1):
+            pos = seq % self.capacity
+            current = int(self.open_time[stream, pos])
+            if current == open_time:
+                return float(self.values[stream, 3, pos])
+            if current < open_time:
+                break
+        return None
+    
+    def view(self, stream: int, limit: Optional[int] = None) -> 'SharedRingView':
+        """Visão de um stream com a interface views() do CandleRingBuffer."""
+        return SharedRingView(self, stream, limit)
+    
+    def close(self):
+        """Libera o mapeamento (e remove o bloco, no processo dono)."""
+        self.counts = self.open_time = self.values = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedRingView:
+    """Últimas velas de um stream como views NumPy sem cópia (ex: warm_up_from_buffer)."""
+    
+    def __init__(self, rings: SharedCandleRings, stream: int, limit: Optional[int] = None):
+        self.rings = rings
+        self.stream = stream
+        self.limit = limit
+    
+    def __len__(self) -> int:
+        return min(self.rings.count(self.stream), self.rings.capacity)
+    
+    def views(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Args:
+            n: Quantidade de velas (padrão: limit, ou todas)
+        
+        Returns:
+            Dict {'open_time', 'open', 'high', 'low', 'close', 'volume'} -> np.ndarray
+        """
+        rings, stream = self.rings, self.stream
+        count = rings.count(stream)
+        n = n or self.limit or rings.capacity
+        n = min(n, count, rings.capacity)
+        end = count % rings.capacity + rings.capacity
+        start = end - n
+        
+        result = {'open_time': rings.open_time[stream, start:end]}
+        for i, col in enumerate(OHLCV_COLUMNS):
+            result[col] = rings.values[stream, i, start:end]
+        return result
+
+
+class SharedSignalQueue:
+    """
+    Fila circular de registros de sinal (SIGNAL_RECORD_DTYPE) em shared
+    memory, com um produtor (worker de score) e um consumidor (processo
+    de persistência). Cada lado só escreve o próprio índice, sem lock.
+    """
+    
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, owner: bool):
+        self.shm = shm
+        self.capacity = capacity
+        self.owner = owner
+        # [0] = próximo a ler (consumidor), [1] = próximo a escrever (produtor)
+        self.indices = np.ndarray((2,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self.records = np.ndarray((capacity,), dtype=SIGNAL_RECORD_DTYPE, buffer=shm.buf, offset=16)
+    
+    @classmethod
+    def create(cls, capacity: int) -> 'SharedSignalQueue':
+        shm = shared_memory.SharedMemory(create=True, size=16 + capacity * SIGNAL_RECORD_DTYPE.itemsize)
+        queue = cls(shm, capacity, owner=True)
+        queue.indices[:] = 0
+        return queue
+    
+    @classmethod
+    def attach(cls, name: str, capacity: int) -> 'SharedSignalQueue':
+        return cls(_attach(name), capacity, owner=False)
+    
+    @property
+    def spec(self) -> Dict:
+        return {'name': self.shm.name, 'capacity': self.capacity}
+    
+    def __len__(self) -> int:
+        return int(self.indices[1] - self.indices[0])
+    
+    def put(self, stream: int, open_time: int, call: bool, confidence: float, close: float, features) -> bool:
+        """Publica um sinal; False se a fila estiver cheia."""
+        head, tail = int(self.indices[0]), int(self.indices[1])
+        if tail - head >= self.capacity:
+            return False
+        record = self.records[tail % self.capacity]
+        record['stream'] = stream
+        record['open_time'] = open_time
+        record['call'] = 1 if call else 0
+        record['confidence'] = confidence
+        record['close'] = close
+        record['features'] = features
+        self.indices[1] = tail + 1
+        return True
+    
+    def get_all(self) -> np.ndarray:
+        """Retira todos os registros publicados (cópia)."""
+        head, tail = int(self.indices[0]), int(self.indices[1])
+        if tail == head:
+            return self.records[:0].copy()
+        positions = np.arange(head, tail) % self.capacity
+        records = self.records[positions]
+        self.indices[0] = tail
+        return records
+    
+    def close(self):
+        self.indices = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
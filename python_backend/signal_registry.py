@@ -0,0 +1,197 @@
+"""
+Registro de sinais pendentes resolvidos pelas velas fechadas do WebSocket
+"""
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import interval_to_ms, now_ms
+
+
+class PendingSignal:
+    """Sinal aguardando o fechamento da vela alvo."""
+    
+    __slots__ = ('signal_id', 'symbol', 'interval', 'target_open_time', 'prediction', 'open_price')
+    
+    def __init__(
+        self,
+        signal_id: str,
+        symbol: str,
+        interval: str,
+        target_open_time: int,
+        prediction: str,
+        open_price: float
+    ):
+        self.signal_id = signal_id
+        self.symbol = symbol
+        self.interval = interval
+        self.target_open_time = target_open_time
+        self.prediction = prediction
+        self.open_price = open_price
+    
+    def to_tuple(self) -> Tuple:
+        """Campos em ordem (serializável; PendingSignal(*campos) recria o sinal)."""
+        return tuple(getattr(self, name) for name in self.__slots__)
+    
+    def outcome(self, close_price: float) -> str:
+        """WIN/LOSS de acordo com o fechamento da vela alvo."""
+        if self.prediction == 'CALL':
+            return 'WIN' if close_price > self.open_price else 'LOSS'
+        return 'WIN' if close_price < self.open_price else 'LOSS'
+
+
+class PendingSignalRegistry:
+    """
+    Sinais pendentes indexados por (símbolo, timeframe, open_time da vela alvo).
+    
+    Quando a vela alvo fecha no WebSocket o sinal é resolvido com o
+    fechamento exato dessa vela, sem timer nem chamada REST. Os resultados
+    são entregues ao `on_result` (ex: SignalWriter.enqueue_update), que
+    agrupa as atualizações em lotes. Sinais cuja vela nunca chegou
+    (desconexão, lacuna no stream) são resolvidos por `resolve_gaps`
+    com uma única consulta REST por stream.
+    """
+    
+    def __init__(self, on_result: Callable[[str, Dict], None]):
+        """
+        Args:
+            on_result: Chamado com (signal_id, {'close_price', 'result'}) para cada sinal resolvido
+        """
+        self.on_result = on_result
+        self._pending: Dict[Tuple[str, str, int], List[PendingSignal]] = defaultdict(list)
+        self.resolved_from_stream = 0
+        self.resolved_from_rest = 0
+    
+    def __len__(self) -> int:
+        return sum(len(signals) for signals in self._pending.values())
+    
+    def add(self, signal: PendingSignal):
+        """Registra um sinal pendente."""
+        key = (signal.symbol, signal.interval, signal.target_open_time)
+        self._pending[key].append(signal)
+    
+    def signals(self) -> List[PendingSignal]:
+        """Todos os sinais ainda pendentes (ex: snapshot do engine)."""
+        return [signal for signals in self._pending.values() for signal in signals]
+    
+    def resolve(self, symbol: str, interval: str, open_time: int, close_price: float) -> List[Tuple[str, str]]:
+        """
+        Resolve os sinais cuja vela alvo acabou de fechar.
+        
+        Returns:
+            Lista de (signal_id, resultado)
+        """
+        signals = self._pending.pop((symbol, interval, int(open_time)), None)
+        if not signals:
+            return []
+        
+        results = self._emit(signals, close_price)
+        self.resolved_from_stream += len(results)
+        return results
+    
+    def overdue(self, now: Optional[int] = None, grace_ms: int = 0) -> Dict[Tuple[str, str], List[PendingSignal]]:
+        """
+        Sinais cuja vela alvo já deveria ter fechado há mais de `grace_ms`.
+        
+        Returns:
+            Dict {(símbolo, timeframe): [sinais]}
+        """
+        now = now_ms() if now is None else now
+        grouped: Dict[Tuple[str, str], List[PendingSignal]] = defaultdict(list)
+        for (symbol, interval, target), signals in self._pending.items():
+            if target + interval_to_ms(interval) + grace_ms <= now:
+                grouped[(symbol, interval)].extend(signals)
+        return grouped
+    
+    def gap_ranges(self, now: Optional[int] = None, grace_ms: int = 0) -> Dict[Tuple[str, str], Tuple[int, int]]:
+        """
+        Intervalo exato de velas alvo que faltou em cada stream.
+        
+        Returns:
+            Dict {(símbolo, timeframe): (start_ms, end_ms)}
+        """
+        ranges = {}
+        for (symbol, interval), signals in self.overdue(now, grace_ms).items():
+            targets = [s.target_open_time for s in signals]
+            ranges[(symbol, interval)] = (min(targets), max(targets) + interval_to_ms(interval))
+        return ranges
+    
+    def resolve_from_candles(self, symbol: str, interval: str, df: pd.DataFrame) -> List[Tuple[str, str]]:
+        """
+        Resolve os sinais pendentes cujas velas alvo estão no DataFrame
+        (velas obtidas via REST para uma lacuna).
+        
+        Returns:
+            Lista de (signal_id, resultado)
+        """
+        if df.empty:
+            return []
+        
+        open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        closes = df['close'].to_numpy(dtype=np.float64)
+        
+        results = []
+        for open_time, close_price in zip(open_times.tolist(), closes.tolist()):
+            signals = self._pending.pop((symbol, interval, open_time), None)
+            if signals:
+                results.extend(self._emit(signals, close_price))
+        
+        self.resolved_from_rest += len(results)
+        return results
+    
+    def resolve_gaps(
+        self,
+        fetch_range: Callable[[str, str, int, int], pd.DataFrame],
+        now: Optional[int] = None,
+        grace_ms: int = 0
+    ) -> List[Tuple[str, str]]:
+        """
+        Resolve sinais atrasados buscando via REST apenas o intervalo de
+        velas alvo que faltou (uma chamada por stream).
+        
+        Args:
+            fetch_range: Função (símbolo, timeframe, start_ms, end_ms) -> DataFrame de velas
+            now: Horário de referência em epoch-ms (padrão: agora)
+            grace_ms: Tolerância após o fechamento esperado da vela alvo
+        
+        Returns:
+            Lista de (signal_id, resultado)
+        """
+        results = []
+        for (symbol, interval), (start_ms, end_ms) in self.gap_ranges(now, grace_ms).items():
+            try:
+                df = fetch_range(symbol, interval, start_ms, end_ms)
+            except Exception as e:
+                print(f"⚠ Erro ao buscar velas de {symbol} {interval} para sinais pendentes: {e}")
+                continue
+            results.extend(self.resolve_from_candles(symbol, interval, df))
+        return results
+    
+    def _emit(self, signals: List[PendingSignal], close_price: float) -> List[Tuple[str, str]]:
+        results = []
+        for signal in signals:
+            result = signal.outcome(close_price)
+            self.on_result(signal.signal_id, {'close_price': close_price, 'result': result})
+            results.append((signal.signal_id, result))
+        return results
+
+
+# Função de teste
+if __name__ == "__main__":
+    updates = []
+    registry = PendingSignalRegistry(lambda signal_id, fields: updates.append((signal_id, fields)))
+    
+    registry.add(PendingSignal('a', 'BTCUSDT', '1m', 60_000, 'CALL', 100.0))
+    registry.add(PendingSignal('b', 'BTCUSDT', '1m', 60_000, 'PUT', 100.0))
+    registry.add(PendingSignal('c', 'BTCUSDT', '1m', 120_000, 'CALL', 100.0))
+    
+    print(registry.resolve('BTCUSDT', '1m', 60_000, 101.0))
+    
+    # Vela alvo de 'c' não chegou pelo stream: busca REST do intervalo exato
+    fake_rest = lambda symbol, interval, start, end: pd.DataFrame({
+        'timestamp': pd.to_datetime([start], unit='ms'), 'close': [99.0]
+    })
+    print(registry.resolve_gaps(fake_rest, now=300_000))
+    print(f"Pendentes: {len(registry)} | Atualizações: {updates}")
@@ -0,0 +1,416 @@
+"""
+Persistência de sinais em segundo plano (fila limitada + lotes + journal local)
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import (
+    SIGNAL_QUEUE_MAXSIZE,
+    SIGNAL_BATCH_SIZE,
+    SIGNAL_BATCH_MAX_WAIT,
+    SIGNAL_MAX_RETRIES,
+    SIGNAL_JOURNAL_PATH,
+    SIGNAL_REPLAY_INTERVAL,
+)
+
+
+# ========== ARMAZENAMENTO ==========
+
+class SignalStore:
+    """
+    Interface mínima de armazenamento de sinais usada pelo SignalWriter.
+    Cada chamada recebe um lote inteiro (uma requisição por lote).
+    """
+    
+    def insert_many(self, rows: List[Dict]):
+        """Insere vários sinais (cada row já contém 'id')."""
+        raise NotImplementedError
+    
+    def update_many(self, updates: List[Tuple[str, Dict]]):
+        """Atualiza vários sinais: lista de (id, campos)."""
+        raise NotImplementedError
+
+
+class SupabaseSignalStore(SignalStore):
+    """Tabela `signals` do Supabase."""
+    
+    def __init__(self, client, table: str = 'signals'):
+        self.client = client
+        self.table = table
+        # Linhas completas dos sinais ainda pendentes (permitem atualizar em lote via upsert)
+        self._rows: Dict[str, Dict] = {}
+    
+    @classmethod
+    def from_config(cls, table: str = 'signals') -> 'SupabaseSignalStore':
+        """Store com o cliente criado a partir de SUPABASE_URL/SUPABASE_KEY (importa o supabase só aqui)."""
+        from supabase import create_client
+        from config import SUPABASE_URL, SUPABASE_KEY
+        return cls(create_client(SUPABASE_URL, SUPABASE_KEY), table)
+    
+    def insert_many(self, rows: List[Dict]):
+        self.client.table(self.table).insert(rows).execute()
+        for row in rows:
+            if row.get('result') == 'PENDING':
+                self._rows[row['id']] = row
+    
+    def update_many(self, updates: List[Tuple[str, Dict]]):
+        # Upsert exige a linha completa (colunas NOT NULL); sinais desconhecidos
+        # (ex: inseridos antes de um restart) são atualizados individualmente
+        full_rows = []
+        for signal_id, fields in updates:
+            if signal_id in self._rows:
+                full_rows.append(dict(self._rows[signal_id], **fields))
+            else:
+                self.client.table(self.table).update(fields).eq('id', signal_id).execute()
+        
+        if full_rows:
+            self.client.table(self.table).upsert(full_rows).execute()
+            for row in full_rows:
+                if row.get('result') != 'PENDING':
+                    self._rows.pop(row['id'], None)
+
+
+class InMemorySignalStore(SignalStore):
+    """Armazenamento em memória (testes e execução offline)."""
+    
+    def __init__(self):
+        self.rows: Dict[str, Dict] = {}
+        self.requests = 0
+    
+    def insert_many(self, rows: List[Dict]):
+        self.requests += 1
+        for row in rows:
+            self.rows[row['id']] = dict(row)
+    
+    def update_many(self, updates: List[Tuple[str, Dict]]):
+        self.requests += 1
+        for signal_id, fields in updates:
+            self.rows.setdefault(signal_id, {'id': signal_id}).update(fields)
+
+
+class SQLiteSignalStore(SignalStore):
+    """Armazenamento SQLite local com o mesmo formato da tabela `signals`."""
+    
+    COLUMNS = (
+        'id', 'timestamp', 'symbol', 'timeframe', 'prediction', 'confidence_score',
+        'open_price', 'close_price', 'result', 'features'
+    )
+    
+    def __init__(self, path: str = ':memory:'):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS signals ("
+                "id TEXT PRIMARY KEY, timestamp TEXT, symbol TEXT, timeframe TEXT, "
+                "prediction TEXT, confidence_score REAL, open_price REAL, "
+                "close_price REAL, result TEXT, features TEXT)"
+            )
+            self._conn.commit()
+    
+    def insert_many(self, rows: List[Dict]):
+        values = [
+            tuple(json.dumps(row.get(c)) if c == 'features' else row.get(c) for c in self.COLUMNS)
+            for row in rows
+        ]
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO signals ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                values
+            )
+            self._conn.commit()
+    
+    def update_many(self, updates: List[Tuple[str, Dict]]):
+        with self._lock:
+            for signal_id, fields in updates:
+                assignments = ', '.join(f"{k} = ?" for k in fields)
+                self._conn.execute(
+                    f"UPDATE signals SET {assignments} WHERE id = ?",
+                    (*fields.values(), signal_id)
+                )
+            self._conn.commit()
+    
+    def fetch_all(self) -> List[Dict]:
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM signals")
+            return [dict(zip(self.COLUMNS, row)) for row in cursor.fetchall()]
+
+
+# ========== ESCRITOR EM SEGUNDO PLANO ==========
+
+class SignalWriter:
+    """
+    Escritor de sinais em thread própria.
+    
+    O caminho crítico (event loop) apenas enfileira operações. A thread
+    agrupa inserts e updates em lotes (até SIGNAL_BATCH_SIZE itens ou
+    SIGNAL_BATCH_MAX_WAIT segundos), envia com retry e backoff, e grava
+    os lotes que falharem em um journal local (JSONL), reenviado
+    periodicamente quando o backend volta a responder.
+    """
+    
+    def __init__(
+        self,
+        store: SignalStore,
+        journal_path: Optional[str] = SIGNAL_JOURNAL_PATH,
+        max_queue: int = SIGNAL_QUEUE_MAXSIZE,
+        batch_size: int = SIGNAL_BATCH_SIZE,
+        batch_max_wait: float = SIGNAL_BATCH_MAX_WAIT,
+        max_retries: int = SIGNAL_MAX_RETRIES,
+        replay_interval: float = SIGNAL_REPLAY_INTERVAL,
+        on_commit: Optional[Callable[[List[Dict]], None]] = None
+    ):
+        """
+        Args:
+            store: Destino dos sinais
+            journal_path: Arquivo de journal para lotes não entregues (None = desativado)
+            max_queue: Capacidade da fila (cheia = operação vai direto para o journal)
+            batch_size: Máximo de operações por lote
+            batch_max_wait: Tempo máximo aguardando para completar um lote (s)
+            max_retries: Tentativas extras por lote antes de gravar no journal
+            replay_interval: Intervalo entre tentativas de reenvio do journal (s)
+            on_commit: Chamado na thread de escrita com as linhas de cada insert confirmado
+        """
+        self.store = store
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.batch_max_wait = batch_max_wait
+        self.max_retries = max_retries
+        self.replay_interval = replay_interval
+        self.on_commit = on_commit
+        
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._journal_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_replay = 0.0
+        # Sinais cujo insert está no journal: seus updates também vão para o journal
+        # (enviados antes do insert, atualizariam uma linha que ainda não existe)
+        self._journaled_ids = self._read_journaled_ids()
+        
+        self.stats = {'inserted': 0, 'updated': 0, 'batches': 0, 'journaled': 0, 'replayed': 0}
+        
+        self._thread = threading.Thread(target=self._run, name='signal-writer', daemon=True)
+        self._thread.start()
+    
+    # ---------- Caminho crítico (não bloqueante) ----------
+    
+    def enqueue_insert(self, row: Dict):
+        """Enfileira a inserção de um sinal (row deve conter 'id')."""
+        self._put(('insert', row))
+    
+    def enqueue_update(self, signal_id: str, fields: Dict):
+        """Enfileira a atualização de um sinal (ex: resultado WIN/LOSS)."""
+        self._put(('update', (signal_id, fields)))
+    
+    def _put(self, op: Tuple):
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            # Backpressure: nunca bloquear o event loop, registrar no journal
+            self._journal([op])
+    
+    # ---------- Thread de escrita ----------
+    
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
+            self._maybe_replay()
+    
+    def _next_batch(self) -> List[Tuple]:
+        """Aguarda a primeira operação e completa o lote até o limite de tamanho/tempo."""
+        try:
+            batch = [self._queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.monotonic() + self.batch_max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    @staticmethod
+    def _split(batch: List[Tuple]) -> Tuple[List[Dict], List[Tuple[str, Dict]]]:
+        """Separa inserts e updates; updates de sinais inseridos no mesmo lote são mesclados."""
+        inserts: Dict[str, Dict] = {}
+        updates: List[Tuple[str, Dict]] = []
+        for kind, payload in batch:
+            if kind == 'insert':
+                inserts[payload['id']] = dict(payload)
+            else:
+                signal_id, fields = payload
+                if signal_id in inserts:
+                    inserts[signal_id].update(fields)
+                else:
+                    updates.append((signal_id, fields))
+        return list(inserts.values()), updates
+    
+    def _send(self, batch: List[Tuple]) -> bool:
+        """Envia um lote com retry/backoff; em caso de falha persistente, grava no journal."""
+        inserts, updates = self._split(batch)
+        
+        with self._journal_lock:
+            deferred = [u for u in updates if u[0] in self._journaled_ids]
+        if deferred:
+            # Entram no journal depois do insert e são reenviados na mesma ordem
+            updates = [u for u in updates if u[0] not in self._journaled_ids]
+            self._journal([('update', u) for u in deferred])
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                if inserts:
+                    self.store.insert_many(inserts)
+                    self.stats['inserted'] += len(inserts)
+                    committed, inserts = inserts, []
+                    if self._journaled_ids:
+                        with self._journal_lock:
+                            self._journaled_ids.difference_update(row['id'] for row in committed)
+                    if self.on_commit is not None:
+                        self.on_commit(committed)
+                if updates:
+                    self.store.update_many(updates)
+                    self.stats['updated'] += len(updates)
+                    updates = []
+                self.stats['batches'] += 1
+                return True
+            except Exception as e:
+                if attempt >= self.max_retries or self._stop.is_set():
+                    print(f"⚠ Falha ao persistir lote de sinais ({e}); gravando no journal")
+                    break
+                time.sleep(min(0.5 * 2 ** attempt, 10))
+        
+        pending = [('insert', row) for row in inserts] + [('update', u) for u in updates]
+        self._journal(pending)
+        return False
+    
+    # ---------- Journal local ----------
+    
+    def _journal(self, ops: List[Tuple]):
+        if not ops:
+            return
+        if self.journal_path is None:
+            print(f"⚠ {len(ops)} operações de sinais descartadas (journal desativado)")
+            return
+        
+        with self._journal_lock:
+            os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                for kind, payload in ops:
+                    f.write(json.dumps({'op': kind, 'payload': payload}, default=str) + '\n')
+                    if kind == 'insert':
+                        self._journaled_ids.add(payload['id'])
+            self.stats['journaled'] += len(ops)
+    
+    def _read_journaled_ids(self) -> set:
+        """Ids dos inserts pendentes no journal deixado por uma execução anterior."""
+        ids = set()
+        if self.journal_path is None or not os.path.exists(self.journal_path):
+            return ids
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry['op'] == 'insert':
+                        ids.add(entry['payload']['id'])
+        return ids
+    
+    def _maybe_replay(self):
+        """Reenvia o journal periodicamente (apenas quando a fila está ociosa)."""
+        if self.journal_path is None or not self._queue.empty():
+            return
+        now = time.monotonic()
+        if now - self._last_replay < self.replay_interval:
+            return
+        self._last_replay = now
+        self.replay_journal()
+    
+    def replay_journal(self) -> int:
+        """
+        Reenvia as operações do journal em lotes. O journal é consumido por
+        inteiro; lotes que falharem novamente voltam para ele.
+        
+        Returns:
+            Número de operações entregues
+        """
+        if self.journal_path is None:
+            return 0
+        
+        with self._journal_lock:
+            if not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+                return 0
+            replay_path = self.journal_path + '.replay'
+            os.replace(self.journal_path, replay_path)
+        
+        with open(replay_path, encoding='utf-8') as f:
+            ops = []
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    payload = entry['payload']
+                    ops.append((entry['op'], payload if entry['op'] == 'insert' else tuple(payload)))
+        os.remove(replay_path)
+        
+        delivered = 0
+        for i in range(0, len(ops), self.batch_size):
+            batch = ops[i:i + self.batch_size]
+            if self._send(batch):
+                delivered += len(batch)
+            else:
+                # Backend ainda indisponível: o restante volta para o journal
+                self._journal(ops[i + self.batch_size:])
+                break
+        
+        self.stats['replayed'] += delivered
+        if delivered:
+            print(f"✓ {delivered} operações de sinais reenviadas do journal")
+        return delivered
+    
+    # ---------- Controle ----------
+    
+    def pending(self) -> int:
+        """Operações ainda na fila."""
+        return self._queue.qsize()
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Aguarda a fila esvaziar (útil em testes e no desligamento)."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Aguardar o lote em andamento
+        time.sleep(self.batch_max_wait + 0.05)
+        return self._queue.empty()
+    
+    def close(self, timeout: float = 10.0):
+        """Entrega o que estiver na fila e encerra a thread."""
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+
+# Função de teste
+if __name__ == "__main__":
+    import uuid
+    
+    store = InMemorySignalStore()
+    writer = SignalWriter(store, journal_path=None)
+    
+    ids = [str(uuid.uuid4()) for _ in range(250)]
+    for signal_id in ids:
+        writer.enqueue_insert({'id': signal_id, 'prediction': 'CALL', 'result': 'PENDING'})
+    for signal_id in ids[:100]:
+        writer.enqueue_update(signal_id, {'result': 'WIN', 'close_price': 1.0})
+    
+    writer.close()
+    print(f"Sinais: {len(store.rows)} | Requisições: {store.requests} | Stats: {writer.stats}")
@@ -0,0 +1,140 @@
+"""
+Cliente resiliente do endpoint combinado de klines: reconexão com backoff
+exponencial com jitter e detecção das velas perdidas durante a queda
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import websockets
+
+from candle_buffer import OHLCV_COLUMNS, now_ms
+from config import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY
+
+
+# Binance aceita no máximo ~5 mensagens/s por conexão; os SUBSCRIBE são agrupados
+SUBSCRIBE_BATCH_SIZE = 200
+
+# Falhas de conexão que levam a uma nova tentativa (erros do próprio engine propagam)
+CONNECTION_ERRORS = (websockets.WebSocketException, OSError, asyncio.TimeoutError)
+
+
+def reconnect_delay(attempt: int, base: float = RECONNECT_BASE_DELAY, cap: float = RECONNECT_MAX_DELAY) -> float:
+    """
+    Espera antes de uma nova tentativa de conexão: dobra a cada falha até o
+    teto, com metade do valor sorteada (conexões derrubadas juntas não voltam
+    todas no mesmo instante).
+    
+    Args:
+        attempt: Falhas consecutivas anteriores (0 = primeira reconexão)
+        base: Espera da primeira reconexão (segundos)
+        cap: Espera máxima (segundos)
+    
+    Returns:
+        Segundos de espera, entre delay/2 e delay
+    """
+    delay = min(cap, base * (2 ** min(attempt, 32)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def missing_range(last_open_time: Optional[int], interval_ms: int, now: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    Velas fechadas posteriores à última vela do buffer.
+    
+    Args:
+        last_open_time: open_time da última vela conhecida (epoch-ms)
+        interval_ms: Duração da vela
+        now: Horário de referência (padrão: agora)
+    
+    Returns:
+        (start_ms, end_ms exclusivo) dos open_times que faltam, ou None se não há lacuna
+    """
+    if last_open_time is None:
+        return None
+    # open_time da vela ainda em formação (chega fechada pelo WebSocket)
+    forming = ((now_ms() if now is None else now) // interval_ms) * interval_ms
+    start = last_open_time + interval_ms
+    if start >= forming:
+        return None
+    return start, forming
+
+
+def iter_candles(df: pd.DataFrame, start_ms: int, end_ms: int) -> Iterator[Tuple[int, float, float, float, float, float]]:
+    """
+    Velas de um DataFrame do coletor dentro de [start_ms, end_ms), em ordem.
+    
+    Yields:
+        (open_time, open, high, low, close, volume)
+    """
+    if df.empty:
+        return
+    open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+    keep = (open_times >= start_ms) & (open_times < end_ms)
+    values = df[list(OHLCV_COLUMNS)].to_numpy(dtype=np.float64)[keep]
+    for t, row in zip(open_times[keep], values):
+        yield (int(t), *map(float, row))
+
+
+async def subscribe(websocket, names: List[str]):
+    """Inscreve a conexão nos streams informados (SUBSCRIBE em lotes)."""
+    for i in range(0, len(names), SUBSCRIBE_BATCH_SIZE):
+        await websocket.send(json.dumps({
+            'method': 'SUBSCRIBE',
+            'params': names[i:i + SUBSCRIBE_BATCH_SIZE],
+            'id': i // SUBSCRIBE_BATCH_SIZE + 1
+        }))
+
+
+async def run_kline_connection(
+    ws_url: str,
+    names: List[str],
+    on_message: Callable[[str], Awaitable],
+    on_connected: Optional[Callable[[], Awaitable]] = None
+):
+    """
+    Mantém uma conexão do endpoint combinado inscrita nos streams informados,
+    reconectando com backoff sempre que ela cair (até ser cancelada).
+    
+    Args:
+        ws_url: Endpoint base de streams combinados
+        names: Streams da conexão
+        on_message: Corrotina chamada com cada mensagem recebida
+        on_connected: Corrotina chamada a cada conexão, depois do SUBSCRIBE e antes
+                      de consumir as mensagens (ex: backfill das velas perdidas;
+                      o que chega nesse meio tempo fica na fila do socket)
+    """
+    url = f"{ws_url.rstrip('/')}/stream"
+    attempt = 0
+    disconnected: Optional[float] = None
+    
+    while True:
+        try:
+            async with websockets.connect(url, max_queue=None) as websocket:
+                await subscribe(websocket, names)
+                if on_connected is not None:
+                    await on_connected()
+                
+                if disconnected is None:
+                    print(f"✓ Conectado a {url} ({len(names)} streams). Aguardando velas...\n")
+                else:
+                    print(f"✓ Reconectado a {url} ({len(names)} streams) "
+                          f"após {time.perf_counter() - disconnected:.2f}s")
+                attempt = 0
+                disconnected = None
+                
+                async for message in websocket:
+                    await on_message(message)
+            reason = "conexão encerrada pelo servidor"
+        except CONNECTION_ERRORS as e:
+            reason = f"{type(e).__name__}: {e}"
+        
+        if disconnected is None:
+            disconnected = time.perf_counter()
+        delay = reconnect_delay(attempt)
+        attempt += 1
+        print(f"⚠ WebSocket {url} desconectado ({reason}); nova tentativa em {delay:.2f}s")
+        await asyncio.sleep(delay)
@@ -0,0 +1,485 @@
+"""
+Gravação e replay de streams de klines (testes de vazão e latência do
+RealtimeEngine sem rede)
+"""
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import websockets
+
+from candle_buffer import interval_to_ms, now_ms
+from realtime_engine import RealtimeEngine, stream_name
+from stream_client import subscribe
+from stream_standin import LocalKlineServer, kline_message
+from synthetic_data import SyntheticCollector, generate_ohlcv
+from config import BINANCE_WS_URL, LOOKBACK_PERIODS, STREAMS
+
+
+# (epoch-ms de recebimento, mensagem bruta do WebSocket)
+Recorded = Tuple[int, str]
+
+# Etapas medidas contra o horário do evento na Binance: em replay refletem a
+# idade das velas, não a rede, e ficam fora do resumo
+WALL_CLOCK_STAGES = ('ws_receive_lag', 'close_to_commit')
+
+
+class StreamRecorder:
+    """
+    Grava as mensagens brutas do WebSocket em um arquivo gzip, uma por linha
+    ("<recebimento em epoch-ms>\\t<mensagem>"), sem decodificar o JSON.
+    
+    Abrir um arquivo existente acrescenta um novo membro gzip (a leitura
+    continua contínua). Nível de compressão 1 por padrão: o custo por
+    mensagem fica desprezível no event loop e o JSON ainda comprime ~8x.
+    """
+    
+    def __init__(self, path: str, compresslevel: int = 1):
+        """
+        Args:
+            path: Arquivo de saída (.jsonl.gz)
+            compresslevel: Nível do gzip (1-9)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.messages = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8', compresslevel=compresslevel)
+    
+    def write(self, message, received_ms: Optional[int] = None):
+        """Grava uma mensagem (str ou bytes) com o horário de recebimento."""
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        self._file.write(f"{now_ms() if received_ms is None else received_ms}\t{message}\n")
+        self.messages += 1
+    
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_recording(path: str) -> Iterator[Recorded]:
+    """Lê uma gravação do StreamRecorder como (recebimento ms, mensagem)."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            received, _, message = line.rstrip('\n').partition('\t')
+            if message:
+                yield int(received), message
+
+
+def synthetic_recording(
+    streams: List[Tuple[str, str]],
+    n_candles: int,
+    history: int = LOOKBACK_PERIODS,
+    seed: int = 42,
+    end_ms: Optional[int] = None
+) -> Tuple[Dict[str, pd.DataFrame], List[Recorded]]:
+    """
+    Gera velas fechadas sintéticas para N streams, intercaladas por horário
+    de fechamento (todos os streams fecham juntos, como no mercado real).
+    
+    Args:
+        streams: Lista de (símbolo, timeframe)
+        n_candles: Velas emitidas por stream
+        history: Velas anteriores de cada stream (para aquecer os buffers)
+        seed: Semente (stream i usa seed + i)
+        end_ms: Fechamento da última vela (padrão: última vela fechada)
+    
+    Returns:
+        (histórico {stream: DataFrame}, mensagens [(fechamento ms, mensagem)])
+    """
+    histories: Dict[str, pd.DataFrame] = {}
+    events: List[Tuple[int, int, str]] = []
+    
+    for i, (symbol, interval) in enumerate(streams):
+        name = stream_name(symbol, interval)
+        interval_ms = interval_to_ms(interval)
+        last_close = ((end_ms or now_ms()) // interval_ms) * interval_ms
+        first_open = last_close - (history + n_candles) * interval_ms
+        
+        candles = generate_ohlcv(history + n_candles, seed=seed + i, interval=interval, start_ms=first_open)
+        histories[name] = candles.iloc[:history].reset_index(drop=True)
+        
+        replayed = candles.iloc[history:]
+        open_times = replayed['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64)
+        for t, o, h, l, c, v in zip(
+            open_times, replayed['open'], replayed['high'], replayed['low'], replayed['close'], replayed['volume']
+        ):
+            close_ms = int(t) + interval_ms
+            events.append((close_ms, i, kline_message(name, int(t), interval_ms, o, h, l, c, v, event_time=close_ms)))
+    
+    events.sort(key=lambda event: event[:2])
+    return histories, [(close_ms, message) for close_ms, _, message in events]
+
+
+def scan_recording(messages: List[Recorded]) -> Dict[str, Tuple[str, str, int]]:
+    """
+    Streams presentes em uma gravação.
+    
+    Returns:
+        Dict {stream: (símbolo, timeframe, open_time da primeira vela)}
+    """
+    found: Dict[str, Tuple[str, str, int]] = {}
+    for _, message in messages:
+        data = json.loads(message)
+        event = data.get('data', data)
+        kline = event.get('k') if isinstance(event, dict) else None
+        if not kline:
+            continue
+        name = stream_name(kline['s'], kline['i'])
+        if name not in found:
+            found[name] = (kline['s'], kline['i'], int(kline['t']))
+    return found
+
+
+def prime_engine(
+    engine: RealtimeEngine,
+    first_open_times: Dict[str, int],
+    histories: Optional[Dict[str, pd.DataFrame]] = None
+):
+    """
+    Carrega nos buffers do engine as velas anteriores à primeira vela do replay
+    (do histórico informado ou do coletor do engine).
+    """
+    for name, state in engine.streams.items():
+        if histories is not None and name in histories:
+            df = histories[name]
+        elif name in first_open_times:
+            end_ms = first_open_times[name]
+            df = engine.collector.get_candles_range(
+                symbol=state.symbol, interval=state.interval,
+                start_ms=end_ms - LOOKBACK_PERIODS * state.interval_ms, end_ms=end_ms
+            )
+        else:
+            continue
+        state.load_history(df)
+
+
+def _percentiles_ms(values: np.ndarray) -> Dict:
+    if len(values) == 0:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1e3
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99), 'max': float(values.max() * 1e3)}
+
+
+def _processed_candles(engine: RealtimeEngine) -> int:
+    return sum(state.feature_engine.count for state in engine.streams.values())
+
+
+class StreamReplayer:
+    """
+    Alimenta RealtimeEngine._process_message diretamente (sem socket) com
+    mensagens gravadas ou sintéticas. A latência por mensagem é a de ingestão
+    (até a vela entrar no PredictionExecutor; com PREDICTION_WORKERS=0, até a decisão).
+    
+    speed=0 envia o mais rápido possível (vazão máxima); speed=N respeita o
+    espaçamento original dividido por N e mede também o atraso de cada
+    mensagem em relação ao horário previsto (fila formada em rajadas).
+    """
+    
+    def __init__(self, messages: List[Recorded], speed: float = 0.0):
+        """
+        Args:
+            messages: Lista de (horário ms, mensagem)
+            speed: Fator de aceleração (0 = sem espera entre mensagens)
+        """
+        self.messages = messages
+        self.speed = speed
+    
+    async def run(self, engine: RealtimeEngine) -> Dict:
+        """
+        Reproduz as mensagens no engine.
+        
+        Returns:
+            Dict com vazão e percentis de latência por mensagem (ms)
+        """
+        n = len(self.messages)
+        latencies = np.empty(n)
+        schedule_lag = np.empty(n if self.speed > 0 else 0)
+        candles_before = _processed_candles(engine)
+        first_ts = self.messages[0][0] if n else 0
+        
+        started = time.perf_counter()
+        for i, (ts, message) in enumerate(self.messages):
+            if self.speed > 0:
+                scheduled = started + (ts - first_ts) / 1000 / self.speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                schedule_lag[i] = time.perf_counter() - scheduled
+            
+            t0 = time.perf_counter()
+            await engine._process_message(message)
+            latencies[i] = time.perf_counter() - t0
+        
+        # Vazão inclui as previsões ainda no pool
+        await engine.prediction_executor.join()
+        elapsed = time.perf_counter() - started
+        
+        candles = _processed_candles(engine) - candles_before
+        summary = {
+            'mode': 'direct',
+            'speed': self.speed,
+            'messages': n,
+            'candles': candles,
+            'elapsed_s': elapsed,
+            'messages_per_s': n / elapsed if elapsed else 0.0,
+            'candles_per_s': candles / elapsed if elapsed else 0.0,
+            'latency_ms': _percentiles_ms(latencies),
+        }
+        if self.speed > 0:
+            summary['schedule_lag_ms'] = _percentiles_ms(np.maximum(schedule_lag, 0.0))
+        return summary
+
+
+class ReplayServer(LocalKlineServer):
+    """
+    Stand-in do endpoint /stream da Binance que reenvia uma gravação aos
+    clientes inscritos (o engine conecta por ws_url, caminho completo do WebSocket).
+    """
+    
+    # Espera após o primeiro SUBSCRIBE para os demais lotes chegarem
+    SUBSCRIBE_SETTLE_SECONDS = 0.2
+    
+    def __init__(self, messages: List[Recorded], speed: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            messages: Lista de (horário ms, mensagem)
+            speed: Fator de aceleração (0 = o mais rápido possível)
+            host: Interface de escuta
+            port: Porta (0 = escolher uma livre)
+        """
+        super().__init__(host=host, port=port)
+        self.messages = messages
+        self.speed = speed
+        self.finished: Optional[asyncio.Event] = None
+        # Stream de cada mensagem (decodificado uma vez, fora da medição)
+        self._names = [json.loads(message).get('stream') for _, message in messages]
+    
+    async def start(self):
+        self.finished = asyncio.Event()
+        await super().start()
+    
+    async def _produce(self, websocket, subscribed: List[str]):
+        """Envia as mensagens dos streams inscritos, no ritmo configurado."""
+        while not subscribed:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(self.SUBSCRIBE_SETTLE_SECONDS)
+        wanted = set(subscribed)
+        
+        first_ts = self.messages[0][0] if self.messages else 0
+        started = time.perf_counter()
+        for name, (ts, message) in zip(self._names, self.messages):
+            if name not in wanted:
+                continue
+            if self.speed > 0:
+                delay = started + (ts - first_ts) / 1000 / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await websocket.send(message)
+            self.messages_sent += 1
+        self.finished.set()
+
+
+async def run_replay(
+    messages: List[Recorded],
+    histories: Optional[Dict[str, pd.DataFrame]] = None,
+    speed: float = 0.0,
+    use_websocket: bool = False,
+    offline: bool = False
+) -> Dict:
+    """
+    Monta um RealtimeEngine com os streams da gravação, aquece os buffers e
+    reproduz as mensagens (direto ou via servidor WebSocket local).
+    
+    Args:
+        messages: Lista de (horário ms, mensagem)
+        histories: Velas anteriores por stream (padrão: coletor do engine)
+        speed: Fator de aceleração (0 = o mais rápido possível)
+        use_websocket: Enviar pelo ReplayServer (inclui o custo do socket)
+        offline: Usar o SyntheticCollector para o histórico (sem REST)
+    
+    Returns:
+        Dict com vazão, latências e percentis por etapa do engine
+    """
+    from ml_model import MLPredictor
+    from feature_engineering import FeatureEngineer
+    from signal_writer import InMemorySignalStore
+    
+    found = scan_recording(messages)
+    first_open_times = {name: first_open for name, (_, _, first_open) in found.items()}
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        engine = RealtimeEngine(
+            streams=[(symbol, interval) for symbol, interval, _ in found.values()],
+            collector=SyntheticCollector() if offline or histories is not None else None,
+            signal_store=InMemorySignalStore(),
+            backfill=False  # As velas gravadas são a única fonte (sem REST na conexão)
+        )
+        if not engine.predictor.is_loaded:
+            # Sem modelo salvo: modelo pequeno treinado em dados sintéticos (não sobrescreve o salvo)
+            engine.predictor.train_model(
+                FeatureEngineer(generate_ohlcv(5000)).calculate_all_features(), save_model=False
+            )
+        prime_engine(engine, first_open_times, histories)
+    
+    try:
+        if not use_websocket:
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = await StreamReplayer(messages, speed).run(engine)
+        else:
+            server = ReplayServer(messages, speed)
+            await server.start()
+            engine.ws_url = server.url
+            candles_before = _processed_candles(engine)
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                started = time.perf_counter()
+                task = asyncio.create_task(engine._run_connection(list(engine.streams)))
+                await server.finished.wait()
+                
+                # Aguardar o engine esvaziar o que ainda está no socket e no pool
+                await engine.prediction_executor.join()
+                processed = _processed_candles(engine)
+                while True:
+                    await asyncio.sleep(0.1)
+                    current = _processed_candles(engine)
+                    if current == processed:
+                        break
+                    processed = current
+                elapsed = time.perf_counter() - started
+                task.cancel()
+            await server.stop()
+            
+            candles = processed - candles_before
+            summary = {
+                'mode': 'websocket',
+                'speed': speed,
+                'messages': server.messages_sent,
+                'candles': candles,
+                'elapsed_s': elapsed,
+                'messages_per_s': server.messages_sent / elapsed,
+                'candles_per_s': candles / elapsed,
+            }
+    finally:
+        engine.prediction_executor.close()
+        engine.signal_writer.close()
+    
+    summary['streams'] = len(engine.streams)
+    summary['executor'] = dict(engine.prediction_executor.stats)
+    summary['signals'] = engine.signal_writer.stats['inserted']
+    summary['stages'] = {
+        stage: values for stage, values in engine.metrics.snapshot().items() if stage not in WALL_CLOCK_STAGES
+    }
+    return summary
+
+
+async def record_stream(
+    path: str,
+    streams: List[Tuple[str, str]] = STREAMS,
+    duration: Optional[float] = None,
+    ws_url: str = BINANCE_WS_URL
+) -> int:
+    """
+    Grava as mensagens brutas de kline dos streams informados (sem engine).
+    
+    Args:
+        path: Arquivo de saída (.jsonl.gz)
+        streams: Lista de (símbolo, timeframe)
+        duration: Segundos de gravação (None = até interromper)
+        ws_url: Endpoint base de streams combinados
+    
+    Returns:
+        Número de mensagens gravadas
+    """
+    names = [stream_name(symbol, interval) for symbol, interval in streams]
+    deadline = None if duration is None else time.monotonic() + duration
+    
+    with StreamRecorder(path) as recorder:
+        async with websockets.connect(f"{ws_url.rstrip('/')}/stream", max_queue=None) as websocket:
+            await subscribe(websocket, names)
+            print(f"✓ Gravando {len(names)} streams em {path}")
+            
+            while deadline is None or time.monotonic() < deadline:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                recorder.write(message)
+        
+        print(f"✓ {recorder.messages} mensagens gravadas")
+        return recorder.messages
+
+
+def print_summary(summary: Dict):
+    """Imprime o resultado de um replay."""
+    print(f"\nModo: {summary['mode']} | Velocidade: {summary['speed'] or 'máxima'}"
+          f"{'x' if summary['speed'] else ''} | Streams: {summary['streams']}")
+    print(f"Mensagens: {summary['messages']} | Velas processadas: {summary['candles']} "
+          f"em {summary['elapsed_s']:.2f}s ({summary['candles_per_s']:.0f} velas/s) | Sinais: {summary['signals']}")
+    executor = summary['executor']
+    print(f"Jobs de previsão: {executor['jobs']} | Velas coalescidas: {executor['coalesced']} | "
+          f"Esperas por backpressure: {executor['backpressure_waits']}")
+    for key, label in (('latency_ms', 'Latência por mensagem'), ('schedule_lag_ms', 'Atraso sobre o horário previsto')):
+        if summary.get(key):
+            p = summary[key]
+            print(f"{label}: p50 {p['p50']:.3f} ms | p95 {p['p95']:.3f} ms | "
+                  f"p99 {p['p99']:.3f} ms | max {p['max']:.3f} ms")
+    for stage, p in summary['stages'].items():
+        print(f"  {stage:<18} p50 {p['p50_ms']:8.3f} ms | p95 {p['p95_ms']:8.3f} ms | p99 {p['p99_ms']:8.3f} ms")
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Gravação e replay de streams de klines")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    record_parser = subparsers.add_parser('record', help="Grava as mensagens do WebSocket da Binance")
+    record_parser.add_argument('--out', default='data/recordings/stream.jsonl.gz')
+    record_parser.add_argument('--duration', type=float, help="Segundos de gravação (padrão: até Ctrl+C)")
+    record_parser.add_argument('--streams', help="Lista símbolo:timeframe separada por vírgula (padrão: STREAMS)")
+    
+    replay_parser = subparsers.add_parser('replay', help="Reproduz uma gravação ou velas sintéticas no engine")
+    source = replay_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--file', help="Gravação do comando record")
+    source.add_argument('--synthetic', type=int, metavar='N_STREAMS', help="N streams sintéticos")
+    replay_parser.add_argument('--candles', type=int, default=200, help="Velas por stream sintético")
+    replay_parser.add_argument('--speed', type=float, default=0.0, help="Aceleração Nx (0 = o mais rápido possível)")
+    replay_parser.add_argument('--websocket', action='store_true', help="Enviar por um servidor WebSocket local")
+    replay_parser.add_argument('--offline', action='store_true', help="Histórico sintético em vez do REST")
+    args = parser.parse_args()
+    
+    if args.command == 'record':
+        streams = STREAMS
+        if args.streams:
+            streams = [tuple(item.split(':')) for item in args.streams.split(',')]
+        try:
+            asyncio.run(record_stream(args.out, streams, args.duration))
+        except KeyboardInterrupt:
+            print("\n✓ Gravação interrompida")
+    else:
+        histories = None
+        if args.synthetic:
+            streams = [(f"SYM{i:04d}USDT", '1m') for i in range(args.synthetic)]
+            histories, messages = synthetic_recording(streams, args.candles)
+        else:
+            messages = list(read_recording(args.file))
+        print(f"✓ {len(messages)} mensagens carregadas")
+        print_summary(asyncio.run(run_replay(messages, histories, args.speed, args.websocket, args.offline)))
@@ -0,0 +1,233 @@
+"""
+Servidor WebSocket local que imita o endpoint de streams combinados da Binance
+(para testes de carga do RealtimeEngine sem rede)
+"""
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+from candle_buffer import interval_to_ms, now_ms
+
+
+def kline_message(
+    name: str,
+    open_time: int,
+    interval_ms: int,
+    open_price: float,
+    high: float,
+    low: float,
+    close: float,
+    volume: float,
+    event_time: Optional[int] = None,
+    closed: bool = True
+) -> str:
+    """
+    Mensagem de kline no formato combinado da Binance ({"stream": ..., "data": {...}}).
+    
+    Args:
+        name: Nome do stream (ex: btcusdt@kline_1m)
+        open_time: Abertura da vela em epoch-ms
+        interval_ms: Duração da vela em ms
+        open_price, high, low, close, volume: Valores da vela
+        event_time: Campo 'E' (padrão: agora)
+        closed: Campo 'x' (vela fechada)
+    """
+    symbol, interval = name.split('@kline_')
+    event = {
+        'e': 'kline',
+        'E': now_ms() if event_time is None else int(event_time),
+        's': symbol.upper(),
+        'k': {
+            't': int(open_time),
+            'T': int(open_time) + interval_ms - 1,
+            's': symbol.upper(),
+            'i': interval,
+            'o': f"{open_price:.2f}",
+            'c': f"{close:.2f}",
+            'h': f"{high:.2f}",
+            'l': f"{low:.2f}",
+            'v': f"{volume:.4f}",
+            'x': closed,
+        }
+    }
+    return json.dumps({'stream': name, 'data': event})
+
+
+class LocalKlineServer:
+    """
+    Stand-in do endpoint /stream da Binance.
+    
+    Aceita mensagens SUBSCRIBE e, a cada `tick_seconds`, envia uma vela
+    fechada sintética para cada stream inscrito no formato combinado
+    {"stream": ..., "data": {"e": "kline", ...}}. O tempo das velas avança
+    um intervalo por tick, então é possível simular horas de mercado em segundos.
+    """
+    
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        tick_seconds: float = 1.0,
+        seed: int = 42
+    ):
+        """
+        Args:
+            host: Interface de escuta
+            port: Porta (0 = escolher uma livre)
+            tick_seconds: Intervalo real entre velas emitidas por stream
+            seed: Semente dos preços sintéticos
+        """
+        self.host = host
+        self.port = port
+        self.tick_seconds = tick_seconds
+        self.seed = seed
+        self.messages_sent = 0
+        self._server = None
+    
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+    
+    async def start(self):
+        """Inicia o servidor (a porta real fica em self.port)."""
+        self._server = await websockets.serve(self._handler, self.host, self.port, max_queue=None)
+        self.port = self._server.sockets[0].getsockname()[1]
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+    
+    async def _handler(self, websocket):
+        subscribed: List[str] = []
+        producer = asyncio.create_task(self._produce(websocket, subscribed))
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                if request.get('method') == 'SUBSCRIBE':
+                    subscribed.extend(request.get('params', []))
+                    await websocket.send(json.dumps({'result': None, 'id': request.get('id')}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            producer.cancel()
+    
+    async def _produce(self, websocket, subscribed: List[str]):
+        """Emite uma vela fechada por stream inscrito a cada tick."""
+        rng = np.random.default_rng(self.seed)
+        prices: Dict[str, float] = {}
+        open_times: Dict[str, int] = {}
+        
+        while True:
+            await asyncio.sleep(self.tick_seconds)
+            for name in list(subscribed):
+                interval = name.split('@kline_')[1]
+                interval_ms = interval_to_ms(interval)
+                if name not in open_times:
+                    # Continua logo após a última vela fechada do histórico
+                    open_times[name] = (now_ms() // interval_ms) * interval_ms
+                    prices[name] = 30000.0
+                
+                open_price = prices[name]
+                close = open_price * float(np.exp(rng.normal(0.0, 0.001)))
+                high = max(open_price, close) * (1 + abs(float(rng.normal(0.0, 0.0005))))
+                low = min(open_price, close) * (1 - abs(float(rng.normal(0.0, 0.0005))))
+                open_time = open_times[name]
+                
+                await websocket.send(kline_message(
+                    name, open_time, interval_ms, open_price, high, low, close, float(rng.gamma(2.0, 5.0))
+                ))
+                self.messages_sent += 1
+                
+                prices[name] = close
+                open_times[name] = open_time + interval_ms
+
+
+async def run_load_test(n_streams: int = 300, duration: float = 10.0, tick_seconds: float = 1.0):
+    """
+    Sobe o servidor local, conecta um RealtimeEngine com N streams e mede
+    quantas velas fechadas foram processadas por segundo.
+    """
+    import contextlib
+    import io
+    from realtime_engine import RealtimeEngine
+    from ml_model import MLPredictor
+    from feature_engineering import FeatureEngineer
+    from synthetic_data import SyntheticCollector, generate_ohlcv
+    from signal_writer import InMemorySignalStore
+    
+    server = LocalKlineServer(tick_seconds=tick_seconds)
+    await server.start()
+    
+    streams = [(f"SYM{i:04d}USDT", '1m') for i in range(n_streams)]
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Modelo pequeno treinado em dados sintéticos (não sobrescreve o modelo salvo)
+        predictor = MLPredictor()
+        features = FeatureEngineer(generate_ohlcv(5000)).calculate_all_features()
+        predictor.train_model(features, save_model=False)
+        
+        engine = RealtimeEngine(
+            streams=streams,
+            ws_url=server.url,
+            collector=SyntheticCollector(),
+            signal_store=InMemorySignalStore(),
+            snapshot_path=None  # Não restaurar/gravar o snapshot do engine real
+        )
+        for state in engine.streams.values():
+            state.predictor = predictor
+    
+    warmup_counts = None
+    started = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        task = asyncio.create_task(engine.start())
+        # Aguardar inicialização dos buffers antes de começar a medir
+        while warmup_counts is None:
+            await asyncio.sleep(0.1)
+            counts = [s.feature_engine.count for s in engine.streams.values()]
+            if all(c > 0 for c in counts):
+                warmup_counts = sum(counts)
+                started = time.perf_counter()
+        await asyncio.sleep(duration)
+        processed = sum(s.feature_engine.count for s in engine.streams.values()) - warmup_counts
+        elapsed = time.perf_counter() - started
+        task.cancel()
+        engine.prediction_executor.close()
+        engine.signal_writer.close()
+        engine.metrics.stop_server()
+    await server.stop()
+    
+    print(f"Streams: {n_streams} | Velas processadas: {processed} em {elapsed:.1f}s "
+          f"({processed / elapsed:.0f} velas/s) | Enviadas: {server.messages_sent}")
+    for stage, summary in engine.metrics.snapshot().items():
+        print(f"  {stage:<18} p50 {summary['p50_ms']:8.3f} ms | p95 {summary['p95_ms']:8.3f} ms | "
+              f"p99 {summary['p99_ms']:8.3f} ms")
+    return processed / elapsed
+
+
+# Função de teste
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Stand-in local de streams de klines da Binance")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--tick', type=float, default=1.0, help="Segundos entre velas por stream")
+    parser.add_argument('--load-test', type=int, metavar='N_STREAMS',
+                        help="Roda um teste de carga do RealtimeEngine com N streams")
+    parser.add_argument('--duration', type=float, default=10.0)
+    args = parser.parse_args()
+    
+    async def serve_forever():
+        server = LocalKlineServer(port=args.port, tick_seconds=args.tick)
+        await server.start()
+        print(f"✓ Stand-in escutando em {server.url}/stream (BINANCE_WS_URL={server.url})")
+        await asyncio.Future()
+    
+    if args.load_test:
+        asyncio.run(run_load_test(args.load_test, args.duration, args.tick))
+    else:
+        asyncio.run(serve_forever())
@@ -0,0 +1,102 @@
+"""
+Gerador de velas OHLCV sintéticas (reprodutível por seed) para testes offline
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from candle_buffer import interval_to_ms, now_ms
+
+
+def generate_ohlcv(
+    n: int,
+    seed: int = 42,
+    interval: str = '1m',
+    start_ms: Optional[int] = None,
+    start_price: float = 30000.0,
+    volatility: float = 0.001,
+    process: str = 'gbm'
+) -> pd.DataFrame:
+    """
+    Gera N velas por passeio aleatório geométrico (ou aritmético).
+    
+    Args:
+        n: Número de velas
+        seed: Semente do gerador (mesma seed = mesmas velas)
+        interval: Timeframe das velas
+        start_ms: open_time da primeira vela (padrão: termina na última vela fechada)
+        start_price: Preço inicial
+        volatility: Desvio padrão do retorno logarítmico por vela
+        process: 'gbm' (passeio geométrico) ou 'random_walk' (passos aditivos de
+                 start_price * volatility, com piso de 1% do preço inicial)
+    
+    Returns:
+        DataFrame com colunas: timestamp, open, high, low, close, volume
+    """
+    rng = np.random.default_rng(seed)
+    interval_ms = interval_to_ms(interval)
+    if start_ms is None:
+        start_ms = (now_ms() // interval_ms - n) * interval_ms
+    
+    if process == 'gbm':
+        close = start_price * np.exp(np.cumsum(rng.normal(0.0, volatility, n)))
+    elif process == 'random_walk':
+        close = start_price + np.cumsum(rng.normal(0.0, start_price * volatility, n))
+        np.maximum(close, start_price * 0.01, out=close)
+    else:
+        raise ValueError(f"Processo desconhecido: {process}")
+    open_ = np.empty(n)
+    open_[0] = start_price
+    open_[1:] = close[:-1]
+    open_ *= 1 + rng.normal(0.0, volatility / 5, n)
+    
+    wick_up = np.abs(rng.normal(0.0, volatility / 2, n))
+    wick_down = np.abs(rng.normal(0.0, volatility / 2, n))
+    high = np.maximum(open_, close) * (1 + wick_up)
+    low = np.minimum(open_, close) * (1 - wick_down)
+    volume = rng.gamma(2.0, 5.0, n)
+    
+    open_times = start_ms + np.arange(n, dtype=np.int64) * interval_ms
+    
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(open_times, unit='ms'),
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'volume': volume,
+    })
+
+
+class SyntheticCollector:
+    """
+    Substituto offline do BinanceDataCollector: devolve velas sintéticas
+    determinísticas por símbolo (mesma interface de get_latest_candles
+    e get_candles_range).
+    """
+    
+    def __init__(self, seed: int = 42):
+        self.seed = seed
+    
+    def get_latest_candles(self, symbol: str = 'BTCUSDT', interval: str = '1m', limit: int = 100) -> pd.DataFrame:
+        seed = self.seed + sum(ord(ch) for ch in symbol)
+        return generate_ohlcv(limit, seed=seed, interval=interval)
+
+    def get_candles_range(
+        self,
+        symbol: str = 'BTCUSDT',
+        interval: str = '1m',
+        start_ms: int = 0,
+        end_ms: Optional[int] = None
+    ) -> pd.DataFrame:
+        seed = self.seed + sum(ord(ch) for ch in symbol)
+        interval_ms = interval_to_ms(interval)
+        n = max(0, ((end_ms or now_ms()) - start_ms) // interval_ms)
+        return generate_ohlcv(n, seed=seed, interval=interval, start_ms=start_ms)
+
+
+# Função de teste
+if __name__ == "__main__":
+    df = generate_ohlcv(10)
+    print(df)
@@ -0,0 +1,480 @@
+"""
+Compilador de ensembles de árvores para arrays NumPy planos (inferência sem o framework)
+"""
+import json
+from typing import Optional
+
+import numpy as np
+
+
+class CompiledEnsemble:
+    """
+    Ensemble de árvores binárias em arrays planos.
+    
+    Todas as árvores ficam concatenadas nos mesmos arrays; `roots` indica o
+    nó raiz de cada uma. Um nó interno envia a linha para `left` quando
+    x[feature] < threshold, para `right` caso contrário e para `missing`
+    quando o valor é NaN. Folhas apontam para si mesmas, então todas as
+    árvores podem ser percorridas juntas por `max_depth` passos.
+    
+    Agregação:
+        'logistic': P(verde) = sigmoid(bias + soma das folhas)  (XGBoost, Gradient Boosting)
+        'mean':     P(verde) = média das folhas                  (Random Forest)
+    """
+    
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        missing: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        aggregation: str,
+        bias: float = 0.0,
+        input_mean: Optional[np.ndarray] = None,
+        input_scale: Optional[np.ndarray] = None
+    ):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.missing = np.ascontiguousarray(missing, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.aggregation = aggregation
+        self.bias = float(bias)
+        # Normalização em float32 antes das árvores (ver scale_inputs_float32)
+        self.input_mean = None if input_mean is None else np.asarray(input_mean, dtype=np.float32)
+        self.input_scale = None if input_scale is None else np.asarray(input_scale, dtype=np.float32)
+        
+        # Filhos intercalados: children[2 * nó + (x >= limiar)] dá o próximo nó
+        self._children = np.ascontiguousarray(np.stack([self.left, self.right], axis=1).ravel())
+        self._nan_goes_left = bool(np.all(self.missing == self.left))
+    
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+    
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+    
+    def fold_scaler(self, mean: np.ndarray, scale: np.ndarray) -> 'CompiledEnsemble':
+        """
+        Incorpora um StandardScaler aos limiares: (x - mean) / scale < t  <=>  x < t * scale + mean
+        (scale > 0). Depois disso as árvores recebem as features originais.
+        """
+        is_split = self.left != np.arange(self.n_nodes)
+        feature = np.where(is_split, self.feature, 0)
+        threshold = np.where(
+            is_split,
+            self.threshold * np.asarray(scale, dtype=np.float64)[feature] + np.asarray(mean, dtype=np.float64)[feature],
+            self.threshold
+        )
+        return CompiledEnsemble(
+            self.feature, threshold, self.left, self.right, self.missing, self.value,
+            self.roots, self.max_depth, self.aggregation, self.bias
+        )
+    
+    def scale_inputs_float32(self, mean: np.ndarray, scale: np.ndarray) -> 'CompiledEnsemble':
+        """
+        Mantém o StandardScaler fora dos limiares e normaliza a entrada em
+        float32, nas mesmas operações do scaler.transform do treino compacto.
+        Incorporar o scaler aos limiares em float64 não reproduz os
+        arredondamentos desse pipeline.
+        """
+        return CompiledEnsemble(
+            self.feature, self.threshold, self.left, self.right, self.missing, self.value,
+            self.roots, self.max_depth, self.aggregation, self.bias, mean, scale
+        )
+    
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """Valor da folha atingida em cada árvore: array (n_linhas, n_árvores)."""
+        if self.input_mean is not None:
+            # Mesma sequência do StandardScaler.transform sobre float32 (média e
+            # desvio convertidos para float32, operações in-place)
+            X = np.array(X, dtype=np.float32)
+            X -= self.input_mean
+            X /= self.input_scale
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        node = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        row_offset = (np.arange(n_rows) * n_features)[:, None]
+        # Comparações com NaN são falsas (NaN vai para a esquerda); só tratar se algum nó difere
+        check_nan = not self._nan_goes_left and np.isnan(flat).any()
+        
+        for _ in range(self.max_depth):
+            x = flat[row_offset + self.feature[node]]
+            go_right = x >= self.threshold[node]
+            if check_nan:
+                nxt = np.where(np.isnan(x), self.missing[node], self._children[2 * node + go_right])
+            else:
+                nxt = self._children[2 * node + go_right]
+            node = nxt
+        
+        return self.value[node]
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Probabilidade da classe 1 (verde) para cada linha.
+        
+        Args:
+            X: Matriz (n_linhas, n_features) ou vetor de uma linha
+        
+        Returns:
+            Array float64 (n_linhas,)
+        """
+        leaves = self.leaf_values(X)
+        if self.aggregation == 'mean':
+            return leaves.mean(axis=1)
+        margin = self.bias + leaves.sum(axis=1)
+        return 1.0 / (1.0 + np.exp(-margin))
+    
+    def save(self, path: str):
+        """Salva os arrays em um arquivo .npz."""
+        scaling = {} if self.input_mean is None else {'input_mean': self.input_mean, 'input_scale': self.input_scale}
+        np.savez(
+            path,
+            feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+            missing=self.missing, value=self.value, roots=self.roots,
+            meta=np.array(json.dumps({
+                'max_depth': self.max_depth, 'aggregation': self.aggregation, 'bias': self.bias
+            })),
+            **scaling
+        )
+    
+    @classmethod
+    def load(cls, path: str) -> 'CompiledEnsemble':
+        """Carrega um ensemble salvo com save()."""
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(
+                data['feature'], data['threshold'], data['left'], data['right'],
+                data['missing'], data['value'], data['roots'],
+                meta['max_depth'], meta['aggregation'], meta['bias'],
+                data['input_mean'] if 'input_mean' in data.files else None,
+                data['input_scale'] if 'input_scale' in data.files else None
+            )
+
+
+def scaler_input_dtype(scaler) -> np.dtype:
+    """
+    dtype das features no fit do scaler (gravado por MLPredictor.train_model;
+    o StandardScaler guarda média/desvio sempre em float64).
+    """
+    return np.dtype(getattr(scaler, 'input_dtype_', np.float64))
+
+
+def scaler_arrays(scaler, n_features: int):
+    """
+    Média e desvio de um StandardScaler como arrays float64 (zeros/uns quando
+    o scaler foi criado com with_mean=False / with_std=False).
+    """
+    mean = getattr(scaler, 'mean_', None)
+    scale = getattr(scaler, 'scale_', None)
+    return (
+        np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+    )
+
+
+# ========== COMPILADORES POR FRAMEWORK ==========
+
+class _Builder:
+    """Acumula árvores (índices locais) em arrays globais."""
+    
+    def __init__(self):
+        self.parts = []
+        self.roots = []
+        self.offset = 0
+        self.max_depth = 0
+    
+    def add_tree(self, feature, threshold, left, right, missing, value, is_leaf):
+        n = len(feature)
+        own = np.arange(n)
+        left = np.where(is_leaf, own, left)
+        right = np.where(is_leaf, own, right)
+        missing = np.where(is_leaf, own, missing)
+        
+        self.parts.append((
+            np.where(is_leaf, 0, feature),
+            np.where(is_leaf, np.inf, threshold),
+            left + self.offset,
+            right + self.offset,
+            missing + self.offset,
+            value
+        ))
+        self.roots.append(self.offset)
+        self.offset += n
+        self.max_depth = max(self.max_depth, _tree_depth(left, right, is_leaf))
+    
+    def build(self, aggregation: str, bias: float = 0.0) -> CompiledEnsemble:
+        arrays = [np.concatenate([part[i] for part in self.parts]) for i in range(6)]
+        return CompiledEnsemble(*arrays, self.roots, self.max_depth, aggregation, bias)
+
+
+def _tree_depth(left: np.ndarray, right: np.ndarray, is_leaf: np.ndarray) -> int:
+    """Profundidade máxima de uma árvore (nó 0 = raiz; nós podem ser compartilhados)."""
+    depth = 0
+    frontier = np.array([0])
+    while True:
+        internal = frontier[~is_leaf[frontier]]
+        if len(internal) == 0:
+            return depth
+        frontier = np.unique(np.concatenate([left[internal], right[internal]]))
+        depth += 1
+
+
+def _float32_boundary(smallest_above: np.ndarray) -> np.ndarray:
+    """
+    Limiar float64 equivalente a uma comparação feita em float32.
+    
+    Os frameworks convertem a entrada para float32 antes de comparar; para
+    `c` float32, float32(x) < c  <=>  x < ponto médio entre c e o float32
+    anterior. Usar esse ponto médio mantém a decisão idêntica mesmo para
+    valores que caem exatamente sobre o limiar (comum no XGBoost, cujos
+    limiares são valores do próprio histograma de treino).
+    """
+    c = np.asarray(smallest_above, dtype=np.float32)
+    below = np.nextafter(c, np.float32(-np.inf))
+    return (c.astype(np.float64) + below.astype(np.float64)) / 2
+
+
+def _compile_xgboost(model) -> CompiledEnsemble:
+    booster = model.get_booster()
+    raw = json.loads(booster.save_raw('json'))
+    learner = raw['learner']
+    
+    if learner['objective']['name'] != 'binary:logistic':
+        raise ValueError(f"Objetivo XGBoost não suportado: {learner['objective']['name']}")
+    
+    base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+    bias = float(np.log(base_score / (1 - base_score)))
+    
+    trees = learner['gradient_booster']['model']['trees']
+    best_iteration = getattr(model, 'best_iteration', None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+    
+    builder = _Builder()
+    for tree in trees:
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        is_leaf = left == -1
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        default_left = np.asarray(tree['default_left'], dtype=bool)
+        builder.add_tree(
+            np.asarray(tree['split_indices'], dtype=np.int64),
+            # XGBoost: esquerda quando float32(x) < condição
+            np.where(is_leaf, np.inf, _float32_boundary(conditions)),
+            left,
+            right,
+            np.where(default_left, left, right),
+            np.where(is_leaf, conditions.astype(np.float64), 0.0),
+            is_leaf
+        )
+    return builder.build('logistic', bias)
+
+
+def _add_sklearn_tree(builder: _Builder, tree, value: np.ndarray):
+    is_leaf = tree.children_left == -1
+    # sklearn: esquerda quando float32(x) <= t, ou seja, float32(x) < menor float32 acima de t
+    split_threshold = np.where(is_leaf, 0.0, tree.threshold)
+    above = split_threshold.astype(np.float32)
+    above = np.where(above.astype(np.float64) <= split_threshold, np.nextafter(above, np.float32(np.inf)), above)
+    threshold = _float32_boundary(above)
+    go_left = getattr(tree, 'missing_go_to_left', None)
+    missing = tree.children_left if go_left is None else np.where(go_left.astype(bool), tree.children_left, tree.children_right)
+    builder.add_tree(tree.feature, threshold, tree.children_left, tree.children_right, missing, value, is_leaf)
+
+
+def _compile_random_forest(model) -> CompiledEnsemble:
+    positive = list(model.classes_).index(1)
+    builder = _Builder()
+    for estimator in model.estimators_:
+        counts = estimator.tree_.value[:, 0, :]
+        fractions = counts / counts.sum(axis=1, keepdims=True)
+        _add_sklearn_tree(builder, estimator.tree_, fractions[:, positive])
+    return builder.build('mean')
+
+
+def _compile_gradient_boosting(model) -> CompiledEnsemble:
+    if model.estimators_.shape[1] != 1:
+        raise ValueError("Gradient Boosting multiclasse não suportado")
+    
+    n_features = model.n_features_in_
+    bias = float(model._raw_predict_init(np.zeros((1, n_features), dtype=np.float32))[0, 0])
+    
+    builder = _Builder()
+    for estimator in model.estimators_[:, 0]:
+        _add_sklearn_tree(builder, estimator.tree_, estimator.tree_.value[:, 0, 0] * model.learning_rate)
+    return builder.build('logistic', bias)
+
+
+def _flatten_lightgbm_tree(root: dict, category_values, category_offset: int, leaf_scale: float):
+    """
+    Converte uma árvore do dump JSON do LightGBM em arrays locais.
+    
+    Splits categóricos (x ∈ conjunto) viram uma cadeia de splits numéricos
+    sobre os valores possíveis da feature (ex: -1/0/1), apontando para as
+    mesmas subárvores esquerda/direita (nós compartilhados).
+    """
+    columns = {name: [] for name in ('feature', 'threshold', 'left', 'right', 'missing', 'value', 'is_leaf')}
+    
+    def new_node() -> int:
+        for name, default in (('feature', 0), ('threshold', np.inf), ('left', -1), ('right', -1),
+                              ('missing', -1), ('value', 0.0), ('is_leaf', True)):
+            columns[name].append(default)
+        return len(columns['feature']) - 1
+    
+    def set_split(i, feature, threshold, left, right, missing):
+        columns['feature'][i] = feature
+        columns['threshold'][i] = threshold
+        columns['left'][i] = left
+        columns['right'][i] = right
+        columns['missing'][i] = missing
+        columns['is_leaf'][i] = False
+    
+    def visit(node: dict) -> int:
+        i = new_node()
+        if 'leaf_value' in node:
+            columns['value'][i] = node['leaf_value'] * leaf_scale
+            return i
+        
+        left = visit(node['left_child'])
+        right = visit(node['right_child'])
+        feature = node['split_feature']
+        
+        if node['decision_type'] == '<=':
+            # LightGBM: esquerda quando x <= t (comparação em float64)
+            threshold = float(np.nextafter(float(node['threshold']), np.inf))
+            set_split(i, feature, threshold, left, right, left if node['default_left'] else right)
+            return i
+        
+        if category_values is None:
+            raise ValueError("Split categórico sem domínio de valores conhecido")
+        
+        categories = {int(c) for c in str(node['threshold']).split('||')}
+        values = sorted(category_values)
+        targets = [left if int(v) + category_offset in categories else right for v in values]
+        
+        current = i
+        for k in range(len(values) - 1):
+            nxt = targets[k + 1] if k == len(values) - 2 else new_node()
+            set_split(current, feature, (values[k] + values[k + 1]) / 2, targets[k], nxt, right)
+            current = nxt
+        return i
+    
+    visit(root)
+    return tuple(np.asarray(columns[name]) for name in ('feature', 'threshold', 'left', 'right', 'missing', 'value', 'is_leaf'))
+
+
+def _compile_lightgbm(model) -> CompiledEnsemble:
+    dump = model.booster_.dump_model()
+    objective = dump['objective'].split()
+    if objective[0] != 'binary':
+        raise ValueError(f"Objetivo LightGBM não suportado: {dump['objective']}")
+    
+    # P = sigmoid(s * soma das folhas); o fator s é incorporado às folhas
+    leaf_scale = 1.0
+    for part in objective[1:]:
+        if part.startswith('sigmoid:'):
+            leaf_scale = float(part.split(':')[1])
+    
+    builder = _Builder()
+    for info in dump['tree_info']:
+        builder.add_tree(*_flatten_lightgbm_tree(
+            info['tree_structure'],
+            getattr(model, 'CATEGORY_VALUES', None),
+            getattr(model, 'CATEGORY_OFFSET', 0),
+            leaf_scale
+        ))
+    return builder.build('logistic', 0.0)
+
+
+def compile_ensemble(model, scaler=None) -> CompiledEnsemble:
+    """
+    Compila um classificador binário treinado em arrays planos.
+    
+    Args:
+        model: XGBClassifier, RandomForestClassifier, GradientBoostingClassifier ou LightGBM
+        scaler: StandardScaler usado no treino (incorporado aos limiares) ou None
+    
+    Returns:
+        CompiledEnsemble que recebe as features originais (sem normalização)
+    """
+    name = type(model).__name__
+    if name == 'XGBClassifier':
+        compiled = _compile_xgboost(model)
+    elif name == 'RandomForestClassifier':
+        compiled = _compile_random_forest(model)
+    elif name == 'GradientBoostingClassifier':
+        compiled = _compile_gradient_boosting(model)
+    elif hasattr(model, 'booster_') and type(model.booster_).__module__.startswith('lightgbm'):
+        compiled = _compile_lightgbm(model)
+    else:
+        raise ValueError(f"Modelo não suportado pelo compilador: {name}")
+    
+    if scaler is not None:
+        arrays = scaler_arrays(scaler, model.n_features_in_)
+        if scaler_input_dtype(scaler) == np.float32:
+            compiled = compiled.scale_inputs_float32(*arrays)
+        else:
+            compiled = compiled.fold_scaler(*arrays)
+    return compiled
+
+
+def max_probability_error(compiled: CompiledEnsemble, model, scaler, X: np.ndarray) -> float:
+    """Maior diferença absoluta entre o ensemble compilado e o modelo original em X."""
+    X_model = scaler.transform(X.astype(scaler_input_dtype(scaler))) if scaler is not None else X
+    expected = model.predict_proba(X_model)[:, 1]
+    return float(np.max(np.abs(compiled.predict_proba(X) - expected)))
+
+
+def probe_rows(scaler, n_features: int, n: int = 512, seed: int = 0) -> np.ndarray:
+    """Linhas sintéticas em torno da distribuição de treino (para validar a compilação)."""
+    rng = np.random.default_rng(seed)
+    if scaler is None:
+        return rng.normal(0.0, 1.0, (n, n_features))
+    mean, scale = scaler_arrays(scaler, n_features)
+    return mean + rng.normal(0.0, 1.0, (n, n_features)) * scale
+
+
+# Função de teste
+if __name__ == "__main__":
+    import time
+    from ml_model import MLPredictor
+    
+    rng = np.random.default_rng(42)
+    X = rng.normal(100.0, 5.0, (5000, 29))
+    X[:, :10] = rng.integers(-1, 2, (5000, 10))  # Regras: -1/0/1
+    y = (X[:, 10] + X[:, 11] * 0.5 + X[:, 0] * 3 + rng.normal(0, 5, 5000) > 150).astype(int)
+    
+    for model_type in ('xgboost', 'random_forest', 'gradient_boosting', 'lightgbm'):
+        scaler = MLPredictor.build_scaler(model_type).fit(X)
+        model = MLPredictor.build_model(model_type).fit(scaler.transform(X), y)
+        compiled = compile_ensemble(model, scaler)
+        
+        error = max_probability_error(compiled, model, scaler, X)
+        
+        row = X[-1:]
+        started = time.perf_counter()
+        for _ in range(200):
+            model.predict_proba(scaler.transform(row))
+        original_us = (time.perf_counter() - started) / 200 * 1e6
+        
+        started = time.perf_counter()
+        for _ in range(200):
+            compiled.predict_proba(row)
+        compiled_us = (time.perf_counter() - started) / 200 * 1e6
+        
+        print(f"{model_type:18s} árvores={compiled.n_trees} nós={compiled.n_nodes} "
+              f"erro máx={error:.2e} | original={original_us:.0f}µs compilado={compiled_us:.0f}µs")